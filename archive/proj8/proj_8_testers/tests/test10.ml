@@ -0,0 +1,17 @@
+# Passes by reference to a function with few registers (compiled with -s, see flags/)
+
+begin
+    f4(int ref p5, int ref p6) -> int begin
+        if p6 != p5 then begin
+            p6 := (-p6);
+            write(p5, " ", p6, " ");
+            p5 := p5 / 5 + (p6 - p6);
+        end
+        return 0;
+    end
+
+    int g10 := 0;
+    int g12 := 4;
+    int r := f4(g10, g12);
+    write(g10, " ", g12, " ", r, "\n");
+end
@@ -0,0 +1,13 @@
+# Calls a function in the middle of an expression with few registers (compiled with -s, see flags/)
+
+begin
+    f1() -> int begin
+        write(-6, " ");
+        return -1;
+    end
+    int g6 := 1;
+    int g7 := f1() + (9 - 8 % 50) * (-6 % 7);
+    int g8 := (g6) - g7 - f1();
+    int g9 := g8 % 5;
+    write(g6, " ", g7, " ", g8, " ", g9, "\n");
+end
@@ -0,0 +1,18 @@
+# Reads a variable declared without a value that is only given one in a branch not taken
+
+begin
+    int n;
+    read(n);
+    if n > 0 then begin
+        int x;
+        x := n * 3;
+        write(x);
+    end
+    if n > 0 then begin
+        int y;
+        if n > 100 then begin
+            y := n * 2;
+        end
+        write(y, "\n");
+    end
+end
@@ -0,0 +1,16 @@
+# Writes a bool computed in a loop whose variables are kept in registers
+
+begin
+    int g3 := -1;
+    int c5 := 0;
+    int g4 := 2;
+    int g5 := 3;
+    if True then begin
+        int c6 := 0;
+        while c6 < 4 begin
+            c6 := c6 + 1;
+            bool v7 := (5 / 4) != c5 / 5 - 5 - g3;
+            write(c6, " ", g3, " ", c5, " ", g4, " ", g5, " ", v7, "\n");
+        end
+    end
+end
@@ -23,8 +23,11 @@ do
   # Clear file
   > proj_8_testers/output/$name.txt
 
+  # Extra compiler options of the test (if any)
+  flags=$(cat proj_8_testers/flags/$name.txt 2>/dev/null)
+
   # If an error, catch the error and print it to file
-  python3.5 compiler.py -t tokens.txt "$file" proj_8_testers/compiled/$name.asm &> proj_8_testers/output/$name.txt
+  python3.5 compiler.py -t tokens.txt $flags "$file" proj_8_testers/compiled/$name.asm &> proj_8_testers/output/$name.txt
 
   if ! grep --quiet Traceback proj_8_testers/output/$name.txt; then
     # Clear ouput if not error
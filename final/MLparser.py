@@ -60,43 +60,169 @@ Grammar:
     <equal_op>      ->  EQUAL | NOT_EQUAL
     <log_and>       ->  LOG_AND
     <log_or>        ->  LOG_OR
+
+With expr_mode = 'precedence', <expr_bool> is parsed by precedence climbing into a flat binary AST instead:
+    - a binary operator is tree(<operator name>, [<lhs>, <rhs>], <operator token>)
+    - a unary operator is tree(<operator name>, [<operand>], <operator token>)
+    - a literal is tree(<literal name>, [], <literal token>) and an identifier is the usual VAR_IDENT tree
+    - parentheses only group, they don't add a node
+Operators at the same level are left associative, except <equal_op> and <rel_op>, which are allowed only once per
+level (as in the grammar above).
+
+With call_mode = 'stack', the methods in STACK_METHODS run on an explicit stack (see trampoline) instead of Python's,
+so nesting isn't limited by the recursion limit.
+
+With lazy_funcs, the body of a function declaration is skipped to its matching end instead of being parsed, and
+becomes a SKIPPED_BLOCK tree whose token is a SkippedBlock. The code generator parses it when it compiles the function.
+
+IncrementalParser records where every block and statement is in the tokens, so after an edit of the source it lexes
+only the changed lines and parses only the statements they are in again (see IncrementalParser.reparse).
+
+TableParser builds the same tree from the LL(1) tables parser_generator makes from a grammar file (files/grammar.txt
+is this grammar), on an explicit stack.
 """
 
 from tree import *
 from lexer import *
 from errors import *
-from types import MethodType
-
-
-def add_class_debug(klass):
-    # Creates a subclass of klass that changes all method calls to add_debug(func) if debug_flag = True
-    class DebuggedClass(klass):
-        @staticmethod
-        def add_debug(fn):
-            def debugged_fn(self, cur_token, G):
-                print(" "*self.recursion_level + "Entering: %s (%s)" % (fn.__name__, cur_token))
-                self.recursion_level += 3
-                R = fn(self, cur_token, G)
-                self.recursion_level -= 3
-                print(" "*self.recursion_level + "Leaving: %s" % (fn.__name__))
-                return R
-            return debugged_fn
+from trampoline import *
+from parser_generator import load_tables, grammar_hash
+from inspect import isgeneratorfunction
+from itertools import chain
+import time
+
+# Bump this whenever the trees Parser.parse builds (or what to_ast makes of them) change, so cached ASTs are rebuilt
+PARSER_VERSION = 1
+
+# Binding power of the binary operator classes for precedence climbing (higher binds tighter)
+BINARY_PRECEDENCE = {'LOG_OR': 1, 'LOG_AND': 2, 'EQUAL_OP': 3, 'REL_OP': 4, 'UNARY_ADD_OP': 5, 'MUL_OP': 6}
+# Operator classes that can't be chained (a < b < c is a syntax error)
+NON_ASSOCIATIVE = {'EQUAL_OP', 'REL_OP'}
 
+
+def reduce_binary(operands, operators):
+    # Replaces the top two operands with the top operator applied to them
+    rhs = operands.pop()
+    op = operators.pop()
+    operands[-1] = tree(op.name, [operands[-1], rhs], op)
+
+
+def trace_class(klass):
+    """
+    Creates a subclass of klass with every grammar method of klass wrapped once, when the subclass is created.
+    A traced method prints when it is entered and left if debug_flag is set, and always counts its calls and
+    cumulative time (time spent in it and everything it calls, not counting recursive calls twice) in self.profile.
+    klass itself is left alone, so an untraced instance pays nothing for tracing.
+    """
+    class TracedClass(klass):
         def __init__(self, *args, **kwargs):
-            self.debug_flag = False
             super().__init__(*args, **kwargs)
-            for item in dir(self):
-                if callable(getattr(self, item)) and '__' not in item and 'add_debug' not in item:
-                    func = self.__getattribute__(item).__func__
-                    func = DebuggedClass.add_debug(func) if self.debug_flag else func
-                    setattr(self, item, MethodType(func, self))
-    return DebuggedClass
-
-@add_class_debug
+            # name -> [calls, cumulative seconds]
+            self.profile = {}
+            self._reset_trace()
+
+        def _reset_trace(self):
+            self.recursion_level = 0
+            # name -> number of calls of it currently running
+            self.active = {}
+
+        def parse(self, source_file, token_file):
+            # A parse that raised never left the calls it was in, so each parse starts from a clean trace
+            self._reset_trace()
+            return traced_parse(self, source_file, token_file)
+
+        def profile_report(self):
+            """
+            Returns the profile as a table sorted by cumulative time
+            """
+            lines = ['{:<20s}{:>10s}{:>14s}{:>14s}'.format('nonterminal', 'calls', 'cumul (ms)', 'per call (us)')]
+            for name, (calls, total) in sorted(self.profile.items(), key = lambda item: -item[1][1]):
+                lines.append('{:<20s}{:>10d}{:>14.3f}{:>14.3f}'.format(name, calls, total * 1e3, total / calls * 1e6))
+            return '\n'.join(lines)
+
+    traced_parse = trace_method(klass.parse)
+    # Methods klass inherits are traced too (the grammar methods a StackParser doesn't override)
+    methods = {name: fn for base in reversed(klass.__mro__[:-1]) for name, fn in vars(base).items()}
+    for name, fn in methods.items():
+        if callable(fn) and not name.startswith('__') and name not in vars(TracedClass):
+            setattr(TracedClass, name, trace_method(fn))
+    TracedClass.__name__ = TracedClass.__qualname__ = 'Traced' + klass.__name__
+    return TracedClass
+
+
+def trace_method(fn):
+    # Wraps fn in the tracing; generator methods (see trampoline) get a generator wrapper that yields their call
+    name = fn.__name__
+
+    def enter(self, args):
+        if self.debug_flag:
+            print(" "*self.recursion_level + "Entering: %s (%s)" % (name, args[0]))
+            self.recursion_level += 3
+        stats = self.profile.get(name)
+        if stats is None:
+            stats = self.profile[name] = [0, 0.0]
+        stats[0] += 1
+        running = self.active.get(name, 0)
+        self.active[name] = running + 1
+        return stats, running == 0, time.perf_counter()
+
+    def leave(self, stats, outermost, start):
+        if outermost:
+            stats[1] += time.perf_counter() - start
+        self.active[name] -= 1
+        if self.debug_flag:
+            self.recursion_level -= 3
+            print(" "*self.recursion_level + "Leaving: %s" % (name))
+
+    if isgeneratorfunction(fn):
+        def traced_fn(self, *args):
+            state = enter(self, args)
+            R = yield fn(self, *args)
+            leave(self, *state)
+            return R
+    else:
+        def traced_fn(self, *args):
+            state = enter(self, args)
+            R = fn(self, *args)
+            leave(self, *state)
+            return R
+    traced_fn.__name__ = name
+    return traced_fn
+
+
+# The grammar methods that can nest, which call_mode = 'stack' runs on an explicit stack (see trampoline)
+STACK_METHODS = ['block', 'statement_list', 'statement', 'if_statement', 'while_statement', 'declaration', 'dec_list',
+                 'dec_term', 'id_statement', 'id_state_body', 'func', 'func_gen', 'func_call', 'assign', 'expr_list',
+                 'expr_bool', 'term_bool', 'expr_eq', 'expr_relation', 'expr_arith', 'term_arith', 'fact_arith',
+                 'term_unary', 'var_ident', 'var_or_func', 'expr_precedence', 'expr_operand', 'expr_primary']
+
+_parser_classes = {}
+
+
+def parser_class(traced, stack):
+    # The traced and explicit-stack subclasses of Parser are made the first time they're needed
+    if (traced, stack) not in _parser_classes:
+        klass = stack_class(Parser, STACK_METHODS) if stack else Parser
+        _parser_classes[traced, stack] = trace_class(klass) if traced else klass
+    return _parser_classes[traced, stack]
+
+
 class Parser:
-    def __init__(self, isDebug):
+    def __new__(cls, isDebug, *args, profile = False, call_mode = 'recursive', **kwargs):
+        # Debugging and profiling get a traced subclass and call_mode = 'stack' an explicit-stack one, so a plain
+        # Parser is built and run with neither
+        if cls is Parser:
+            cls = parser_class(bool(isDebug or profile), call_mode == 'stack')
+        return super().__new__(cls)
+
+    def __init__(self, isDebug, lex_mode = 'regex', lex_jobs = 1, expr_mode = 'descent', profile = False,
+                 call_mode = 'recursive', lazy_funcs = False):
         self.debug_flag = isDebug
-        self.recursion_level = 0
+        self.lex_mode = lex_mode
+        self.lex_jobs = lex_jobs
+        self.lazy_funcs = lazy_funcs
+        if expr_mode == 'precedence':
+            self.expr_bool = self.expr_precedence
 
     # Parsing code
     def parse(self, source_file, token_file):
@@ -105,12 +231,22 @@ class Parser:
         returns True if the code is syntactically correct.
         Throws a ParserError otherwise.
         """
-        G = Lexer(source_file, token_file).lex()
-        cur_token, t = self.block(next(G), G)
+        G = iter(Lexer(source_file, token_file, self.lex_mode).tokenize(self.lex_jobs))
+        cur_token, t = run(self.block(next(G), G))
         if cur_token.name != "$":
             raise ParserError.raise_redundant_tokens_error(cur_token)
         return t
 
+    def parse_statements(self, source_file, token_file):
+        """
+        source_file: A program written in the ML langauge.
+        Like parse, but returns an iterator over the STATEMENT trees of the program's block, which parses each one when
+        it's asked for. The source is lexed as it's parsed (see Lexer.lex_stream), so only the statement being parsed
+        is held in memory.
+        Throws a ParserError once the iteration gets to it.
+        """
+        return _top_level_statements(self, Lexer(source_file, token_file, self.lex_mode).lex_stream())
+
     # <block> -> begin <statement_list> end
     def block(self, cur_token, G):
         if cur_token.name != "BEGIN":
@@ -246,7 +382,10 @@ class Parser:
             children.append(type_tree)
             cur_token = next(G)
         if cur_token.name == "BEGIN":
-            cur_token, child_block = self.block(cur_token, G)
+            if self.lazy_funcs:
+                cur_token, child_block = self.skip_block(cur_token, G)
+            else:
+                cur_token, child_block = self.block(cur_token, G)
             children.append(child_block)
         # If the children list is empty, do not put it as a tree child
         if not children:
@@ -254,6 +393,20 @@ class Parser:
         else:
             return cur_token, tree("FUNC", [child_func_gen, tree("FUNC_DEC_TAIL", children)])
 
+    # <block> of a function with lazy_funcs: skips to the matching end, the block is parsed when it's needed
+    def skip_block(self, cur_token, G):
+        begin = cur_token
+        depth = 1
+        while depth:
+            cur_token = next(G)
+            if cur_token.name == "BEGIN":
+                depth += 1
+            elif cur_token.name == "END":
+                depth -= 1
+            elif cur_token.name == "$":
+                raise ParserError.raise_parse_error("block", "end", cur_token)
+        return next(G), tree("SKIPPED_BLOCK", [], SkippedBlock(self, begin, cur_token))
+
     # <func_gen> ->  <func_call> | <func_dec> | (empty)
     def func_gen(self, cur_token, G):
         if cur_token.t_class in {"IDENTIFIER", "LITERAL", "UNARY_OP", "UNARY_ADD_OP"} or cur_token.name == 'LPAREN':
@@ -391,7 +544,7 @@ class Parser:
     def fact_arith(self, cur_token, G):
         if cur_token.t_class in {'UNARY_OP', 'UNARY_ADD_OP'}:
             next_token, child_term_unary = self.term_unary(next(G), G)
-            return next_token, tree('FACT_ARITH', [tree(cur_token.name), child_term_unary])
+            return next_token, tree('FACT_ARITH', [tree(cur_token.name, [], cur_token), child_term_unary])
         else:
             cur_token, child_term_unary = self.term_unary(cur_token, G)
             return cur_token, tree('FACT_ARITH', [child_term_unary])
@@ -432,3 +585,442 @@ class Parser:
         if cur_token.name != "ID":
             raise ParserError.raise_parse_error("IDENT", "ID", cur_token)
         return next(G), tree("IDENT", [], cur_token) #[tree("ID", [], cur_token)])
+
+    # <expr_bool> by precedence climbing (see BINARY_PRECEDENCE), building the flat binary AST
+    def expr_precedence(self, cur_token, G):
+        cur_token, child_operand = self.expr_operand(cur_token, G)
+        operands = [child_operand]
+        # Operator tokens still waiting for their right operand, in strictly increasing precedence
+        operators = []
+        while cur_token.t_class in BINARY_PRECEDENCE:
+            precedence = BINARY_PRECEDENCE[cur_token.t_class]
+            while operators and BINARY_PRECEDENCE[operators[-1].t_class] > precedence:
+                reduce_binary(operands, operators)
+            if operators and operators[-1].t_class == cur_token.t_class:
+                if cur_token.t_class in NON_ASSOCIATIVE:
+                    break
+                reduce_binary(operands, operators)
+            operators.append(cur_token)
+            cur_token, child_operand = self.expr_operand(next(G), G)
+            operands.append(child_operand)
+        while operators:
+            reduce_binary(operands, operators)
+        return cur_token, operands[0]
+
+    # [ <unary_op> | <unary_add_op> ] <term_unary>, for expr_precedence
+    def expr_operand(self, cur_token, G):
+        if cur_token.t_class in {'UNARY_OP', 'UNARY_ADD_OP'}:
+            next_token, child_operand = self.expr_primary(next(G), G)
+            return next_token, tree(cur_token.name, [child_operand], cur_token)
+        return self.expr_primary(cur_token, G)
+
+    # <term_unary> for expr_precedence (parentheses don't get a node)
+    def expr_primary(self, cur_token, G):
+        if cur_token.name == "LPAREN":
+            cur_token, child_expr = self.expr_precedence(next(G), G)
+            if cur_token.name != "RPAREN":
+                raise ParserError.raise_parse_error("TERM_UNARY", ")", cur_token)
+            return next(G), child_expr
+        elif cur_token.name == "ID":
+            return self.var_ident(cur_token, G)
+        elif cur_token.t_class == "LITERAL":
+            return next(G), tree(cur_token.name, [], cur_token)
+        else:
+            raise ParserError.raise_parse_error('TERM_UNARY', "ID or LITERAL", cur_token)
+
+
+
+def _top_level_statements(parser, G):
+    # The generator for Parser.parse_statements: block and statement_list, yielding the statements one at a time
+    # (It's not a Parser method, so tracing and the explicit stack don't wrap it)
+    cur_token = next(G)
+    if cur_token.name != "BEGIN":
+        raise ParserError.raise_parse_error("block", "begin", cur_token)
+    cur_token = next(G)
+    while True:
+        cur_token, t = run(parser.statement(cur_token, G))
+        yield t
+        if cur_token.name not in ("READ", "WRITE", "ID", "WHILE", "IF", "RETURN") and cur_token.t_class != 'TYPE':
+            break
+    if cur_token.name != "END":
+        raise ParserError.raise_parse_error("block", "end", cur_token)
+    cur_token = next(G)
+    if cur_token.name != "$":
+        raise ParserError.raise_redundant_tokens_error(cur_token)
+
+
+class SkippedBlock:
+    """
+    A function body Parser skipped with lazy_funcs (the token of a SKIPPED_BLOCK tree): its tokens from begin to end
+    in the TokenBuffer, and the parser to parse them with.
+    """
+    __slots__ = ('parser', 'begin', 'end')
+
+    def __init__(self, parser, begin, end):
+        self.parser = parser
+        self.begin = begin
+        self.end = end
+
+    def parse(self):
+        """
+        returns the BLOCK tree of the body.
+        Throws a ParserError if it isn't a block.
+        """
+        buffer = self.begin.buffer
+        G = chain((buffer[index] for index in range(self.begin.index, self.end.index + 1)),
+                  (Token("$", "$", "$", "$", -1, -1),))
+        cur_token, t = run(self.parser.block(next(G), G))
+        if cur_token.name != "$":
+            raise ParserError.raise_redundant_tokens_error(cur_token)
+        return t
+
+    def is_used(self, name):
+        # True if name is an identifier anywhere in the program but once (the declaration of the function)
+        return self.begin.buffer.pattern_counts('IDENTIFIER')[name] > 1
+
+
+class IncrementalParser(Parser):
+    """
+    A Parser whose trees can be updated after an edit of the source instead of being parsed again (see reparse).
+    It parses a lexer.TokenStream, and the span of every BLOCK and STATEMENT tree is its first and last TokenView,
+    which is what reparse uses to find the trees an edit is in.
+    Always runs with call_mode 'recursive' and without tracing.
+    """
+
+    def parse_stream(self, tokens):
+        """
+        tokens: The TokenStream of a program written in the ML language.
+        returns the tree if the code is syntactically correct.
+        Throws a ParserError otherwise.
+        """
+        self.views = tokens.views
+        self.stop = len(tokens)
+        G = tokens.tokens()
+        cur_token, t = self.block(next(G), G)
+        if cur_token.name != "$":
+            raise ParserError.raise_redundant_tokens_error(cur_token)
+        return t
+
+    def reparse(self, t, tokens, first_line, last_line, text):
+        """
+        t, tokens: The tree and TokenStream of a program (from parse_stream or reparse)
+        Replaces lines first_line to last_line of the program by text (see TokenStream.edit) and returns its tree.
+        Only the new lines are lexed, and only the statements the edit is in are parsed again: the run of statements
+        in the innermost block that holds the whole edit (leaving out its begin and end). If they don't parse on their
+        own, the statement holding that block is parsed again instead, and so on out to the whole program.
+        The new statements are spliced into t, so t itself is returned unless the whole program was parsed again.
+        Throws the LexerError for a bad token in text (leaving tokens as it was), or the ParserError parsing the edited
+        program would (then tokens has the edit but t doesn't: call parse_stream(tokens) once the program is fixed).
+        """
+        start, stop = tokens.token_range(first_line, last_line)
+        levels = self._edit_levels(t, start, stop)
+        start, stop, count = tokens.edit(first_line, last_line, text)
+        shift = count - (stop - start)
+        self.views = tokens.views
+        for statement_list, first, last, region_start, region_stop in reversed(levels):
+            statements = self._parse_region(tokens, region_start, region_stop + shift)
+            # A block can't be left without statements
+            if statements is not None and len(statement_list.children) - (last - first) + len(statements) > 0:
+                statement_list.children[first:last] = statements
+                return t
+        return self.parse_stream(tokens)
+
+    def _edit_levels(self, t, start, stop):
+        # Where an edit of the tokens [start, stop) can be parsed again, from the whole program in: a list of
+        # (STATEMENT_LIST tree, first statement, last statement + 1, first token, last token + 1) where every statement
+        # run is the one statement holding the block of the next
+        # (For an insertion, start = stop is the index of the token after it)
+        levels = []
+        block = t
+        while self._holds(block, start, stop):
+            statement_list = block.children[1]
+            statements = statement_list.children
+            first = self._search(statements, start, 1)
+            last = self._search(statements, stop, 0)
+            if last == first:
+                levels.append((statement_list, first, last, start, stop))
+                break
+            region_start = min(start, statements[first].span[0].index)
+            region_stop = max(stop, statements[last - 1].span[1].index + 1)
+            levels.append((statement_list, first, last, region_start, region_stop))
+            if last - first > 1:
+                break
+            block = next((inner for inner in self._blocks(statements[first]) if self._holds(inner, start, stop)), None)
+            if block is None:
+                break
+        return levels
+
+    @staticmethod
+    def _search(statements, index, end):
+        # Binary search for the first statement whose first (end = 0) or last (end = 1) token is at index or after it
+        low, high = 0, len(statements)
+        while low < high:
+            middle = (low + high) // 2
+            if statements[middle].span[end].index < index:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def _holds(block, start, stop):
+        # True if the tokens [start, stop) are between the begin and end of block
+        return block.span[0].index < start and stop <= block.span[1].index
+
+    @staticmethod
+    def _blocks(statement):
+        # The BLOCK trees of statement that aren't inside another one
+        blocks = []
+        nodes = list(statement.children)
+        while nodes:
+            node = nodes.pop()
+            if node.label == "BLOCK":
+                blocks.append(node)
+            else:
+                nodes.extend(node.children)
+        return blocks
+
+    def _parse_region(self, tokens, start, stop):
+        # Returns the statement trees of the tokens [start, stop), or None if they aren't a run of statements
+        if start == stop:
+            return []
+        self.stop = stop
+        G = tokens.tokens(start, stop)
+        try:
+            cur_token, statement_list = self.statement_list(next(G), G)
+        except (ParserError, StopIteration):
+            return None
+        return statement_list.children if cur_token.name == "$" else None
+
+    def _last_view(self, next_token):
+        # The view before next_token, the token after a block or statement
+        return self.views[(self.stop if next_token.name == "$" else next_token.index) - 1]
+
+    def block(self, cur_token, G):
+        next_token, t = super().block(cur_token, G)
+        t.span = (cur_token, self._last_view(next_token))
+        return next_token, t
+
+    def statement(self, cur_token, G):
+        next_token, t = super().statement(cur_token, G)
+        t.span = (cur_token, self._last_view(next_token))
+        return next_token, t
+
+
+# Kinds of the ops TableParser runs, and what a matched terminal adds to the tree
+_MATCH, _EXPAND, _BUILD = range(3)
+_DROP, _KEEP, _LABEL, _NAME = range(4)
+_TERMINAL_ACTIONS = {'drop': _DROP, 'keep': _KEEP, 'label': _LABEL, 'name': _NAME}
+
+_table_ops = {}
+
+
+def table_ops(grammar_file, token_file):
+    """
+    Returns the op of the start symbol of the tables parser_generator makes from grammar_file (made once per table),
+    and the LL(1) conflicts of the grammar. The ops are:
+        (_MATCH, token names, action, label, error name, terminal)
+        [_EXPAND, dict of token name -> expansion, ops of the default production or None, error name,
+         expected tokens, (_BUILD, (label,)) or None, labels to build after an empty default or None]
+        (_BUILD, labels)        builds nested trees from the innermost label out, all starting at the same value
+    An expansion is what expanding the nonterminal for that token does until the token is matched: the number of
+    nonterminals it leaves open, the ops left on the stack, the _MATCH op of the token (or None if the expansion stops
+    before it) and the labels of the nonterminals that end right after the token (innermost first), so a token
+    usually takes a single lookup however deep the grammar nests.
+    Ops that go on the stack are in reverse order.
+    """
+    table_hash = grammar_hash(grammar_file, token_file)
+    if table_hash not in _table_ops:
+        tables = load_tables(grammar_file, token_file, table_hash)
+        expand_ops = [[_EXPAND, {}, None, error_name, expected, (_BUILD, (label,)) if label else None, None]
+                      for name, label, error_name, expected in tables['NONTERMINALS']]
+        production_ops = []
+        for nonterminal, symbols in tables['PRODUCTIONS']:
+            error_name = tables['NONTERMINALS'][nonterminal][2]
+            ops = []
+            for symbol in reversed(symbols):
+                if isinstance(symbol, int):
+                    ops.append(expand_ops[symbol])
+                else:
+                    terminal, names, action, label = symbol
+                    ops.append((_MATCH, frozenset(names), _TERMINAL_ACTIONS[action], label, error_name, terminal))
+            production_ops.append(ops)
+        # The dicts hold production ops until every nonterminal has its own, then they're replaced by expansions
+        for op, (row, default) in zip(expand_ops, tables['PREDICT']):
+            op[1].update((name, production_ops[p]) for name, p in row.items())
+            op[2] = production_ops[default] if default is not None else None
+        expansions = [{name: _expansion(op, production, name) for name, production in op[1].items()}
+                      for op in expand_ops]
+        for op, row in zip(expand_ops, expansions):
+            op[1] = row
+
+        # A nonterminal that is usually empty followed by the end of the one it's in (the { ... } after an operand)
+        # becomes a single op that builds that one when it's empty
+        fused = {}
+        for op in expand_ops:
+            op[1] = {name: (opened, _fuse_builds(ops, fused), match, wraps)
+                     for name, (opened, ops, match, wraps) in op[1].items()}
+            if op[2]:
+                op[2] = _fuse_builds(op[2], fused)
+        _table_ops[table_hash] = expand_ops[0], tables['CONFLICTS']
+    return _table_ops[table_hash]
+
+
+def _expansion(op, production, name):
+    # Runs the expansion of op with production for the token name, up to the op that would match the token, read
+    # another one or raise (parser_generator rejects left recursive grammars, so this always gets there)
+    stack = [op[5]] if op[5] is not None else []
+    stack.extend(production)
+    match = None
+    while stack:
+        top = stack[-1]
+        if top[0] == _MATCH:
+            if name in top[1]:
+                match = stack.pop()
+            break
+        if top[0] != _EXPAND:
+            break
+        # The dicts still hold production ops here
+        nested = top[1].get(name, top[2])
+        if nested is None:
+            break
+        stack.pop()
+        if top[5] is not None:
+            stack.append(top[5])
+        stack.extend(nested)
+
+    # Every _BUILD left was opened by this expansion, before any value was added, so one next to another only has
+    # the tree of that one as its child: they're merged into a single op
+    ops = []
+    for top in stack:
+        if top[0] == _BUILD and ops and ops[-1][0] == _BUILD:
+            ops[-1] = (_BUILD, top[1] + ops[-1][1])
+        else:
+            ops.append(top)
+    wraps = ()
+    if match is not None and ops and ops[-1][0] == _BUILD:
+        wraps = ops.pop()[1]
+    return sum(top[0] == _BUILD for top in ops), ops, match, wraps
+
+
+def _fuse_builds(ops, fused):
+    # Replaces each _EXPAND with an empty default right above a _BUILD in ops by an op that does both
+    result = []
+    for op in ops:
+        if op[0] == _EXPAND and op[2] == [] and op[6] is None and result and result[-1][0] == _BUILD:
+            result[-1] = _fused_op(op, result[-1], fused)
+        else:
+            result.append(op)
+    return result
+
+
+def _fused_op(op, build, fused):
+    key = (id(op), build)
+    if key not in fused:
+        fused_op = fused[key] = [_EXPAND, {}, [], op[3], op[4], op[5], build[1]]
+        # op's own expansions still need the _BUILD under them (a { ... } expands to itself, so it gets fused too)
+        for name, (opened, ops, match, wraps) in op[1].items():
+            fused_op[1][name] = (opened, _fuse_builds([build] + ops, fused), match, wraps)
+    return fused[key]
+
+
+class TableParser:
+    """
+    Table-driven LL(1) parser for the grammar in grammar_file (see parser_generator).
+    Builds the same tree as Parser in expr_mode 'descent' with the grammar in files/grammar.txt, with an explicit
+    stack, so nesting isn't limited by the recursion limit.
+    """
+
+    def __init__(self, isDebug, grammar_file, lex_mode = 'regex', lex_jobs = 1):
+        self.debug_flag = isDebug
+        self.grammar_file = grammar_file
+        self.lex_mode = lex_mode
+        self.lex_jobs = lex_jobs
+
+    def parse(self, source_file, token_file):
+        """
+        source_file: A program written in the ML langauge.
+        returns the tree of the start symbol if the code is syntactically correct.
+        Throws a ParserError otherwise.
+        """
+        start, conflicts = table_ops(self.grammar_file, token_file)
+        if self.debug_flag:
+            for conflict in conflicts:
+                print("LL(1) conflict in %s: %s" % (self.grammar_file, conflict))
+
+        G = iter(Lexer(source_file, token_file, self.lex_mode).tokenize(self.lex_jobs))
+        cur_token = next(G)
+        name = cur_token.name
+        # Trees of the symbols matched so far, and where the children of each open nonterminal start in it
+        values = []
+        starts = []
+        stack = [start]
+        pop = stack.pop
+        push = stack.append
+        extend = stack.extend
+        add_value = values.append
+        while stack:
+            op = pop()
+            kind = op[0]
+            if kind == _EXPAND:
+                expansion = op[1].get(name)
+                if expansion is None:
+                    production = op[2]
+                    if production:
+                        if op[5] is not None:
+                            starts.append(len(values))
+                            push(op[5])
+                        extend(production)
+                        continue
+                    if production is None:
+                        raise ParserError.raise_parse_error(op[3], op[4], cur_token)
+                    if op[5] is not None:
+                        add_value(tree(op[5][1][0]))
+                    labels = op[6]
+                    if labels is None:
+                        continue
+                else:
+                    opened, ops, op, wraps = expansion
+                    if opened:
+                        starts.extend([len(values)] * opened)
+                    extend(ops)
+                    if op is None:
+                        continue
+                    labels = None
+            elif kind == _BUILD:
+                labels = op[1]
+            else:
+                if name not in op[1]:
+                    raise ParserError.raise_parse_error(op[4], op[5], cur_token)
+                wraps = ()
+                labels = None
+
+            if labels is None:
+                # A matched token, and the nonterminals it ends
+                action = op[2]
+                if action == _DROP:
+                    node = None
+                elif action == _NAME:
+                    node = tree(name, [], cur_token)
+                elif action == _LABEL:
+                    node = tree(op[3], [], cur_token)
+                else:
+                    node = tree(op[3])
+                for label in wraps:
+                    node = tree(label, [node] if node is not None else [])
+                if node is not None:
+                    add_value(node)
+                cur_token = next(G)
+                name = cur_token.name
+            else:
+                # The end of the nonterminals in labels
+                first = starts.pop()
+                children = values[first:]
+                del values[first:]
+                for label in labels:
+                    node = tree(label, children)
+                    children = [node]
+                add_value(node)
+        if name != "$":
+            raise ParserError.raise_redundant_tokens_error(cur_token)
+        return values[0]
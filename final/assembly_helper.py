@@ -36,6 +36,97 @@ def load_immediates(op_type, ret_asm, f_reg, s_reg):
             ret_asm += asm_reg_set('$v1', f_reg)
             f_reg = '$v1'
     return ret_asm, f_reg, s_reg
+
+#  _______________________Instructions________________________
+
+
+class Label(str):
+    """
+    An operand naming a label or a .data symbol (as opposed to a register, which is a plain str starting with $)
+    """
+    __slots__ = ()
+
+
+class Mem:
+    """
+    A memory operand: offset($base) when base is a register, base + offset when it is a Label
+    """
+    __slots__ = ('offset', 'base')
+
+    def __init__(self, offset, base):
+        self.offset = offset
+        self.base = base
+
+    def __str__(self):
+        if isinstance(self.base, Label):
+            return '{:s} + {:d}'.format(self.base, self.offset)
+        return '{:d}({:s})'.format(self.offset, self.base)
+
+    def __repr__(self):
+        return 'Mem(%d, %r)' % (self.offset, self.base)
+
+
+class Instr:
+    """
+    One line of generated code, which the asm_* functions return lists of (so they still concatenate with +):
+    * op: The mnemonic ('addi', 'sw', ...), a directive ('.text') or None for a label line
+    * operands: A tuple of registers (str, like '$t0'), immediates (int), Labels and Mems
+    * label: The label this line defines (when op is None)
+    * comment: Printed after the instruction
+    * line: The line of the source statement the instruction was generated for (set by AsmBuffer)
+    str(instr) is the line in MARS syntax.
+    """
+    __slots__ = ('op', 'operands', 'label', 'comment', 'line')
+
+    def __init__(self, op, operands = (), label = None, comment = None, line = None):
+        self.op = op
+        self.operands = operands
+        self.label = label
+        self.comment = comment
+        self.line = line
+
+    def copy(self):
+        return Instr(self.op, self.operands, self.label, self.comment, self.line)
+
+    def __str__(self):
+        if self.op is None:
+            return self.label + ':\n'
+        text = self.op
+        if self.operands:
+            text += ' ' + ', '.join(map(str, self.operands))
+        if self.comment:
+            text += ' #' + self.comment
+        return text + '\n'
+
+    def __repr__(self):
+        return 'Instr(%r, %r, %r, %r, %r)' % (self.op, self.operands, self.label, self.comment, self.line)
+
+
+# Registers come in as names or Register objects, and everything else that isn't an int or a Mem is a label
+def _operand(value):
+    if type(value) is int or type(value) is Mem:
+        return value
+    if type(value) is bool:
+        return int(value)
+    value = str(value)
+    return value if value.startswith('$') else Label(value)
+
+
+# The code of one instruction: op with the operands in order
+def _asm(op, *operands, comment = None):
+    return [Instr(op, tuple(map(_operand, operands)), None, comment)]
+
+
+# The memory operand offset(base), base being a register or a .data symbol
+def _mem(base, offset):
+    return Mem(offset, _operand(base))
+
+
+# Marks the store of a function's return value (see AsmBuffer.add_return)
+def _return_comment(ret_stat):
+    return 'return' if ret_stat else None
+
+
 # _______________________Assembly________________________
 
 
@@ -69,7 +160,7 @@ def asm_init_frame_pointer():
 # 7 - read double
 # 8 - read string
 def asm_read(var_type):
-    ret_asm = ''
+    ret_asm = []
     if var_type == 'int':
         ret_asm += asm_reg_set('$v0', 5)
     elif var_type == 'float':
@@ -78,7 +169,7 @@ def asm_read(var_type):
         ret_asm += asm_reg_set('$v0', 7)
     else:
         ret_asm += asm_reg_set('$v0', 8)
-    return ret_asm + 'syscall\n'
+    return ret_asm + _asm('syscall')
 
 
 # Check current syscode if it's correct for the var_type passed
@@ -118,7 +209,7 @@ def asm_set_syscode_write(var_type):
 # 4 - print string, arg in $a0
 # If the is_a0_set boolean is True, then the will be no register equation
 def asm_write(var_reg, var_type, is_a0_set = False):
-    ret_asm = ''
+    ret_asm = []
 
     if not is_a0_set:
         if var_type == 'int':
@@ -130,7 +221,7 @@ def asm_write(var_reg, var_type, is_a0_set = False):
         else:
             ret_asm += asm_reg_set('$a0', var_reg)
 
-    return ret_asm + 'syscall\n'
+    return ret_asm + _asm('syscall')
 
 
 ## ______LOGICAL______
@@ -138,32 +229,32 @@ def asm_write(var_reg, var_type, is_a0_set = False):
 
 # ORs f_reg and s_reg and stores in r_reg
 def asm_log_or(r_reg, f_reg, s_reg):
-    ret_asm, f_reg, s_reg = load_immediates('normal', '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates('normal', [], f_reg, s_reg)
     if type(s_reg) is bool:
         s_reg = 1 if s_reg else 0
-        ret_asm += 'ori {:s}, {:s}, {:d}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('ori', r_reg, f_reg, s_reg)
     else:
-        ret_asm += 'or {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('or', r_reg, f_reg, s_reg)
     return ret_asm
 
 
 # ANDs f_reg and s_reg and stores in r_reg
 def asm_log_and(r_reg, f_reg, s_reg):
-    ret_asm, f_reg, s_reg = load_immediates('normal', '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates('normal', [], f_reg, s_reg)
     if type(s_reg) is bool:
         s_reg = 1 if s_reg else 0
-        ret_asm += 'andi {:s}, {:s}, {:d}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('andi', r_reg, f_reg, s_reg)
     else:
-        ret_asm += 'and {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('and', r_reg, f_reg, s_reg)
     return ret_asm
 
 
 def asm_log_xor(r_reg, f_reg, s_reg):
-    ret_asm, f_reg, s_reg = load_immediates('normal', '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates('normal', [], f_reg, s_reg)
     if type(s_reg) in {bool, int}:
-        ret_asm += 'xori {:s}, {:s}, {:d}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('xori', r_reg, f_reg, s_reg)
     else:
-        ret_asm += 'xor {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('xor', r_reg, f_reg, s_reg)
     return ret_asm
 
 
@@ -179,34 +270,34 @@ def asm_log_negate(r_reg, f_reg):
 # r_reg <- f_reg == s_reg
 def asm_rel_eq(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'c.eq.s {:s}, {:s}\n'.format(f_reg, s_reg) \
+        ret_asm += _asm('c.eq.s', f_reg, s_reg) \
                    + asm_reg_set('$v1', 1) \
-                   + 'movf $v1, $0\n' \
+                   + _asm('movf', '$v1', '$0') \
                    + asm_reg_set(r_reg, '$v1')
     elif type(s_reg) is bool:
         ret_asm += asm_reg_set('$v1', 1 if s_reg else 0)
         s_reg = '$v1'
     else:
-        ret_asm += 'seq {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+        ret_asm += _asm('seq', r_reg, f_reg, s_reg)
     return ret_asm
 
 
 # r_reg <- f_reg != s_reg
 def asm_rel_neq(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'c.eq.s {:s}, {:s}\n'.format(f_reg, s_reg) \
+        ret_asm += _asm('c.eq.s', f_reg, s_reg) \
                    + asm_reg_set('$v1', 1) \
-                   + 'movt $v1, $0\n' \
+                   + _asm('movt', '$v1', '$0') \
                    + asm_reg_set(r_reg, '$v1')
     elif type(s_reg) is bool:
         ret_asm += asm_reg_set('$v1', 1 if s_reg else 0)
         s_reg = '$v1'
     else:
-        ret_asm += 'sne {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+        ret_asm += _asm('sne', r_reg, f_reg, s_reg)
     return ret_asm
 
 
@@ -215,17 +306,17 @@ def asm_rel_neq(r_reg, f_reg, s_reg):
 # r_reg <- f_reg < s_reg
 def asm_rel_le(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'c.le.s {:s}, {:s}\n'.format(f_reg, s_reg) \
+        ret_asm += _asm('c.le.s', f_reg, s_reg) \
                    + asm_reg_set('$v1', 1) \
-                   + 'movf $v1, $0\n' \
+                   + _asm('movf', '$v1', '$0') \
                    + asm_reg_set(r_reg, '$v1')
     else:
         if type(s_reg) is bool:
             ret_asm += asm_reg_set('$v1', 1 if s_reg else 0)
             s_reg = '$v1'
-        ret_asm += 'sle {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+        ret_asm += _asm('sle', r_reg, f_reg, s_reg)
     return ret_asm
 
 
@@ -233,51 +324,51 @@ def asm_rel_le(r_reg, f_reg, s_reg):
 # r_reg <- f_reg <= s_reg
 def asm_rel_lt(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'c.lt.s {:s}, {:s}\n'.format(f_reg, s_reg) \
+        ret_asm += _asm('c.lt.s', f_reg, s_reg) \
                    + asm_reg_set('$v1', 1) \
-                   + 'movf $v1, $0\n' \
+                   + _asm('movf', '$v1', '$0') \
                    + asm_reg_set(r_reg, '$v1')
     else:
         if type(s_reg) is int:
-            ret_asm += 'slti {:s}, {:s}, {:d}\n'.format(r_reg, f_reg, s_reg)
+            ret_asm += _asm('slti', r_reg, f_reg, s_reg)
         else:
-            ret_asm += 'slt {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+            ret_asm += _asm('slt', r_reg, f_reg, s_reg)
     return ret_asm
 
 
 # r_reg <- f_reg > s_reg
 def asm_rel_ge(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'c.lt.s {:s}, {:s}\n'.format(f_reg, s_reg) \
+        ret_asm += _asm('c.lt.s', f_reg, s_reg) \
                    + asm_reg_set('$v1', 1) \
-                   + 'movt $v1, $0\n' \
+                   + _asm('movt', '$v1', '$0') \
                    + asm_reg_set(r_reg, '$v1')
     else:
         if type(s_reg) is bool:
             ret_asm += asm_reg_set('$v1', 1 if s_reg else 0)
             s_reg = '$v1'
-        ret_asm += 'sge {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+        ret_asm += _asm('sge', r_reg, f_reg, s_reg)
     return ret_asm
 
 
 # r_reg <- f_reg >= s_reg
 def asm_rel_gt(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'c.le.s {:s}, {:s}\n'.format(f_reg, s_reg) \
+        ret_asm += _asm('c.le.s', f_reg, s_reg) \
                    + asm_reg_set('$v1', 1) \
-                   + 'movt $v1, $0\n' \
+                   + _asm('movt', '$v1', '$0') \
                    + asm_reg_set(r_reg, '$v1')
     else:
         if type(s_reg) is bool:
             ret_asm += asm_reg_set('$v1', 1 if s_reg else 0)
             s_reg = '$v1'
-        ret_asm += 'sgt {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+        ret_asm += _asm('sgt', r_reg, f_reg, s_reg)
     return ret_asm
 
 
@@ -288,13 +379,13 @@ def asm_rel_gt(r_reg, f_reg, s_reg):
 # r_reg = f_reg + s_reg
 def asm_add(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'add.s {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('add.s', r_reg, f_reg, s_reg)
     elif type(s_reg) is int:
-        ret_asm += 'addi {:s}, {:s}, {:d}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('addi', r_reg, f_reg, s_reg)
     else:
-        ret_asm += 'add {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('add', r_reg, f_reg, s_reg)
     return ret_asm
 
 
@@ -303,13 +394,13 @@ def asm_add(r_reg, f_reg, s_reg):
 # r_reg = f_reg - s_reg
 def asm_sub(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'sub.s {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('sub.s', r_reg, f_reg, s_reg)
     elif type(s_reg) is int:
-        ret_asm += 'subi {:s}, {:s}, {:d}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('subi', r_reg, f_reg, s_reg)
     else:
-        ret_asm += 'sub {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('sub', r_reg, f_reg, s_reg)
     return ret_asm
 
 
@@ -317,33 +408,33 @@ def asm_sub(r_reg, f_reg, s_reg):
 # r_reg = f_reg * s_reg
 def asm_multiply(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'mul.s {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('mul.s', r_reg, f_reg, s_reg)
     else:
-        ret_asm += 'mul {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+        ret_asm += _asm('mul', r_reg, f_reg, s_reg)
     return ret_asm
 
 
 # r_reg = f_reg / s_reg
 def asm_divide(r_reg, f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm, f_reg, s_reg = load_immediates(op_type, '', f_reg, s_reg)
+    ret_asm, f_reg, s_reg = load_immediates(op_type, [], f_reg, s_reg)
     if op_type == 'float':
-        ret_asm += 'div.s {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, s_reg)
+        ret_asm += _asm('div.s', r_reg, f_reg, s_reg)
     else:
-        ret_asm += 'div {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+        ret_asm += _asm('div', r_reg, f_reg, s_reg)
     return ret_asm
 
 
 # Only defined for integers
 # r_reg = f_reg % s_reg
 def asm_modulo(r_reg, f_reg, s_reg):
-    ret_asm = ''
+    ret_asm = []
     if type(f_reg) is int:
         ret_asm += asm_reg_set('$v1', f_reg)
         f_reg = '$v1'
-    ret_asm += 'rem {:s}, {:s}, {:s}\n'.format(r_reg, f_reg, str(s_reg))
+    ret_asm += _asm('rem', r_reg, f_reg, s_reg)
     return ret_asm
 
 
@@ -352,34 +443,34 @@ def asm_modulo(r_reg, f_reg, s_reg):
 # f_reg = s_reg
 def asm_reg_set(f_reg, s_reg):
     op_type = get_op_type(f_reg, s_reg)
-    ret_asm = ''
+    ret_asm = []
     # We don't use the shortcut load_immediates here because this is the function used in that
     if op_type == 'float':
         if type(s_reg) is float:
-            ret_asm += 'li {:s}, {:d}\n'.format('$v1', int(convert_float_to_binary(s_reg), 2)) \
-                  + 'mtc1 {:s}, {:s}\n'.format('$v1', '$f13')
+            ret_asm += _asm('li', '$v1', int(convert_float_to_binary(s_reg), 2)) \
+                  + _asm('mtc1', '$v1', '$f13')
             s_reg = '$f13'
         elif type(s_reg) is int:
             print('error state')
             pass
         elif type(f_reg) is float:
-            ret_asm += 'li {:s}, {:d}\n'.format('$v1', int(convert_float_to_binary(f_reg), 2)) \
-                  + 'mtc1 {:s}, {:s}\n'.format('$v1', '$f13')
+            ret_asm += _asm('li', '$v1', int(convert_float_to_binary(f_reg), 2)) \
+                  + _asm('mtc1', '$v1', '$f13')
             f_reg = '$f13'
         elif 'f' not in str(s_reg):
             ret_asm += asm_cast_int_to_float('$f13', s_reg)
             s_reg = '$f13'
         elif 't' in str(f_reg) or 's' in str(f_reg):
-            return 'mfc1 {:s}, {:s}\n'.format(f_reg, s_reg)
+            return _asm('mfc1', f_reg, s_reg)
 
-        ret_asm += 'mov.s {:s}, {:s}\n'.format(f_reg, s_reg)
+        ret_asm += _asm('mov.s', f_reg, s_reg)
     else: # int
         if type(s_reg) in {int, bool}:
-            ret_asm += 'li {:s}, {:d}\n'.format(f_reg, s_reg)
+            ret_asm += _asm('li', f_reg, s_reg)
         elif type(f_reg) in {int, bool}:
-            ret_asm += 'li {:s}, {:d}\n'.format(s_reg, f_reg)
+            ret_asm += _asm('li', s_reg, f_reg)
         else:
-            ret_asm += 'move {:s}, {:s}\n'.format(f_reg, s_reg)
+            ret_asm += _asm('move', f_reg, s_reg)
     return ret_asm
 
 ## ______READ/WRITE RAM______
@@ -387,103 +478,112 @@ def asm_reg_set(f_reg, s_reg):
 
 # Loads a variable's memory address into a register
 def asm_load_mem_addr(mem_name, temp_reg):
-    return 'la {:s}, {:s}\n'.format(temp_reg, mem_name)
+    return _asm('la', temp_reg, mem_name)
 
 
 # Assumes mem_name address isn't in memory already
 def asm_load_mem_var(mem_name, addr_reg, dest_reg, offset = 0):
     if 'f' in str(dest_reg):
-        return 'la {:s}, {:s}\nl.s {:s}, {:d}({:s})\n'.format(addr_reg, mem_name, dest_reg, offset, addr_reg)
+        return _asm('la', addr_reg, mem_name) + _asm('l.s', dest_reg, _mem(addr_reg, offset))
     else:
-        return 'la {:s}, {:s}\nlw {:s}, {:d}({:s})\n'.format(addr_reg, mem_name, dest_reg, offset, addr_reg)
+        return _asm('la', addr_reg, mem_name) + _asm('lw', dest_reg, _mem(addr_reg, offset))
 
 
 # REQRITE
 # Assumes mem_addr_reg holds RAM location of desired variable
 def asm_load_mem_var_from_addr(mem_addr_reg, dest_reg, offset = 0):
     if 'f' in str(dest_reg):
-        return 'l.s {:s}, {:d}({:s})\n'.format(dest_reg, offset, mem_addr_reg)
+        return _asm('l.s', dest_reg, _mem(mem_addr_reg, offset))
     elif type(mem_addr_reg) is str and '$' not in mem_addr_reg:
-        return 'lw {:s}, {:s} + {:d}\n'.format(dest_reg, mem_addr_reg, offset)
+        return _asm('lw', dest_reg, _mem(mem_addr_reg, offset))
     else:
-        return 'lw {:s}, {:d}({:s})\n'.format(dest_reg, offset, mem_addr_reg)
+        return _asm('lw', dest_reg, _mem(mem_addr_reg, offset))
 
 
 # Assumes mem_name address isn't in memory already
 def asm_save_mem_var(mem_name, addr_reg, var_reg, offset = 0):
     if 'f' in str(var_reg):
-        return 'la {:s}, {:s}\ns.s {:s}, {:d}({:s})\n'.format(addr_reg, mem_name, var_reg, offset, addr_reg)
+        return _asm('la', addr_reg, mem_name) + _asm('s.s', var_reg, _mem(addr_reg, offset))
     else:
-        return 'la {:s}, {:s}\nsw {:s}, {:d}({:s})\n'.format(addr_reg, mem_name, var_reg, offset, addr_reg)
+        return _asm('la', addr_reg, mem_name) + _asm('sw', var_reg, _mem(addr_reg, offset))
 
 
 # REWRITE
 # Assumes mem_addr_reg holds RAM location of desired variable
 def asm_save_mem_var_from_addr(mem_addr_reg, var_reg, offset = 0, ret_stat=False):
     if type(mem_addr_reg) is str and '$' not in mem_addr_reg: # might be risky to assume this, although we won't make labels with $
-        ret = ''
+        ret = []
         if 'f' in str(var_reg) and 'fp' not in str(var_reg):
-            return 's.s {:s}, {:s} + {:d} {:s}\n'.format(var_reg, mem_addr_reg, offset, '#return' if ret_stat else '')
+            return _asm('s.s', var_reg, _mem(mem_addr_reg, offset), comment = _return_comment(ret_stat))
         if type(var_reg) is float:
             ret = asm_reg_set('$f13', var_reg)
-            ret += 's.s {:s}, {:s} + {:d} {:s}\n'.format('$f13', mem_addr_reg, offset, '#return' if ret_stat else '')
+            ret += _asm('s.s', '$f13', _mem(mem_addr_reg, offset), comment = _return_comment(ret_stat))
             return ret
         if type(var_reg) in {int, bool}:
             ret = asm_reg_set('$v1', var_reg)
             var_reg = '$v1'
-        ret += 'sw {:s}, {:s} + {:d} {:s}\n'.format(var_reg, mem_addr_reg, offset, '#return' if ret_stat else '')
+        ret += _asm('sw', var_reg, _mem(mem_addr_reg, offset), comment = _return_comment(ret_stat))
         return ret
     elif 'f' in str(var_reg) and 'fp' not in str(var_reg):
-        return 's.s {:s}, {:d}({:s}) {:s}\n'.format(var_reg, offset, mem_addr_reg, '#return' if ret_stat else '')
+        return _asm('s.s', var_reg, _mem(mem_addr_reg, offset), comment = _return_comment(ret_stat))
     elif type(var_reg) in {int, bool}:
         ret = asm_reg_set('$v1', var_reg)
-        ret += 'sw {:s}, {:d}({:s}) {:s}\n'.format('$v1', offset, mem_addr_reg, '#return' if ret_stat else '')
+        ret += _asm('sw', '$v1', _mem(mem_addr_reg, offset), comment = _return_comment(ret_stat))
         return ret
     elif type(var_reg) is float:
         ret = asm_reg_set('$f13', var_reg)
-        ret += 's.s {:s}, {:d}({:s}) {:s}\n'.format('$f13', offset, mem_addr_reg, '#return' if ret_stat else '')
+        ret += _asm('s.s', '$f13', _mem(mem_addr_reg, offset), comment = _return_comment(ret_stat))
         return ret
     else:
-        return 'sw {:s}, {:d}({:s}) {:s}\n'.format(var_reg, offset, mem_addr_reg, '#return' if ret_stat else '')
+        return _asm('sw', var_reg, _mem(mem_addr_reg, offset), comment = _return_comment(ret_stat))
 
 ## _______________________Conditionals________________________
 
 
 def asm_conditional_check(reg, label):
-    ret, reg, _ = load_immediates('normal', '', reg, None)
-    ret += 'beqz {:s}, {:s}\n'.format(reg, label)
+    ret, reg, _ = load_immediates('normal', [], reg, None)
+    ret += _asm('beqz', reg, label)
     return ret
 
 ## _______________________Branching________________________
 
 def asm_jal_to_label(label):
-    return 'jal {:s}'.format(label)
+    return _asm('jal', label)
 
 def asm_branch_to_label(label):
-    return 'b {:s}\n'.format(label)
+    return _asm('b', label)
+
+def asm_jump_to_reg(reg):
+    return _asm('jr', reg)
+
+def asm_label(label):
+    return [Instr(None, (), label)]
+
+def asm_section(name):
+    return _asm(name)
 
 # _______________________Helpers________________________
 
 
 # Helper that will convert an int to a float
 def asm_cast_int_to_float(f_reg, i_reg):
-    ret_asm = ''
+    ret_asm = []
     if type(i_reg) is int:
         ret_asm += asm_reg_set('$v1', i_reg)
         i_reg = '$v1'
-    ret_asm += 'mtc1 {:s}, {:s}\ncvt.s.w {:s}, {:s}\n'.format(i_reg, f_reg, f_reg, f_reg)
+    ret_asm += _asm('mtc1', i_reg, f_reg) + _asm('cvt.s.w', f_reg, f_reg)
     return ret_asm
 
 
 # This allows for bools to be able to be dynamically printed
 def asm_dynamic_bool_print(r_reg, f_reg, true_addr_reg, false_addr_reg):
-    return asm_rel_eq('$v1', f_reg, 1) + 'movn {:s}, {:s}, {:s}\n'.format(r_reg, true_addr_reg, '$v1') + \
-           'movz {:s}, {:s}, {:s}\n'.format(r_reg, false_addr_reg, '$v1')
+    return asm_rel_eq('$v1', f_reg, 1) + _asm('movn', r_reg, true_addr_reg, '$v1') + \
+           _asm('movz', r_reg, false_addr_reg, '$v1')
 
 
 # Saves all registers to stack
 def asm_save_off_reg_pool(reg_pool):
-    ret = ''
+    ret = []
     for i in range(0, len(reg_pool), 1):
         ret += asm_allocate_stack_space(4)
         ret += asm_save_reg_to_stack(reg_pool[i])
@@ -492,7 +592,7 @@ def asm_save_off_reg_pool(reg_pool):
 
 # Reloads registers from stack
 def asm_load_reg_pool_from_stack(reg_pool):
-    ret = ''
+    ret = []
     for i in range(len(reg_pool) - 1, -1, -1):
         ret += asm_load_reg_from_stack(reg_pool[i])
         ret += asm_add('$sp', '$sp', 4)
@@ -500,26 +600,99 @@ def asm_load_reg_pool_from_stack(reg_pool):
 
 
 # Load variables from mem to stack
-def asm_save_variables_to_stack(sym_dicts):
-    ret = ''
-    for i in range(0, len(sym_dicts), 1):
-        if sym_dicts[i]['used']:
+def asm_save_variables_to_stack(sym_entries):
+    ret = []
+    for i in range(0, len(sym_entries), 1):
+        if sym_entries[i].used:
             ret += asm_allocate_stack_space(4)
-            ret += asm_load_mem_var_from_addr(sym_dicts[i]['mem_name'], '$v1')
+            ret += asm_load_mem_var_from_addr(sym_entries[i].mem_name, '$v1')
             ret += asm_save_mem_var_from_addr('$sp', '$v1')
     return ret
 
 
 # Save variables from stack to mem
-def asm_load_variables_from_stack(sym_dicts):
-    ret = ''
-    for i in range(len(sym_dicts) - 1, -1, -1):
-        if sym_dicts[i]['used']:
+def asm_load_variables_from_stack(sym_entries):
+    ret = []
+    for i in range(len(sym_entries) - 1, -1, -1):
+        if sym_entries[i].used:
             ret += asm_load_mem_var_from_addr('$sp', '$v1')
-            ret += asm_save_mem_var_from_addr(sym_dicts[i]['mem_name'], '$v1')
+            ret += asm_save_mem_var_from_addr(sym_entries[i].mem_name, '$v1')
             ret += asm_add('$sp', '$sp', 4)
     return ret
 
 
 def asm_call_exit():
-    return 'la $v0, 10\nsyscall\n'
+    return _asm('la', '$v0', 10) + _asm('syscall')
+
+
+## _______________________Output________________________
+
+
+class AsmBuffer:
+    """
+    Generated code as a list of Instrs, so adding code is O(1) instead of copying everything emitted so far, and
+    passes over the code don't have to parse it back out of text. buffer += asm appends the instructions of asm (a list
+    from the asm_* functions), setting their line to buffer.line, and write(fp) prints them out.
+    The stores of a function's return value (see add_return) are remembered, so they can be patched afterwards.
+    """
+    __slots__ = ('instrs', 'returns', 'line')
+
+    def __init__(self, line = None):
+        self.instrs = []
+        # Indices of the instructions that store a return value
+        self.returns = []
+        # The line of the statement being compiled
+        self.line = line
+
+    def __iadd__(self, asm):
+        line = self.line
+        for instr in asm:
+            instr.line = line
+        self.instrs.extend(asm)
+        return self
+
+    def __iter__(self):
+        return iter(self.instrs)
+
+    def __len__(self):
+        return len(self.instrs)
+
+    def extend(self, other):
+        self.instrs.extend(other.instrs)
+
+    def add_return(self, store, jump):
+        # store: asm_save_mem_var_from_addr(..., ret_stat=True), jump: the jump back
+        self += store
+        self.returns.append(len(self.instrs) - 1)
+        self += jump
+
+    def patch_returns(self, offset, restore):
+        # Moves the stack offset of every return's store (from 0 to offset) and puts a copy of restore right after it
+        if not self.returns:
+            return False
+        instrs = []
+        start = 0
+        for index in self.returns:
+            store = self.instrs[index]
+            store.operands = store.operands[:-1] + (Mem(offset, store.operands[-1].base),)
+            instrs.extend(self.instrs[start:index + 1])
+            for instr in restore:
+                instr = instr.copy()
+                instr.line = store.line
+                instrs.append(instr)
+            start = index + 1
+        instrs.extend(self.instrs[start:])
+        self.instrs = instrs
+        self.returns.clear()
+        return True
+
+    def instruction_count(self):
+        # The number of instructions (not counting labels and directives)
+        return sum(1 for instr in self.instrs if instr.op is not None and instr.op[0] != '.')
+
+    def write(self, fp):
+        fp.writelines(map(str, self.instrs))
+
+    def clear(self):
+        self.instrs.clear()
+        self.returns.clear()
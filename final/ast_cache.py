@@ -0,0 +1,203 @@
+"""
+On-disk cache of parsed programs (the ast_nodes AST that to_ast returns), so a source that hasn't changed can be
+compiled again without lexing and parsing it.
+
+Entries are content-addressed: each one is a file in the cache directory named after the sha1 of the source text, the
+sha1 of the token file, MLparser.PARSER_VERSION and the grammar file of a TableParser, so editing any of them (or the
+parser) just misses the cache.
+An entry is a zlib-compressed, marshal'd dict:
+* codes, lengths: the AST as a flat array of one-byte codes in postorder, plus the length of every list (see
+  _encode), so trees of any depth can be stored
+* token_kinds and the TokenBuffer columns: the tokens the AST uses, in the order the codes use them (the source
+  itself isn't stored, it's read to compute the key anyway)
+Saving an entry prunes the cache directory to AST_CACHE_MAX_ENTRIES entries and AST_CACHE_MAX_BYTES bytes, dropping
+the entries used longest ago first (loading an entry updates its mtime).
+"""
+
+import os
+import zlib
+import hashlib
+import marshal
+from array import array
+from lexer import *
+from ast_nodes import *
+from MLparser import PARSER_VERSION
+from parser_generator import grammar_hash
+
+# Bump this whenever the layout of an entry (or the order of NODE_TYPES) changes
+AST_CACHE_VERSION = 1
+
+# Most entries, and bytes in them, a cache directory keeps
+AST_CACHE_MAX_ENTRIES = 1000
+AST_CACHE_MAX_BYTES = 256 << 20
+
+# Node classes by code; the codes after them are for the other field values
+NODE_TYPES = [Block, Read, Write, Return, Declaration, DecTerm, Assign, Call, FuncDecl, Param, If, While, BinOp,
+              UnaryOp, Literal, Var]
+_NODE_CODES = {node_type: code for code, node_type in enumerate(NODE_TYPES)}
+_NONE, _FALSE, _TRUE, _LIST, _TOKEN = range(len(NODE_TYPES), len(NODE_TYPES) + 5)
+
+# Names of the TokenBuffer columns in an entry, in the order of TokenBuffer.columns()
+_COLUMNS = ('kinds', 'starts', 'ends', 'line_nums', 'line_starts', 'line_ends')
+
+
+def default_cache_dir(token_file):
+    return os.path.join(os.path.dirname(token_file), 'ast_cache')
+
+
+class ASTCache:
+    """
+    The cache entry of one source file, in cache_dir (for a TableParser of grammar_file if it is given).
+    load() returns the cached AST (None on a miss), save(block) stores the AST of the source and prunes cache_dir to
+    max_entries entries and max_bytes bytes.
+    """
+
+    def __init__(self, source_file, token_file, cache_dir, grammar_file = None, max_entries = AST_CACHE_MAX_ENTRIES,
+                 max_bytes = AST_CACHE_MAX_BYTES):
+        self.source = read_source(source_file)
+        key = hashlib.sha1()
+        key.update(self.source.encode())
+        key.update(token_file_hash(token_file).encode())
+        key.update(str(PARSER_VERSION).encode())
+        if grammar_file:
+            key.update(grammar_hash(grammar_file, token_file).encode())
+        self.cache_dir = cache_dir
+        self.cache_file = os.path.join(cache_dir, key.hexdigest() + '.ast')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'rb') as fp:
+                data = marshal.loads(zlib.decompress(fp.read()))
+            if data['version'] != AST_CACHE_VERSION:
+                return None
+            buffer = TokenBuffer(self.source, data['token_kinds'])
+            for column, name in zip(buffer.columns(), _COLUMNS):
+                column.frombytes(data[name])
+            codes = array('B', data['codes'])
+            lengths = array('I')
+            lengths.frombytes(data['lengths'])
+            block = _decode(codes, lengths, buffer)
+        except (OSError, EOFError, ValueError, TypeError, KeyError, IndexError, StopIteration, zlib.error):
+            return None
+        # The entry was just used, so pruning drops it last
+        try:
+            os.utime(self.cache_file)
+        except OSError:
+            pass
+        return block
+
+    def save(self, block):
+        codes, lengths, tokens = _encode(block)
+        token_kinds = tokens[0].buffer.token_kinds if tokens else []
+        buffer = TokenBuffer(self.source, token_kinds)
+        kinds, starts, ends, line_nums, line_starts, line_ends = buffer.columns()
+        for token in tokens:
+            source_buffer = token.buffer
+            kinds.append(source_buffer.kinds[token.index])
+            starts.append(source_buffer.starts[token.index])
+            ends.append(source_buffer.ends[token.index])
+            line_nums.append(source_buffer.line_nums[token.index])
+        if tokens:
+            line_starts.extend(tokens[0].buffer.line_starts)
+            line_ends.extend(tokens[0].buffer.line_ends)
+
+        data = {'version': AST_CACHE_VERSION, 'token_kinds': token_kinds, 'codes': codes.tobytes(),
+                'lengths': lengths.tobytes()}
+        for column, name in zip(buffer.columns(), _COLUMNS):
+            data[name] = column.tobytes()
+
+        # Write to a temp file and rename it, so compilers running at the same time never read half an entry
+        temp_file = '%s.%d.tmp' % (self.cache_file, os.getpid())
+        try:
+            os.makedirs(self.cache_dir, exist_ok = True)
+            with open(temp_file, 'wb') as fp:
+                fp.write(zlib.compress(marshal.dumps(data), 1))
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            # A read-only cache directory just means no caching
+            return
+        self._prune()
+
+    def _prune(self):
+        # Deletes the entries used longest ago until the directory has at most max_entries entries and max_bytes bytes
+        # in them (another compiler may be deleting them too, so a missing entry is skipped)
+        entries = []
+        try:
+            for dir_entry in os.scandir(self.cache_dir):
+                if dir_entry.name.endswith('.ast'):
+                    try:
+                        stat = dir_entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+        except OSError:
+            return
+        count = len(entries)
+        size = sum(entry_size for _, entry_size, _ in entries)
+        entries.sort()
+        for _, entry_size, entry_path in entries:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+            count -= 1
+            size -= entry_size
+
+
+# Postorder codes: a node is its fields followed by its node code, a list is its items followed by _LIST (its length
+# is the next number in lengths), a token is _TOKEN (it's the next token in tokens).
+# Built as the reverse of a walk that visits a node before its fields (last field first), then reversed.
+def _encode(block):
+    codes = array('B')
+    lengths = array('I')
+    tokens = []
+    values = [block]
+    while values:
+        value = values.pop()
+        if isinstance(value, Node):
+            codes.append(_NODE_CODES[type(value)])
+            values.extend(value.fields())
+        elif isinstance(value, list):
+            codes.append(_LIST)
+            lengths.append(len(value))
+            values.extend(value)
+        elif value is None:
+            codes.append(_NONE)
+        elif value is True or value is False:
+            codes.append(_TRUE if value else _FALSE)
+        else: # TokenView
+            codes.append(_TOKEN)
+            tokens.append(value)
+    codes.reverse()
+    lengths.reverse()
+    tokens.reverse()
+    return codes, lengths, tokens
+
+
+def _decode(codes, lengths, buffer):
+    tokens = iter([TokenView(buffer, index) for index in range(len(buffer))])
+    lengths = iter(lengths)
+    values = []
+    for code in codes:
+        if code < len(NODE_TYPES):
+            node_type = NODE_TYPES[code]
+            start = len(values) - len(node_type.__slots__)
+            node = node_type(*values[start:])
+            del values[start:]
+            values.append(node)
+        elif code == _TOKEN:
+            values.append(next(tokens))
+        elif code == _LIST:
+            start = len(values) - next(lengths)
+            items = values[start:]
+            del values[start:]
+            values.append(items)
+        else:
+            values.append(None if code == _NONE else code == _TRUE)
+    if len(values) != 1 or type(values[0]) is not Block:
+        raise ValueError('bad AST cache entry')
+    return values[0]
@@ -0,0 +1,409 @@
+"""
+Typed AST for the Micro-language.
+
+Every node class has named fields (in __slots__) instead of a label and a list of children, and the punctuation the
+parser tree keeps around (BEGIN, END, THEN, ...) is gone. Identifiers, types and operators are kept as their tokens.
+
+    Block(statements)
+    Read(idents)                        idents: ID tokens
+    Write(exprs)
+    Return(expr)
+    Declaration(type, terms)            type: TYPE token, terms: DecTerm nodes
+    DecTerm(ident, expr)                expr is None without an initial value
+    Assign(ident, expr)
+    Call(ident, args)                   as a statement or in an expression
+    FuncDecl(ident, params, return_type, body)   body: Block, or LazyBlock for a body the parser skipped
+    Param(type, ident, is_ref)
+    If(cond, then_block, else_block)    else_block is None without an else
+    While(cond, body)
+    BinOp(op, lhs, rhs)                 op: operator token
+    UnaryOp(op, operand)
+    Literal(token)
+    Var(token)
+    LazyBlock(skipped)                  skipped: MLparser.SkippedBlock, block() parses and converts it
+
+to_ast converts a tree from MLparser.Parser (from either expression mode) into these nodes.
+Nodes are counted and compared without recursion, so they work on trees of any depth.
+"""
+
+from errors import *
+from trampoline import *
+
+
+class Node:
+    """
+    Base class of the AST nodes.
+    Nodes compare equal when they have the same type and equal fields.
+    """
+    __slots__ = ()
+
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def children(self):
+        """
+        Yields the child nodes, in field order
+        """
+        for value in self.fields():
+            if isinstance(value, Node):
+                yield value
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, Node):
+                        yield item
+
+    def line_num(self):
+        """
+        Return the line of the first token of the node (None if it has no tokens)
+        """
+        values = [self]
+        while values:
+            value = values.pop()
+            if isinstance(value, Node):
+                values.extend(reversed(value.fields()))
+            elif isinstance(value, list):
+                values.extend(reversed(value))
+            elif value is not None and type(value) is not bool:
+                return value.line_num
+        return None
+
+    def __len__(self):
+        """
+        Return number of nodes in the AST
+        """
+        # Walked with a list instead of recursion, so deeply nested trees work too
+        count = 0
+        nodes = [self]
+        while nodes:
+            count += 1
+            nodes.extend(nodes.pop().children())
+        return count
+
+    def __eq__(self, other):
+        pairs = [(self, other)]
+        while pairs:
+            node, other = pairs.pop()
+            if type(node) is not type(other):
+                return False
+            for value, other_value in zip(node.fields(), other.fields()):
+                if isinstance(value, list):
+                    if not isinstance(other_value, list) or len(value) != len(other_value):
+                        return False
+                    items = zip(value, other_value)
+                else:
+                    items = [(value, other_value)]
+                for item, other_item in items:
+                    if isinstance(item, Node):
+                        pairs.append((item, other_item))
+                    elif item != other_item:
+                        return False
+        return True
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%s' % (name, _field_str(value)) for name, value in zip(self.__slots__, self.fields())))
+
+
+def _field_str(value):
+    if isinstance(value, list):
+        return '[' + ', '.join(_field_str(item) for item in value) + ']'
+    if value is None or isinstance(value, (Node, bool)):
+        return repr(value)
+    return repr(value.pattern) # Token
+
+
+class Block(Node):
+    __slots__ = ('statements',)
+
+    def __init__(self, statements):
+        self.statements = statements
+
+
+class Read(Node):
+    __slots__ = ('idents',)
+
+    def __init__(self, idents):
+        self.idents = idents
+
+
+class Write(Node):
+    __slots__ = ('exprs',)
+
+    def __init__(self, exprs):
+        self.exprs = exprs
+
+
+class Return(Node):
+    __slots__ = ('expr',)
+
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class Declaration(Node):
+    __slots__ = ('type', 'terms')
+
+    def __init__(self, type, terms):
+        self.type = type
+        self.terms = terms
+
+
+class DecTerm(Node):
+    __slots__ = ('ident', 'expr')
+
+    def __init__(self, ident, expr):
+        self.ident = ident
+        self.expr = expr
+
+
+class Assign(Node):
+    __slots__ = ('ident', 'expr')
+
+    def __init__(self, ident, expr):
+        self.ident = ident
+        self.expr = expr
+
+
+class Call(Node):
+    __slots__ = ('ident', 'args')
+
+    def __init__(self, ident, args):
+        self.ident = ident
+        self.args = args
+
+
+class FuncDecl(Node):
+    __slots__ = ('ident', 'params', 'return_type', 'body')
+
+    def __init__(self, ident, params, return_type, body):
+        self.ident = ident
+        self.params = params
+        self.return_type = return_type
+        self.body = body
+
+
+class Param(Node):
+    __slots__ = ('type', 'ident', 'is_ref')
+
+    def __init__(self, type, ident, is_ref):
+        self.type = type
+        self.ident = ident
+        self.is_ref = is_ref
+
+
+class If(Node):
+    __slots__ = ('cond', 'then_block', 'else_block')
+
+    def __init__(self, cond, then_block, else_block):
+        self.cond = cond
+        self.then_block = then_block
+        self.else_block = else_block
+
+
+class While(Node):
+    __slots__ = ('cond', 'body')
+
+    def __init__(self, cond, body):
+        self.cond = cond
+        self.body = body
+
+
+class BinOp(Node):
+    __slots__ = ('op', 'lhs', 'rhs')
+
+    def __init__(self, op, lhs, rhs):
+        self.op = op
+        self.lhs = lhs
+        self.rhs = rhs
+
+
+class UnaryOp(Node):
+    __slots__ = ('op', 'operand')
+
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+
+
+class Literal(Node):
+    __slots__ = ('token',)
+
+    def __init__(self, token):
+        self.token = token
+
+
+class Var(Node):
+    __slots__ = ('token',)
+
+    def __init__(self, token):
+        self.token = token
+
+
+class LazyBlock(Node):
+    __slots__ = ('skipped',)
+
+    def __init__(self, skipped):
+        self.skipped = skipped
+
+    def block(self, call_mode = 'recursive'):
+        """
+        Parses the body and returns its Block
+        """
+        return to_ast(self.skipped.parse(), call_mode)
+
+    def is_used(self, name):
+        """
+        False if the function name can't be called: it isn't an identifier anywhere else in the program
+        """
+        return self.skipped.is_used(name)
+
+    def line_num(self):
+        return self.skipped.begin.line_num
+
+    def __repr__(self):
+        return 'LazyBlock(line %d)' % self.skipped.begin.line_num
+
+
+# Converting from the parser tree
+
+# Labels of the <expr_bool> -> ... -> <term_arith> levels of the recursive-descent tree
+_EXPR_CHAIN_LABELS = {'EXPR_BOOL', 'TERM_BOOL', 'EXPR_EQ', 'EXPR_RELATION', 'EXPR_ARITH', 'TERM_ARITH'}
+
+
+def to_ast(block_tree, call_mode = 'recursive'):
+    """
+    Converts the BLOCK tree returned by MLparser.Parser.parse into a Block
+    With call_mode = 'stack' the conversion runs on an explicit stack (see trampoline).
+    """
+    if call_mode == 'stack':
+        return run(stack_functions(_CONVERTERS)['_block'](block_tree))
+    return _block(block_tree)
+
+
+def statement_to_ast(statement_tree, call_mode = 'recursive'):
+    """
+    Converts a STATEMENT tree (see MLparser.Parser.parse_statements) into its statement node
+    """
+    if call_mode == 'stack':
+        return run(stack_functions(_CONVERTERS)['_statement'](statement_tree))
+    return _statement(statement_tree)
+
+
+# The converters can't call each other from comprehensions, since the stack versions yield those calls
+
+# BLOCK -> [BEGIN, STATEMENT_LIST, END]
+def _block(block_tree):
+    statements = []
+    for statement in block_tree.children[1].children:
+        statements.append(_statement(statement))
+    return Block(statements)
+
+
+def _statement(statement_tree):
+    child = statement_tree.children[0]
+    label = child.label
+    if label == 'READ':
+        return Read([ident.token for ident in statement_tree.children[1].children])
+    if label == 'WRITE':
+        exprs = []
+        for expr in statement_tree.children[1].children:
+            exprs.append(_expr(expr))
+        return Write(exprs)
+    if label == 'RETURN':
+        return Return(_expr(child.children[0]))
+    if label == 'DECLARATION':
+        type_tree, dec_list = child.children
+        terms = []
+        for term in dec_list.children:
+            terms.append(DecTerm(term.children[0].token, _expr(term.children[1]) if len(term.children) > 1 else None))
+        return Declaration(type_tree.token, terms)
+    if label == 'IF_STATEMENT':
+        # [IF, <expr_bool>, THEN, <block>, [ELSE, <block>]]
+        children = child.children
+        return If(_expr(children[1]), _block(children[3]), _block(children[5]) if len(children) > 4 else None)
+    if label == 'WHILE_STATEMENT':
+        return While(_expr(child.children[1]), _block(child.children[2]))
+
+    # ID_STATEMENT -> [IDENT, ID_STATE_BODY]
+    ident_tree, state_body = child.children
+    body = state_body.children[0]
+    if body.label == 'ASSIGN':
+        return Assign(ident_tree.token, _expr(body.children[0]))
+    return _func(ident_tree.token, body, True)
+
+
+# FUNC -> [FUNC_GEN, [FUNC_DEC_TAIL]]
+# A FUNC with a tail is a declaration, anything else is a call
+def _func(ident, func_tree, is_statement):
+    func_gen = func_tree.children[0].children
+    tail = func_tree.children[1].children if len(func_tree.children) > 1 else None
+    is_dec = bool(func_gen) and func_gen[0].label == 'FUNC_DEC'
+
+    if tail is None:
+        if is_dec:
+            ParserError.raise_func_error(ident, 'needs a block after its parameters')
+        args = []
+        if func_gen:
+            for expr in func_gen[0].children[0].children:
+                args.append(_expr(expr))
+        return Call(ident, args)
+
+    if not is_statement:
+        ParserError.raise_func_error(ident, 'cannot be declared inside an expression')
+    if func_gen and not is_dec:
+        ParserError.raise_func_error(ident, 'needs typed parameters to be declared')
+    if tail[-1].label not in ('BLOCK', 'SKIPPED_BLOCK'):
+        ParserError.raise_func_error(ident, 'needs a block after its return type')
+
+    params = []
+    if is_dec:
+        # FUNC_DEC -> [TYPE, [REF], IDENT, TYPE, [REF], IDENT, ...]
+        param_trees = func_gen[0].children
+        i = 0
+        while i < len(param_trees):
+            is_ref = param_trees[i + 1].label == 'REF'
+            params.append(Param(param_trees[i].token, param_trees[i + 2 if is_ref else i + 1].token, is_ref))
+            i += 3 if is_ref else 2
+    return_type = tail[0].token if len(tail) > 1 else None
+    if tail[-1].label == 'SKIPPED_BLOCK':
+        return FuncDecl(ident, params, return_type, LazyBlock(tail[-1].token))
+    return FuncDecl(ident, params, return_type, _block(tail[-1]))
+
+
+# Converts either a recursive-descent <expr_bool> tree or a flat expression tree
+def _expr(expr_tree):
+    label = expr_tree.label
+    children = expr_tree.children
+
+    if label in _EXPR_CHAIN_LABELS:
+        # <operand> { <operator> <operand> }, all left associative
+        node = _expr(children[0])
+        for i in range(1, len(children), 2):
+            node = BinOp(children[i].token, node, _expr(children[i + 1]))
+        return node
+    if label == 'FACT_ARITH':
+        if len(children) == 2:
+            return UnaryOp(children[0].token, _expr(children[1]))
+        return _expr(children[0])
+    if label == 'TERM_UNARY':
+        return _expr(children[0])
+    if label == 'VAR_IDENT':
+        # [IDENT, VAR_OR_FUNC -> [FUNC] | []]
+        ident_tree, var_or_func = children
+        if var_or_func.children:
+            return _func(ident_tree.token, var_or_func.children[0], False)
+        return Var(ident_tree.token)
+
+    # Flat tree: literal, unary or binary operator
+    token = expr_tree.token
+    if not children:
+        return Literal(token)
+    if len(children) == 1:
+        return UnaryOp(token, _expr(children[0]))
+    return BinOp(token, _expr(children[0]), _expr(children[1]))
+
+
+_CONVERTERS = [_block, _statement, _func, _expr]
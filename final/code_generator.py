@@ -1,8 +1,12 @@
-from tree import *
+from ast_nodes import *
 from MLparser import *
 from assembly_helper import *
 from errors import *
-from copy import *
+from trampoline import *
+from bisect import bisect_left
+from collections import OrderedDict
+import shutil
+import tempfile
 
 # Symbol Table (Keys are ID pattern, Values are Dicts themselves)
 #  'type': Data type (functions have [(params), ret_type])
@@ -87,6 +91,7 @@ def temp_var_id_generator():
 class Register:
     def __init__(self, name):
         self.name = name
+        self.hash = hash(name)
 
     # Allows for use of :s in str.format(...)
     def __format__(self, format):
@@ -95,7 +100,7 @@ class Register:
 
     # Allows for Register objects to be used as dictionary keys
     def __hash__(self):
-        return hash(self.name)
+        return self.hash
 
     def __str__(self):
         return self.name
@@ -116,28 +121,180 @@ class Register:
             return True
 
 
+class RegisterSlot(dict):
+    """
+    The dict of a register in a RegisterTable, which tells the table when the register gets or loses its id
+    """
+    __slots__ = ('table', 'bit')
+
+    def __init__(self, table, bit, values):
+        super().__init__(values)
+        self.table = table
+        self.bit = bit
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        if key == 'id':
+            if value:
+                self.table.free &= ~self.bit
+            else:
+                self.table.free |= self.bit
+
+
+class RegisterTable(dict):
+    """
+    A register table (register -> dict of what it holds) that keeps a bitmask of its free registers (the ones without an
+    id), bit i for the i-th register of the pool
+    * first_free: The first free register of the pool (None if all are taken), without going through the table
+    * reset: Frees every register in place
+    A dict put in the table (reg_table[reg] = {...}) is copied into the register's RegisterSlot.
+    """
+    __slots__ = ('pool', 'empty', 'free')
+
+    def __init__(self, pool, empty):
+        super().__init__()
+        self.pool = pool
+        self.empty = empty
+        self.free = (1 << len(pool)) - 1
+        for bit, reg in enumerate(pool):
+            dict.__setitem__(self, reg, RegisterSlot(self, 1 << bit, empty))
+
+    def __setitem__(self, reg, values):
+        slot = self[reg]
+        dict.update(slot, values)
+        slot['id'] = values['id']
+
+    def first_free(self):
+        if not self.free:
+            return None
+        return self.pool[(self.free & -self.free).bit_length() - 1]
+
+    def reset(self):
+        for slot in self.values():
+            dict.update(slot, self.empty)
+        self.free = (1 << len(self.pool)) - 1
+
+
+class VarQueue:
+    """
+    A var queue: the entries of the registers holding values, in the order they were loaded (see the top of the file).
+    The entries are kept in an OrderedDict, with the keys of the entries of each id and of each register, so taking out
+    the first entry, an entry, or the entries of an id or a register doesn't go through the queue.
+    """
+    __slots__ = ('entries', 'ids', 'regs', 'next_key')
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.ids = {}
+        self.regs = {}
+        self.next_key = 0
+
+    def append(self, entry):
+        key = self.next_key
+        self.next_key += 1
+        entry['key'] = key
+        self.entries[key] = entry
+        self.ids.setdefault(entry['id'], set()).add(key)
+        self.regs.setdefault(entry['reg'], set()).add(key)
+
+    def popleft(self):
+        key, entry = self.entries.popitem(last = False)
+        self._forget_key(entry, key)
+        return entry
+
+    def remove(self, entry):
+        del self.entries[entry['key']]
+        self._forget_key(entry, entry['key'])
+
+    # Removes the entries of mem_id (only the ones of the mem_type, if given)
+    def remove_id(self, mem_id, mem_type = None):
+        for entry in self.with_id(mem_id):
+            if mem_type is None or entry['mem_type'] == mem_type:
+                self.remove(entry)
+
+    # Removes the entries of reg
+    # Returns them
+    def remove_reg(self, reg):
+        entries = [self.entries[key] for key in sorted(self.regs.get(reg, ()))]
+        for entry in entries:
+            self.remove(entry)
+        return entries
+
+    # Returns the entries of mem_id, in the order they were loaded
+    def with_id(self, mem_id):
+        return sorted((self.entries[key] for key in self.ids.get(mem_id, ())), key = lambda entry: entry['key'])
+
+    def _forget_key(self, entry, key):
+        for index, value in ((self.ids, entry['id']), (self.regs, entry['reg'])):
+            keys = index[value]
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return repr(list(self.entries.values()))
+
+
+class SymbolEntry:
+    """
+    A variable (or function) in the symbol table, which is changed in place
+    * mem_id: The identifier in the source
+    * type: The type ('int', 'float ref', ...), or [parameters, return type] for a function
+    * mem_name: The label of its memory in the .data section
+    * init_val, curr_val: The value it starts with in the .data section, and its value if it's known at compile time
+    * addr_reg, val_reg: The registers holding its address and value (if any)
+    * used: If it needs memory in the .data section
+    * scope: The scope it was declared in
+    * dirty: If the value in val_reg may not be in memory yet (it has to be stored when the register is freed)
+    * shared: If mem_name was an entry's that is no longer used (so the .data section doesn't have its init_val)
+    """
+    __slots__ = ('mem_id', 'type', 'mem_name', 'init_val', 'curr_val', 'addr_reg', 'val_reg', 'used', 'scope',
+                 'dirty', 'shared')
+
+    def __init__(self, mem_id, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used, scope):
+        self.mem_id = mem_id
+        self.type = mem_type
+        self.mem_name = mem_name
+        self.init_val = init_val
+        self.curr_val = curr_val
+        self.addr_reg = addr_reg
+        self.val_reg = val_reg
+        self.used = used
+        self.scope = scope
+        self.dirty = val_reg is not None
+        self.shared = False
+
+    def __repr__(self):
+        return 'SymbolEntry(%s)' % ', '.join('%s=%r' % (name, getattr(self, name)) for name in self.__slots__)
+
+
+# init_vals of the entries that can take a name another entry gave back: they are given their value in code before
+# it's read, so what the name holds doesn't matter. A variable declared without a value (None) never takes one, as it
+# can be read before it's first given a value (reading the 0 in the .data section)
+SHARED_INIT_VALS = ('DYNAMIC', 'TEMP', 'PARAM')
+
+
 class SymbolTable:
-    @staticmethod
-    def _empty_sym_table_dict():
-        return {'type': None, 'scope': None, 'mem_name': None, 'init_val': None,
-                'curr_val': None, 'addr_reg': None, 'val_reg': None, 'used': False}
+    """
+    The symbol tables of the open scopes (symbol_tables[scope] maps the identifiers declared in that scope to their
+    SymbolEntry). Every identifier also has a stack of its entries in the open scopes, innermost last, so looking one up
+    doesn't depend on how many scopes are open.
+    Entries that are no longer used (the variables of a closed scope, and temporaries once their statement is compiled)
+    give their names in the .data section back, and new entries take them, so the section only has as many names as
+    there are entries in use at once. The names are given back to the main program or the function being compiled,
+    and only reused in it: a function can be called while any name of its caller is in use.
+    """
 
     @staticmethod
     def _empty_array_sym_table_dict():
         return {'type': None, 'mem_name': None, 'addr_reg': None, 'used': False}
 
-    def _find_table(self, ident):
-        curr_scope = self.scope
-        while curr_scope >= 0:
-            try:
-                self.symbol_tables[curr_scope][ident]
-                break
-            except KeyError:
-                pass
-
-            curr_scope -= 1
-        return curr_scope
-
     def _create_array_sym_table(self):
         array_sym_table = {}
 
@@ -163,46 +320,72 @@ class SymbolTable:
         self.var_name_generator = variable_name_generator()
 
         # Symbol tables
-        self.symbol_tables = [{}]
+        self.symbol_tables = []
+        # Identifier -> its entries in the open scopes, innermost last
+        self.shadow_stacks = {}
         self.array_symbol_table = self._create_array_sym_table()
         self.closed_table_entries = []
+        # The names that can be given to new entries, of the main program and each function being compiled (innermost
+        # last)
+        self.free_names = [[]]
 
     def create_entry(self, ident, token, mem_type, init_val, curr_val, addr_reg, val_reg, used):
         if self.check_entered(ident):
             SemanticError.raise_already_declared_error(ident, token.line_num, token.col)
 
-        self.symbol_tables[self.scope][ident] = {'type': mem_type, 'mem_name': next(self.var_name_generator),
-                                                 'init_val': init_val, 'curr_val': curr_val, 'addr_reg': addr_reg,
-                                                 'val_reg': val_reg, 'used': used}
+        entry = SymbolEntry(ident, mem_type, None, init_val, curr_val, addr_reg, val_reg, used, self.scope)
+        # A function's name is its label, and a value in the .data section needs a name of its own
+        free = self.free_names[-1]
+        if free and type(mem_type) is not list and init_val in SHARED_INIT_VALS:
+            entry.mem_name = free.pop()
+            entry.shared = True
+        else:
+            entry.mem_name = next(self.var_name_generator)
+        self.symbol_tables[self.scope][ident] = entry
+        stack = self.shadow_stacks.get(ident)
+        if stack is None:
+            self.shadow_stacks[ident] = [entry]
+        else:
+            stack.append(entry)
+        return entry
+
+    # Gives entry's name back, to be taken by new entries
+    def free_name(self, entry):
+        if type(entry.type) is not list:
+            self.free_names[-1].append(entry.mem_name)
+
+    # The main program's names aren't given to a function's entries, nor the function's to the main program's (see
+    # the class docstring)
+    def open_function(self):
+        self.free_names.append([])
+
+    def close_function(self):
+        self.free_names.pop()
 
     def create_array_entry(self, string, mem_type, addr_reg, used):
         self.array_symbol_table[string] = {'type': mem_type, 'mem_name': next(self.var_name_generator),
                                            'addr_reg': addr_reg, 'used': used}
 
-    def get_entry(self, ident, token):
-        table_num = self._find_table(ident)
-
-        if table_num == -1:
+    def find(self, ident):
+        """
+        Returns the SymbolEntry ident refers to in the current scope (None if it isn't declared)
+        """
+        stack = self.shadow_stacks.get(ident)
+        return stack[-1] if stack else None
+
+    def lookup(self, ident, token):
+        """
+        Returns the SymbolEntry ident refers to in the current scope, raising a SemanticError if it isn't declared
+        """
+        stack = self.shadow_stacks.get(ident)
+        if not stack:
             SemanticError.raise_declaration_error(ident, token.line_num, token.col)
-
-        ret_dict = self.symbol_tables[table_num][ident]
-        return ret_dict['type'], ret_dict['mem_name'], ret_dict['init_val'], ret_dict['curr_val'], \
-               ret_dict['addr_reg'], ret_dict['val_reg'], ret_dict['used']
+        return stack[-1]
 
     def get_array_entry(self, string, token):
         ret_dict = self.array_symbol_table[string]
         return ret_dict['type'], ret_dict['mem_name'], ret_dict['addr_reg'], ret_dict['used']
 
-    def get_entry_suppress(self, ident):
-        table_num = self._find_table(ident)
-
-        if table_num == -1:
-            return None, None, None, None, None, None, None
-
-        ret_dict = self.symbol_tables[table_num][ident]
-        return ret_dict['type'], ret_dict['mem_name'], ret_dict['init_val'], ret_dict['curr_val'], \
-               ret_dict['addr_reg'], ret_dict['val_reg'], ret_dict['used']
-
     def get_array_entry_suppress(self, string):
         try:
             ret_dict = self.array_symbol_table[string]
@@ -211,18 +394,7 @@ class SymbolTable:
             return None, None, None, None
 
     def check_entered(self, ident):
-        try:
-            self.symbol_tables[self.scope][ident]
-            return True
-        except KeyError:
-            return False
-
-    def set_entry(self, ident, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used):
-        table_num = self._find_table(ident)
-        # Might have an error here if ident isn't found
-        self.symbol_tables[table_num][ident] = {'type': mem_type, 'mem_name': mem_name, 'init_val': init_val,
-                                                'curr_val': curr_val, 'addr_reg': addr_reg,
-                                                'val_reg': val_reg, 'used': used}
+        return ident in self.symbol_tables[self.scope]
 
     def set_array_entry(self, string, mem_type, mem_name, addr_reg, used):
         self.array_symbol_table[string] = {'mem_name': mem_name, 'type': mem_type, 'addr_reg': addr_reg,
@@ -233,20 +405,233 @@ class SymbolTable:
         self.symbol_tables.append({})
 
     def close_scope(self):
-        # Save off all table entries to a list to then process for printing at the end
-        for mem_id, dict in self.symbol_tables[self.scope].items():
-            dict['mem_id'] = mem_id
-            dict['scope'] = self.scope
-            self.closed_table_entries.append(dict)
+        # Save off all table entries to a list to then process for printing at the end (temporaries gave their names
+        # back already)
+        for mem_id, entry in self.symbol_tables.pop().items():
+            self.closed_table_entries.append(entry)
+            if entry.init_val != 'TEMP':
+                self.free_name(entry)
+            stack = self.shadow_stacks[mem_id]
+            stack.pop()
+            if not stack:
+                del self.shadow_stacks[mem_id]
 
-        self.symbol_tables = self.symbol_tables[:self.scope]
         self.scope -= 1
 
-    def remove_all_reg(self):
+    def remove_all_reg(self, keep = ()):
+        """
+        Clears the registers of every entry, except the entries in keep (which keep their val_reg)
+        """
         for table in self.symbol_tables:
-            for k, v in table.items():
-                v['addr_reg'] = None
-                v['val_reg'] = None
+            for entry in table.values():
+                if entry in keep:
+                    continue
+                entry.addr_reg = None
+                entry.val_reg = None
+                entry.dirty = False
+
+
+# Types of the variables that are kept in registers (refs, functions and strings never are)
+PINNED_TYPES = ('int', 'bool', 'float')
+
+# How many registers of each pool are never pinned, but left for expressions and the other variables (with fewer, a
+# long expression can have a register it still uses taken for another value)
+EXPRESSION_REGISTERS = 10
+
+# Statements that stop the variables of a loop or an if from being kept in registers: calls and functions need every
+# variable in memory, and a return leaves without passing its end (after which they are stored)
+UNPINNED_NODES = (Call, FuncDecl, LazyBlock, Return)
+
+
+class UseSummary:
+    """
+    What a statement uses (see summarize):
+    counts      - how many times each identifier is used in it (read, assigned or read into), in the order they are
+                  first used, or None if it has a call, a function declaration or a return
+    declared    - the identifiers declared in it
+    patterns    - the identifiers and string literals in it
+    """
+    __slots__ = ('counts', 'declared', 'patterns')
+
+    def __init__(self, counts, declared, patterns):
+        self.counts = counts
+        self.declared = declared
+        self.patterns = patterns
+
+
+def summarize(statement, summaries):
+    """
+    Returns the UseSummary of a statement, keeping the summary of every statement in it (in the blocks of ifs, loops
+    and functions) in summaries (id(statement) -> (statement, UseSummary)) too.
+    The statements are summarized from the innermost out, each one adding up the summaries of the statements its
+    blocks hold, so every node is only walked once however deep the blocks nest. Statements already in summaries
+    aren't walked again.
+    """
+    if id(statement) in summaries:
+        return summaries[id(statement)][1]
+
+    # The statements that aren't summarized yet in preorder, so the ones in a statement come after it
+    pending = [statement]
+    nodes = [statement]
+    while nodes:
+        node = nodes.pop()
+        if type(node) is tuple:
+            if id(node[0]) in summaries:
+                continue
+            node = node[0]
+            pending.append(node)
+        if type(node) is Block:
+            nodes.extend((inner,) for inner in node.statements)
+        else:
+            nodes.extend(node.children())
+
+    for node in reversed(pending):
+        root = node
+        counts = {}
+        declared = set()
+        patterns = set()
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            node_type = type(node)
+            if node_type is tuple:
+                # A statement in a block of this one
+                inner = summaries[id(node[0])][1]
+                if counts is not None:
+                    if inner.counts is None:
+                        counts = None
+                    else:
+                        for ident, count in inner.counts.items():
+                            counts[ident] = counts.get(ident, 0) + count
+                declared |= inner.declared
+                patterns |= inner.patterns
+                continue
+            if isinstance(node, UNPINNED_NODES):
+                counts = None
+            if node_type is Var:
+                tokens = [node.token]
+            elif node_type is Assign:
+                tokens = [node.ident]
+            elif node_type is Read:
+                tokens = node.idents
+            else:
+                if node_type is DecTerm:
+                    declared.add(node.ident.pattern)
+                    patterns.add(node.ident.pattern)
+                elif node_type is Literal and node.token.name == 'STRINGLIT':
+                    patterns.add(node.token.pattern)
+                tokens = []
+            for token in tokens:
+                patterns.add(token.pattern)
+                if counts is not None:
+                    counts[token.pattern] = counts.get(token.pattern, 0) + 1
+            if node_type is Block:
+                nodes.extend((inner,) for inner in reversed(node.statements))
+            else:
+                nodes.extend(reversed(list(node.children())))
+        summaries[id(root)] = (root, UseSummary(counts, declared, patterns))
+    return summaries[id(statement)][1]
+
+
+def used_variables(node, summaries = None):
+    """
+    Returns how many times each identifier is used in a While or If node (its condition and blocks), in the order they
+    are first used, leaving out the ones declared in it.
+    Returns None if it has a call, a function declaration or a return.
+    summaries keeps the UseSummary of the statements for the next calls (see summarize).
+    """
+    summary = summarize(node, {} if summaries is None else summaries)
+    if summary.counts is None:
+        return None
+    return {ident: count for ident, count in summary.counts.items() if ident not in summary.declared}
+
+
+def statement_uses(statements, summaries = None):
+    """
+    Returns the indexes of the statements in a list that use each identifier (and each string literal, whose address
+    is kept in a register the same way), in order.
+    summaries keeps the UseSummary of the statements for the next calls (see summarize).
+    """
+    if summaries is None:
+        summaries = {}
+    uses = {}
+    for index, statement in enumerate(statements):
+        for pattern in summarize(statement, summaries).patterns:
+            uses.setdefault(pattern, []).append(index)
+    return uses
+
+
+def live_intervals(statements, summaries = None):
+    """
+    Returns the live intervals of the variables a list of statements uses, as [ident, type, start, end] with start and
+    end the indexes of the first and last statement using it (an if or a loop is one statement, so a variable used in
+    a loop is live across all of it). type is the type of a variable declared in the list, None for one declared
+    before it.
+    A variable declared in the list gets a new interval after its declaration. Intervals don't go across a statement
+    with a call, a function declaration or a return.
+    summaries keeps the UseSummary of the statements for the next calls (see summarize).
+    """
+    if summaries is None:
+        summaries = {}
+    intervals = []
+    live = {}
+    types = {}
+    for index, statement in enumerate(statements):
+        counts = used_variables(statement, summaries)
+        if counts is None:
+            live = {}
+        else:
+            for ident in counts:
+                if ident in live:
+                    live[ident][3] = index
+                else:
+                    live[ident] = [ident, types.get(ident), index, index]
+                    intervals.append(live[ident])
+        if type(statement) is Declaration:
+            for term in statement.terms:
+                live.pop(term.ident.pattern, None)
+                types[term.ident.pattern] = statement.type.name.lower()
+    return intervals
+
+
+def linear_scan(intervals, free):
+    """
+    Picks the live intervals [ident, pool, start, end] (sorted by start) that get a register, with at most free[pool]
+    of them live at once. When there are too many, the one that ends last is spilled from where the new one starts.
+    Returns the picked intervals, with the ends of the spilled ones moved back.
+    """
+    active = {pool: [] for pool in free}
+    picked = []
+    for interval in intervals:
+        ident, pool, start, end = interval
+        live = active[pool] = [other for other in active[pool] if other[3] >= start]
+        if len(live) < free[pool]:
+            live.append(interval)
+            picked.append(interval)
+            continue
+
+        furthest = max(live, key = lambda other: other[3], default = None)
+        if furthest is None or furthest[3] <= end:
+            continue
+        live.remove(furthest)
+        if furthest[2] < start:
+            furthest[3] = start - 1
+        else:
+            picked.remove(furthest)
+        live.append(interval)
+        picked.append(interval)
+    return picked
+
+
+# The methods that can nest (through blocks, calls and expressions), which call_mode = 'stack' runs on an explicit
+# stack (see trampoline), and the tables of methods they dispatch through
+STACK_METHODS = ['_process_block', '_process_func_block', '_process_func_dec', '_create_activation_record',
+                 '_process_func_call', '_run_func', '_process_return', '_traverse', '_write', '_assign', '_declare',
+                 '_process_declare_term', '_process_if', '_process_while', '_process_expression',
+                 '_process_expr_skeleton', '_process_expr_bool', '_process_term_bool', '_process_expr_eq',
+                 '_process_expr_rel', '_process_expr_arith', '_process_term_arith', '_process_fact_arith',
+                 '_process_term_unary']
+STACK_DISPATCH = ['func_factory', 'expr_levels']
 
 
 class CodeGenerator:
@@ -254,6 +639,10 @@ class CodeGenerator:
     Object that takes a parse tree, symbol table, and output file,
     and has methods to compile the parse tree to asm
     """
+    def __new__(cls, *args, call_mode = 'recursive', **kwargs):
+        if cls is CodeGenerator and call_mode == 'stack':
+            cls = stack_class(CodeGenerator, STACK_METHODS, STACK_DISPATCH)
+        return super().__new__(cls)
 
     @staticmethod
     def _empty_reg_dict():
@@ -267,7 +656,8 @@ class CodeGenerator:
     def _empty_tail_call(accum_id, val_reg, val_type, val_token, immediate_val):
         return val_reg, immediate_val, val_type
 
-    def __init__(self, parse_tree, output_filename, is_debug, is_safe):
+    def __init__(self, parse_tree, output_filename, is_debug, is_safe, call_mode = 'recursive', peephole = None,
+                 alloc_mode = 'fifo'):
         # Name / ID generators
         self.temp_id_generator = temp_var_id_generator()
         self.conditional_name_generator = variable_name_generator()
@@ -275,14 +665,26 @@ class CodeGenerator:
         # Compiler Flags
         self.debug_mode = is_debug
         self.safe_mode = is_safe
-
-        # Function dictionary
-        self.func_factory = {"READ": self._read, "WRITE": self._write, "ID_STATEMENT": self._id_statement,
-                             "DECLARATION": self._declare, "IF_STATEMENT": self._process_if,
-                             "WHILE_STATEMENT": self._process_while, 'RETURN': self._process_return}
-
-        # Stuff from Parser
-        self.tree = parse_tree
+        self.call_mode = call_mode
+        # The peephole.Peephole run over the code before it's written out (None for no optimization)
+        self.peephole = peephole
+        # 'fifo' evicts the variable loaded first when it runs out of registers, 'linear' also keeps variables in
+        # registers over their live intervals (see _allocate_region)
+        self.alloc_mode = alloc_mode
+
+        # Function dictionary (statement node type -> function that processes it)
+        self.func_factory = {Read: self._read, Write: self._write, Assign: self._assign,
+                             Call: self._process_func_call, FuncDecl: self._process_func_dec,
+                             Declaration: self._declare, If: self._process_if, While: self._process_while,
+                             Return: self._process_return}
+
+        # Expression function for each binary operator class
+        self.expr_levels = {'LOG_OR': self._process_expr_bool, 'LOG_AND': self._process_term_bool,
+                            'EQUAL_OP': self._process_expr_eq, 'REL_OP': self._process_expr_rel,
+                            'UNARY_ADD_OP': self._process_expr_arith, 'MUL_OP': self._process_term_arith}
+
+        # Stuff from Parser (an ast_nodes.Block, a parser tree is converted with to_ast; None for compile_stream)
+        self.tree = parse_tree if parse_tree is None or isinstance(parse_tree, Node) else to_ast(parse_tree, call_mode)
 
         # Symbol Tables
         self.sym_table = SymbolTable()
@@ -291,6 +693,9 @@ class CodeGenerator:
         # self.reg_pool = all normal registers
         # self.aux_reg_pool = all auxiliary registers
         # self.float_reg_pool = all floating point registers
+        self._create_register_pool()
+        self._create_register_pool('aux')
+        self._create_register_pool('float')
         self.reg_table = self._init_reg_table()
         self.aux_reg_table = self._init_reg_table('aux')
         self.float_reg_table = self._init_reg_table('float')
@@ -307,22 +712,77 @@ class CodeGenerator:
         #   float_13 ($f13) is reserved for float immediates in asm_helper and has no guaranteed value
 
         # Variable Queues
-        self.var_queue = []
-        self.float_var_queue = []
+        self.var_queue = VarQueue()
+        self.float_var_queue = VarQueue()
+        # The registers holding the variables of the loops and ifs being compiled, and of the live intervals of the
+        # statement being compiled (register -> SymbolEntry), which aren't in the var_queues and stay loaded until
+        # their end
+        self.pinned = {}
+        # The blocks being compiled, innermost last, as [statement_uses of the statements, index of the statement
+        # being compiled, statements], which _find_free_register looks ahead in for the next use of each register
+        self.lookahead = []
+        # The distances _next_use found since the lookahead last changed (identifier -> distance)
+        self.next_uses = {}
+        # The UseSummary of the statements of the blocks being compiled (see summarize), dropped once a statement is
+        # compiled
+        self.use_summaries = {}
+        # What _find_free_register did to free registers (printed in debug mode): values stored to memory, values
+        # loaded again after being freed, and addresses and constants freed to be made again with one instruction
+        self.alloc_counts = {'spills': 0, 'reloads': 0, 'rematerializations': 0}
+        # The identifiers whose values were taken out of their registers, until they are loaded again
+        self.evicted = set()
+        # The entries _find_free_register made for the temporaries of the statement being compiled, whose names are
+        # given back once it's compiled
+        self.spilled = []
 
         # Used to keep track of things a block changes to reconcile them when it closes
         self.forced_dynamic = False
 
         # Output options
         self.output_name = output_filename
-        self.output_string = ''
-        self.func_string = ''
+        # The code of the main program (or of the function being compiled) and of the functions compiled so far
+        self.output = AsmBuffer()
+        self.functions = AsmBuffer()
 
     def compile(self):
         self._start()
-        self._process_block(self.tree)
+        run(self._process_block(self.tree, True))
         self._finish()
 
+    def compile_stream(self, statements):
+        """
+        Compiles the statements of the program's block one at a time as they come from statements (STATEMENT trees
+        from MLparser.Parser.parse_statements, or statement nodes) instead of compiling the tree.
+        The code of each statement is written out to a temporary file before the next one is taken, so only one
+        statement and its code are held in memory (the data section, which comes first, is still made at the end).
+        """
+        with tempfile.TemporaryFile('w+') as text_file, tempfile.TemporaryFile('w+') as func_file:
+            self._start()
+            # _process_block, one statement at a time
+            self._save_off_registers()
+            self.sym_table.open_scope()
+            for statement in statements:
+                if not isinstance(statement, Node):
+                    statement = statement_to_ast(statement, self.call_mode)
+                self.output.line = statement.line_num()
+                run(self.func_factory[type(statement)](statement))
+                self._free_temporaries()
+                self.use_summaries.pop(id(statement), None)
+                self._optimize()
+                self.output.write(text_file)
+                self.functions.write(func_file)
+                self.output.clear()
+                self.functions.clear()
+            self._save_off_registers()
+            self.sym_table.close_scope()
+            self._finish(text_file, func_file)
+
+    def _optimize(self):
+        # Runs the peephole optimizer over the code that hasn't been written out yet
+        if self.peephole is not None:
+            self.peephole.run(self.output)
+            self.peephole.run(self.functions)
+
     def _create_register_pool(self, type_s = 'normal'):
         pool = []
 
@@ -386,53 +846,50 @@ class CodeGenerator:
 
         return pool
 
+    # Makes an empty register table of the pool _create_register_pool made
     def _init_reg_table(self, type_s = 'normal'):
-        reg_pool = self._create_register_pool(type_s)
-        empty_dict = self._empty_aux_reg_dict() if type_s == 'aux' else self._empty_reg_dict()
-
-        ret_dict = {}
-        for reg in reg_pool:
-            ret_dict[reg] = deepcopy(empty_dict)
-
-        return ret_dict
+        if type_s == 'aux':
+            return RegisterTable(self.aux_reg_pool, self._empty_aux_reg_dict())
+        reg_pool = self.float_reg_pool if type_s == 'float' else self.reg_pool
+        return RegisterTable(reg_pool, self._empty_reg_dict())
 
-    def _find_free_register(self, var_type='normal'):
-        ### Sub-function ###
-        def save_using_s0(name, var_reg):
-            # If we are in safe mode, we need to save off the old value
-            if self.safe_mode:
-                # Save $s0 value to stack
-                # Allocate stack space
-                self.output_string += asm_allocate_stack_space()
+    # Writes var_reg to the memory of name, with its address in $s0
+    def _save_using_s0(self, name, var_reg):
+        # If we are in safe mode, we need to save off the old value
+        if self.safe_mode:
+            # Save $s0 value to stack
+            # Allocate stack space
+            self.output += asm_allocate_stack_space()
 
-                # We don't have to increment stack_offset since it would just be decremented at the end of this block
-                self.output_string += asm_save_reg_to_stack(self.save_0, 0)
+            # We don't have to increment stack_offset since it would just be decremented at the end of this block
+            self.output += asm_save_reg_to_stack(self.save_0, 0)
 
-            save_reg = '$s0'
+        save_reg = '$s0'
 
-            # Load address to $s0
-            self.output_string += asm_load_mem_addr(name, save_reg)
+        # Load address to $s0
+        self.output += asm_load_mem_addr(name, save_reg)
 
-            # Write value from val_reg to RAM
-            self.output_string += asm_save_mem_var_from_addr(save_reg, var_reg)
+        # Write value from val_reg to RAM
+        self.output += asm_save_mem_var_from_addr(save_reg, var_reg)
 
-            # If we are in safe_mode, we need to restore the old value
-            if self.safe_mode:
-                # Reset $s0 to what it was before
-                self.output_string += asm_load_reg_from_stack(self.save_0, 0)
-        #################
+        # If we are in safe_mode, we need to restore the old value
+        if self.safe_mode:
+            # Reset $s0 to what it was before
+            self.output += asm_load_reg_from_stack(self.save_0, 0)
 
+    def _find_free_register(self, var_type='normal'):
         # Get what registers/var_queue to look at (float or normal)
         reg_table = self.float_reg_table if var_type == 'float' else self.reg_table
         var_queue = self.float_var_queue if var_type == 'float' else self.var_queue
 
         # Look for open register
-        for reg in reg_table:
-            if not reg_table[reg]['id']:
-                return reg
+        reg = reg_table.first_free()
+        if reg is not None:
+            return reg
 
-        # If none are open, free up a register
-        reg_pop = var_queue.pop(0)
+        # If none are open, free up the register used furthest ahead
+        reg_pop = self._choose_eviction(var_queue)
+        var_queue.remove(reg_pop)
 
         mem_id = reg_pop['id']
         mem_type = reg_pop['mem_type']
@@ -441,38 +898,116 @@ class CodeGenerator:
         if mem_type == 'ARRAY_ADDRESS': # Update array_sym_table and return reg
             mem_type, mem_name, addr_reg, used = self.sym_table.get_array_entry(mem_id, None)
             self.sym_table.set_array_entry(mem_id, mem_type, mem_name, None, used)
+            self.alloc_counts['rematerializations'] += 1
         elif mem_type == 'ADDRESS': # If the register stores an address, just update tables
-            mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(mem_id, None)
-            self.sym_table.set_entry(mem_id, mem_type, mem_name, init_val, curr_val, None, val_reg, used)
+            self.sym_table.lookup(mem_id, None).addr_reg = None
+            self.alloc_counts['rematerializations'] += 1
         elif mem_type == 'VALUE':
-            mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(mem_id, None)
+            entry = self.sym_table.lookup(mem_id, None)
 
-            # Try to find addr_reg, else free up a register
-            if not addr_reg:
-                save_using_s0(mem_name, reg)
-            else:
-                # Write value from reg to RAM
-                self.output_string += asm_save_mem_var_from_addr(addr_reg, reg)
+            # Only a value that changed since it was loaded has to be written back
+            if entry.dirty or entry.val_reg != reg:
+                # Try to find addr_reg, else free up a register
+                if not entry.addr_reg:
+                    self._save_using_s0(entry.mem_name, reg)
+                else:
+                    # Write value from reg to RAM
+                    self.output += asm_save_mem_var_from_addr(entry.addr_reg, reg)
+                # It's in memory now, so it has to be in the .data section
+                entry.used = True
+                self.alloc_counts['spills'] += 1
 
             # Remove old references in symbol and register tables
-            self.sym_table.set_entry(mem_id, mem_type, mem_name, init_val, curr_val, addr_reg, None, used)
+            entry.val_reg = None
+            entry.dirty = False
+            self.evicted.add(mem_id)
         else: # mem_type = TYPE.*
-            mem_type = mem_type[mem_type.find('.') + 1:]
-
-            mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry_suppress(mem_id)
-            if mem_name is None:
-                # Create sym_table entry
-                self.sym_table.create_entry(ident=mem_id, token=None, mem_type=mem_type, init_val='TEMP', curr_val=None,
-                                            addr_reg=None, val_reg=None, used=True)
-                _, mem_name, _, _, _, _, _ = self.sym_table.get_entry(mem_id, None)
-
-            # Save variable to memory
-            save_using_s0(mem_name, reg)
+            self._spill_temporary(reg_pop)
 
         # Clear register in reg_table
         reg_table[reg] = CodeGenerator._empty_reg_dict()
         return reg
 
+    # Takes the temporary of the var_queue entry reg_pop (already out of the queue) out of its register: it gets an
+    # entry in the symbol table, and is saved to memory (or made again with li, if it's a constant) when
+    # _ensure_id_loaded needs it
+    def _spill_temporary(self, reg_pop):
+        mem_id = reg_pop['id']
+        mem_type = reg_pop['mem_type']
+        mem_type = mem_type[mem_type.find('.') + 1:]
+
+        entry = self.sym_table.find(mem_id)
+        if entry is None:
+            # Create sym_table entry
+            entry = self.sym_table.create_entry(ident=mem_id, token=None, mem_type=mem_type, init_val='TEMP',
+                                                curr_val=None, addr_reg=None, val_reg=None, used=False)
+            self.spilled.append(entry)
+
+        if 'val' in reg_pop:
+            # A constant is put back in a register with li when it's needed (see _ensure_id_loaded)
+            entry.curr_val = reg_pop['val']
+            self.alloc_counts['rematerializations'] += 1
+        else:
+            # Save variable to memory
+            self._save_using_s0(entry.mem_name, reg_pop['reg'])
+            entry.curr_val = None
+            entry.used = True
+            self.alloc_counts['spills'] += 1
+            self.evicted.add(mem_id)
+
+    # Returns the entry of var_queue to free: the variable (or string address) used furthest ahead in the
+    # blocks being compiled, an address before a value used as far ahead (it's made again with one la), then the entry
+    # loaded first
+    # Entries the statement being compiled uses (and temporaries, which only it uses) are only freed when every entry
+    # is one of them, in the order they were loaded, as it may still be holding on to their registers
+    def _choose_eviction(self, var_queue):
+        chosen = None
+        chosen_key = (0, False)
+        next_uses = self.next_uses
+        for entry in var_queue:
+            if chosen is None:
+                chosen = entry
+            if entry['mem_type'] not in {'VALUE', 'ADDRESS', 'ARRAY_ADDRESS'}:
+                continue
+            mem_id = entry['id']
+            distance = next_uses[mem_id] if mem_id in next_uses else self._next_use(mem_id)
+            if not distance:
+                continue
+            key = (distance, entry['mem_type'] != 'VALUE')
+            if key > chosen_key:
+                chosen, chosen_key = entry, key
+        return chosen
+
+    # Returns how many statements ahead ident is used next in the blocks being compiled (0 for the statement being
+    # compiled, float('inf') if it isn't used again), or None if the blocks don't use it at all (a temporary)
+    # The condition and body of a while loop being compiled come again after the end of its body
+    def _next_use(self, ident):
+        if ident in self.next_uses:
+            return self.next_uses[ident]
+
+        next_use = None
+        distance = 0
+        for depth, (uses, index, statements) in enumerate(reversed(self.lookahead)):
+            positions = uses.get(ident)
+            if positions:
+                next_use = float('inf')
+                # The statement of an outer block being compiled has the inner blocks in it, and its uses are before
+                # them, except in a loop
+                start = index if depth == 0 or type(statements[index]) is While else index + 1
+                position = bisect_left(positions, start)
+                if position < len(positions):
+                    next_use = distance + positions[position] - index
+                    break
+            distance += len(statements) - index
+        self.next_uses[ident] = next_use
+        return next_use
+
+    # Counts loading the value of ident again if _find_free_register took it out of its register
+    def _count_reload(self, ident):
+        if ident in self.evicted:
+            self.evicted.remove(ident)
+            self.alloc_counts['reloads'] += 1
+
     # Used mostly or expr to reserve registers for temporary variables
     def _update_reg_table(self, table_type, mem_id, reg, reg_type):
         reg_table = self.float_reg_table if table_type == 'float' else self.reg_table
@@ -481,6 +1016,17 @@ class CodeGenerator:
         reg_dict['id'] = mem_id
         reg_dict['mem_type'] = reg_type
 
+    # Takes the entries of reg out of the var_queues, so _find_free_register can't free it while an instruction that
+    # isn't written out yet still needs it (it stays taken in its register table)
+    # Returns what _unlock_register needs to put them back
+    def _lock_register(self, reg):
+        return [(var_queue, var_queue.remove_reg(reg)) for var_queue in (self.var_queue, self.float_var_queue)]
+
+    def _unlock_register(self, locked):
+        for var_queue, entries in locked:
+            for entry in entries:
+                var_queue.append(entry)
+
     # Will update tables to reflect the changes made to val_reg and addr_reg
     # Even though this may call more updates than necessary, just use it to ensure everything is updated
     # This WILL NOT update if passed registers are None. Instead, manually remove them yourself (might make a separate
@@ -489,7 +1035,7 @@ class CodeGenerator:
     def _update_tables(self, table_type, ident, new_addr_reg, new_val_reg, addr_reg_dict = None, val_reg_dict = None):
         val_reg_table = self.float_reg_table if table_type == 'float' else self.reg_table
 
-        mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(ident, None)
+        entry = self.sym_table.lookup(ident, None)
 
         if not addr_reg_dict and new_addr_reg:
             addr_reg_dict = self.reg_table[new_addr_reg]
@@ -500,30 +1046,37 @@ class CodeGenerator:
         if new_addr_reg:
             addr_reg_dict['id'] = ident
             addr_reg_dict['mem_type'] = 'ADDRESS'
-            addr_reg = new_addr_reg
+            entry.addr_reg = new_addr_reg
 
         # Edit val_reg dict
         if new_val_reg:
             val_reg_dict['id'] = ident
             val_reg_dict['mem_type'] = 'VALUE'
-            val_reg = new_val_reg
-
-        self.sym_table.set_entry(ident, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used)
+            if new_val_reg != entry.val_reg:
+                entry.val_reg = new_val_reg
+                entry.dirty = True
 
     def _start(self):
         # Append .text' section
-        self.output_string = '.text\n' + asm_init_frame_pointer()
+        self.output += asm_section('.text') + asm_init_frame_pointer()
 
-    def _finish(self):
+    def _finish(self, text_file = None, func_file = None):
         data_section = ''
 
-        for dict in self.sym_table.closed_table_entries:
-            if dict['used'] and dict['type'] is not list:
-                mem_id = dict['mem_id']
-                val_type = dict['type']
-                name = dict['mem_name']
-                init_val = dict['init_val']
-                scope = dict['scope']
+        # A name entries shared is in the section once, with the init_val of the entry it was made for (the others
+        # have no init_val in it)
+        data_entries = {}
+        for entry in self.sym_table.closed_table_entries:
+            if entry.used and (not entry.shared or entry.mem_name not in data_entries):
+                data_entries[entry.mem_name] = entry
+
+        for entry in data_entries.values():
+            if entry.type is not list:
+                mem_id = entry.mem_id
+                val_type = entry.type
+                name = entry.mem_name
+                init_val = entry.init_val
+                scope = entry.scope
 
                 # Variables can be:
                 # - ints, floats -> .word
@@ -556,18 +1109,20 @@ class CodeGenerator:
         if data_section != '':
             data_section = '.data\n' + data_section
 
-        self.output_string = data_section + self.output_string
-
-        # Add exit on main function
-        self.output_string += asm_call_exit()
-
-        # Append other functions
-        self.output_string += self.func_string
-
-        # Write file
-        fp = open(self.output_name, 'w')
-        fp.write(self.output_string)
-        fp.close()
+        # Write file: the .data section, the main code, the exit on the main function, then the other functions
+        # (compile_stream already wrote the start of the main code and the functions out to text_file and func_file)
+        with open(self.output_name, 'w') as fp:
+            fp.write(data_section)
+            if text_file is not None:
+                text_file.seek(0)
+                shutil.copyfileobj(text_file, fp)
+            self.output += asm_call_exit()
+            self._optimize()
+            self.output.write(fp)
+            if func_file is not None:
+                func_file.seek(0)
+                shutil.copyfileobj(func_file, fp)
+            self.functions.write(fp)
 
         # Debug printing
         if self.debug_mode:
@@ -578,86 +1133,98 @@ class CodeGenerator:
                   'Float Register Table', self.float_reg_table, '\n\n',
                   'Auxiliary Register Table', self.aux_reg_table, '\n\n',
                   'Variable Queue: ', self.var_queue, '\n\n',
-                  'Float Variable Queue: ', self.float_var_queue, '\n')
+                  'Float Variable Queue: ', self.float_var_queue, '\n\n',
+                  'Register Allocation: ', self.alloc_counts, '\n')
 
     def _save_off_registers(self):
         while len(self.var_queue) > 0:
-            entry = self.var_queue.pop(0)
+            entry = self.var_queue.popleft()
             reg = entry['reg']
             mem_id = entry['id']
             mem_type = entry['mem_type']
             if mem_type == 'VALUE':
-                mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(mem_id, None)
-                if type(mem_type) is not list:
-                    self.sym_table.set_entry(ident=mem_id, mem_type=mem_type, mem_name=mem_name, init_val=init_val,
-                                             curr_val=curr_val, addr_reg=addr_reg, val_reg=None, used=True)
-                    self.output_string += asm_save_mem_var_from_addr(mem_name, reg)
+                sym_entry = self.sym_table.lookup(mem_id, None)
+                if type(sym_entry.type) is not list:
+                    # A value that wasn't changed since it was loaded is already in memory
+                    if sym_entry.dirty or sym_entry.val_reg != reg:
+                        self.output += asm_save_mem_var_from_addr(sym_entry.mem_name, reg)
+                    sym_entry.val_reg = None
+                    sym_entry.used = True
+                    sym_entry.dirty = False
             elif mem_type == 'ADDRESS':
-                mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(mem_id, None)
-                if val_reg != 'REF':
-                    self.sym_table.set_entry(ident=mem_id, mem_type=mem_type, mem_name=mem_name, init_val=init_val,
-                                             curr_val=curr_val, addr_reg=None, val_reg=val_reg, used=used)
-                else:
-                    self.sym_table.set_entry(ident=mem_id, mem_type=mem_type, mem_name=mem_name, init_val=init_val,
-                                             curr_val=curr_val, addr_reg=reg, val_reg=val_reg, used=used)
+                sym_entry = self.sym_table.lookup(mem_id, None)
+                sym_entry.addr_reg = reg if sym_entry.val_reg == 'REF' else None
             elif mem_type == 'ARRAY_ADDRESS':
                 mem_type, mem_name, addr_reg, used = self.sym_table.get_array_entry(mem_id, None)
                 self.sym_table.set_array_entry(mem_id, mem_type, mem_name, None, True)
 
         while len(self.float_var_queue) > 0:
-            entry = self.float_var_queue.pop(0)
+            entry = self.float_var_queue.popleft()
             reg = entry['reg']
             mem_id = entry['id']
             mem_type = entry['mem_type']
             if mem_type == 'VALUE':
-                mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(mem_id, None)
-                if type(mem_type) is not list:
-                    self.sym_table.set_entry(ident=mem_id, mem_type=mem_type, mem_name=mem_name, init_val=init_val,
-                                             curr_val=curr_val, addr_reg=addr_reg, val_reg=None, used=True)
-                    self.output_string += asm_save_mem_var_from_addr(mem_name, reg)
+                sym_entry = self.sym_table.lookup(mem_id, None)
+                if type(sym_entry.type) is not list:
+                    # A value that wasn't changed since it was loaded is already in memory
+                    if sym_entry.dirty or sym_entry.val_reg != reg:
+                        self.output += asm_save_mem_var_from_addr(sym_entry.mem_name, reg)
+                    sym_entry.val_reg = None
+                    sym_entry.used = True
+                    sym_entry.dirty = False
             elif mem_type == 'ADDRESS':
-                mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(mem_id, None)
-                self.sym_table.set_entry(ident=mem_id, mem_type=mem_type, mem_name=mem_name, init_val=init_val,
-                                         curr_val=curr_val, addr_reg=None, val_reg=val_reg, used=used)
+                self.sym_table.lookup(mem_id, None).addr_reg = None
 
-        self.reg_table = self._init_reg_table('normal')
-        self.float_reg_table = self._init_reg_table('float')
-        self.aux_reg_table = self._init_reg_table('aux')
-        self.sym_table.remove_all_reg()
+        self.reg_table.reset()
+        self.float_reg_table.reset()
+        self.aux_reg_table.reset()
+        self.sym_table.remove_all_reg(self.pinned.values())
+        self.evicted.clear()
+
+        # The variables of the loops being compiled stay in their registers
+        for reg, sym_entry in self.pinned.items():
+            self._update_reg_table('float' if sym_entry.type == 'float' else 'normal', sym_entry.mem_id, reg, 'VALUE')
 
-    def _process_block(self, tree_nodes):
+    def _process_block(self, block, region = False):
         self._save_off_registers()
         self.sym_table.open_scope()
-        self._traverse(tree_nodes)
+        self._traverse(block, region)
         self._save_off_registers()
         self.sym_table.close_scope()
 
     # Processing a block has ZERO side effects on the state of the compiler
-    def _process_func_block(self, ident, func_name, parameters, tree_nodes):
+    def _process_func_block(self, ident, func_name, parameters, block):
         # Save off current state
-        saved_output_string = self.output_string
+        saved_output = self.output
         saved_forced_dynamic = self.forced_dynamic
         saved_reg_table = self.reg_table
         saved_float_reg_table = self.float_reg_table
         saved_aux_reg_table = self.aux_reg_table
         saved_var_queue = self.var_queue
         saved_float_var_queue = self.float_var_queue
+        saved_pinned = self.pinned
+        saved_lookahead = self.lookahead
+        saved_spilled = self.spilled
 
         # Reset all tables
         self.reg_table = self._init_reg_table('normal')
         self.float_reg_table = self._init_reg_table('float')
         self.aux_reg_table = self._init_reg_table('aux')
-        self.var_queue = []
-        self.float_var_queue = []
+        self.var_queue = VarQueue()
+        self.float_var_queue = VarQueue()
+        self.pinned = {}
+        self.lookahead = []
+        self.next_uses = {}
+        self.spilled = []
 
         # Start function work
-        self.output_string = ''
+        self.output = AsmBuffer(saved_output.line)
         self.forced_dynamic = True
+        self.sym_table.open_function()
         self.sym_table.open_scope()
 
         # Update sym_table for parameters
-        mem_type, mem_name, _, _, _, _, _ = self.sym_table.get_entry(ident, None)
-        param_types = mem_type[0]
+        param_types = self.sym_table.lookup(ident, None).type[0]
         fp_offset = -8
         for i in range(0, len(parameters)):
             # Load parameters
@@ -671,69 +1238,58 @@ class CodeGenerator:
             if param[1] == 'ref':
                 addr_reg = self._find_free_register()
 
-                self.sym_table.create_entry(var_id, None, mem_type + ' ref', 'PARAM', None, None, addr_reg, False)
-                _, var_mem_name, _, _, _, _, _ = self.sym_table.get_entry(var_id, None)
+                var_mem_name = self.sym_table.create_entry(var_id, None, mem_type + ' ref', 'PARAM', None, None,
+                                                           addr_reg, False).mem_name
                 self._update_tables(cleaned_type, var_id, None, addr_reg)
                 #val_var_queue.append({'reg': addr_reg, 'id': var_id, 'mem_type': 'ADDRESS'})
 
-                self.output_string += asm_load_mem_var_from_addr('$fp', addr_reg, fp_offset)
-                self.output_string += asm_save_mem_var_from_addr(var_mem_name, addr_reg)
+                self.output += asm_load_mem_var_from_addr('$fp', addr_reg, fp_offset)
+                self.output += asm_save_mem_var_from_addr(var_mem_name, addr_reg)
             else:
                 val_reg = self._find_free_register()
 
-                self.output_string += asm_load_mem_var_from_addr('$fp', val_reg, fp_offset)
+                self.output += asm_load_mem_var_from_addr('$fp', val_reg, fp_offset)
                 self.sym_table.create_entry(var_id, None, mem_type, 'PARAM', None, None, val_reg, False)
                 self._update_tables(cleaned_type, var_id, None, val_reg)
                 val_var_queue.append({'reg': val_reg, 'id': var_id, 'mem_type': 'VALUE'})
 
             fp_offset -= 4
 
-        self._traverse(tree_nodes.children[1])
+        self._traverse(block, True)
 
         # Remove old references (save anyhting changed)
         self._save_off_registers()
 
-        saved_table = [v for k, v in self.sym_table.symbol_tables[self.sym_table.scope].items()]
+        saved_table = list(self.sym_table.symbol_tables[self.sym_table.scope].values())
         pre_string = asm_save_variables_to_stack(saved_table)
         post_string = asm_load_variables_from_stack(saved_table)
 
-        # Hack to reoffset the return stack address (this is bad)
-        split = self.output_string.split('\n')
-        process_split = []
-        found = False
-        for i in range(0, len(split)):
-            s = split[i]
-            if 'return' in s:
-                s = s.replace('0($sp)', str(4 * len(saved_table)) + '($sp)')
-                split[i] = s
-                process_split.append(s)
-                process_split.append(post_string)
-                found = True
-            else:
-                process_split.append(s)
-
-        if found == True:
-            self.output_string = pre_string + '\n'.join(process_split)
-        else:
-            self.output_string = pre_string + '\n'.join(process_split) + post_string
+        # Move the stack offset of the return values past the saved variables, and restore them before returning
+        # (or at the end, if the function never returns)
+        if not self.output.patch_returns(4 * len(saved_table), post_string):
+            self.output += post_string
 
         # Remove loaded addresses and such
-        for entry in self.var_queue + self.float_var_queue:
+        for entry in list(self.var_queue) + list(self.float_var_queue):
             if entry['mem_type'] == 'ARRAY_ADDRESS':
                 mem_type, mem_name, addr_reg, used = self.sym_table.get_array_entry(entry['id'], None)
                 self.sym_table.set_array_entry(entry['id'],  mem_type, mem_name, None, used)
             else:
-                mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used \
-                    = self.sym_table.get_entry_suppress(entry['id'])
-                if mem_type is not None:
-                    self.sym_table.set_entry(entry['id'], mem_type, mem_name, 'DYNAMIC', None, None, None, used)
+                sym_entry = self.sym_table.find(entry['id'])
+                if sym_entry is not None:
+                    sym_entry.init_val = 'DYNAMIC'
+                    sym_entry.curr_val = sym_entry.addr_reg = sym_entry.val_reg = None
 
-        self.func_string += func_name + ':\n' + self.output_string + 'jr $ra\n'
+        self.functions.line = saved_output.line
+        self.functions += asm_label(func_name) + pre_string
+        self.functions.extend(self.output)
+        self.functions += asm_jump_to_reg('$ra')
 
         # Restore old stuff
-        self.output_string = saved_output_string
+        self.output = saved_output
         self.forced_dynamic = saved_forced_dynamic
         self.sym_table.close_scope()
+        self.sym_table.close_function()
 
         # Reset tables and var_queues
         self.reg_table = saved_reg_table
@@ -741,86 +1297,56 @@ class CodeGenerator:
         self.aux_reg_table = saved_aux_reg_table
         self.var_queue = saved_var_queue
         self.float_var_queue = saved_float_var_queue
+        self.pinned = saved_pinned
+        self.lookahead = saved_lookahead
+        self.next_uses = {}
+        self.spilled = saved_spilled
 
-    def _id_statement(self, tree_nodes):
-        self._process_id_state_body(tree_nodes[0].children[0], tree_nodes[0].children[1])
+    # Returns (type, ident) or (type, 'ref', ident) for each Param
+    def _process_func_dec_params(self, params):
+        return tuple((param.type.pattern, 'ref', param.ident.pattern) if param.is_ref
+                     else (param.type.pattern, param.ident.pattern) for param in params)
 
-    def _process_id_state_body(self, ident_node, id_state_body_node):
-        if id_state_body_node.children[0].label == "ASSIGN":
-            self._assign(ident_node, id_state_body_node.children[0])
-        else:
-            self._process_func(ident_node, id_state_body_node.children[0])
-
-    def _process_func(self, ident_node, tree_nodes):
-        tail_nodes = None
-        if len(tree_nodes.children) > 1:
-            tail_nodes = tree_nodes.children[1].children
-        self._process_func_gen(ident_node, tree_nodes.children[0], tail_nodes)
-
-    def _process_func_gen(self, ident_node, tree_nodes, tail_nodes):
-        if tree_nodes.label == "FUNC_DEC" or tail_nodes is not None:
-            self._process_func_dec(ident_node, tree_nodes.children, tail_nodes)
-        elif tree_nodes.label == "FUNC_CALL" or tail_nodes is None:
-            self._process_func_call(ident_node, tree_nodes.children)
-
-    def _process_func_dec_params(self, parameter_nodes):
-        params = []
-        i = 0
-        while i < len(parameter_nodes):
-            type = parameter_nodes[i].token.pattern
-            if parameter_nodes[i+1].label == 'REF':
-                ref = 'ref'
-                ident = parameter_nodes[i+2].token.pattern
-                params.append((type, ref, ident))
-                i += 1
-            else:
-                ident = parameter_nodes[i+1].token.pattern
-                params.append((type, ident))
-            i += 2
-        return tuple(params)
-
-    def _process_func_dec(self, ident_node, parameter_nodes, tail_nodes):
-        ret_value = None
-        block_node = None
-        if len(tail_nodes) > 1:
-            ret_value = tail_nodes[0].token.pattern
-            block_node = tail_nodes[1]
-        else:
-            block_node = tail_nodes[0]
+    def _process_func_dec(self, func_dec):
+        ret_value = func_dec.return_type.pattern if func_dec.return_type is not None else None
 
         # Get parameters
-        parameters = ()
-        if len(parameter_nodes) > 0:
-            parameters = self._process_func_dec_params(parameter_nodes[0].children)
+        parameters = self._process_func_dec_params(func_dec.params)
 
         # Create function table entry for function
-        token = ident_node.token
+        token = func_dec.ident
         ident = token.pattern
         self.sym_table.create_entry(ident, token, [parameters, ret_value], None, None, None, None, None)
 
-        # Append function block to func_string
-        _, mem_name, _, _, _, _, _ = self.sym_table.get_entry(ident, token)
-        self._process_func_block(ident, mem_name, parameters, block_node)
+        # A body the parser skipped is only parsed (and compiled) if the function can be called
+        body = func_dec.body
+        if type(body) is LazyBlock:
+            if not body.is_used(ident):
+                return
+            body = body.block(self.call_mode)
+
+        # Append function block to functions
+        self._process_func_block(ident, self.sym_table.lookup(ident, token).mem_name, parameters, body)
 
     def _create_activation_record(self, parameters):
         # Old frame pointer
-        self.output_string += asm_allocate_stack_space(4)
-        self.output_string += asm_save_mem_var_from_addr('$sp', '$fp')
+        self.output += asm_allocate_stack_space(4)
+        self.output += asm_save_mem_var_from_addr('$sp', '$fp')
 
         # Set new frame pointer
-        self.output_string += asm_reg_set('$fp', '$sp')
+        self.output += asm_reg_set('$fp', '$sp')
 
         # Store old Return address
-        self.output_string += asm_allocate_stack_space(4)
-        self.output_string += asm_save_mem_var_from_addr('$sp', '$ra')
+        self.output += asm_allocate_stack_space(4)
+        self.output += asm_save_mem_var_from_addr('$sp', '$ra')
 
         # Parameters
         for p in parameters:
             pass_type = p[2]
 
-            self.output_string += asm_allocate_stack_space(4)
+            self.output += asm_allocate_stack_space(4)
 
-            val_reg, val_type, val_token = self._process_expr_bool(p[0].children)
+            val_reg, val_type, val_token = self._process_expression(p[0])
 
             # Type check
             if val_type != p[1]:
@@ -829,21 +1355,24 @@ class CodeGenerator:
                                                             val_token.col)
 
             if pass_type == 'ref':
-                mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used \
-                    = self.sym_table.get_entry(val_token.pattern, val_token)
+                entry = self.sym_table.lookup(val_token.pattern, val_token)
+                # A ref is passed on with the address it holds
+                val_reg = entry.val_reg
 
-                if curr_val is not None:
-                    self.output_string += asm_save_mem_var_from_addr(mem_name, curr_val)
-                    curr_val = None
-                    used = True
+                if entry.curr_val is not None:
+                    self.output += asm_save_mem_var_from_addr(entry.mem_name, entry.curr_val)
+                    entry.used = True
 
+                addr_reg = entry.addr_reg
                 if addr_reg is None:
                     addr_reg = self._find_free_register()
-                    self.output_string += asm_load_mem_addr(mem_name, addr_reg)
+                    self.output += asm_load_mem_addr(entry.mem_name, addr_reg)
 
                 # Assume function will edit this
-                self.sym_table.set_entry(val_token.pattern, mem_type, mem_name, init_val, None, None, None, used)
-                if 'ref' not in mem_type:
+                entry.curr_val = entry.addr_reg = entry.val_reg = None
+                self.var_queue.remove_id(val_token.pattern, 'VALUE')
+                self.float_var_queue.remove_id(val_token.pattern, 'VALUE')
+                if 'ref' not in entry.type:
                     val_reg = addr_reg
 
             if type(val_reg) is str:
@@ -853,37 +1382,36 @@ class CodeGenerator:
 
                 self._update_reg_table('normal', string, val_reg, 'ARRAY_ADDRESS')
                 self.var_queue.append({'reg': val_reg, 'id': string, 'mem_type': 'ARRAY_ADDRESS'})
-                self.output_string += asm_load_mem_addr(mem_name, val_reg)
+                self.output += asm_load_mem_addr(mem_name, val_reg)
 
-            self.output_string += asm_save_mem_var_from_addr('$sp', val_reg)
+            self.output += asm_save_mem_var_from_addr('$sp', val_reg)
             #if pass_type == 'ref':
-            #    self.output_string +=  asm_save_mem_var_from_addr(mem_name, val_reg)
+            #    self.output +=  asm_save_mem_var_from_addr(mem_name, val_reg)
 
         # Return value
-        self.output_string += asm_allocate_stack_space(4)
+        self.output += asm_allocate_stack_space(4)
 
     def _destroy_activation_record(self):
         # Restore old return address
-        self.output_string += asm_load_mem_var_from_addr('$fp', '$ra', -4)
+        self.output += asm_load_mem_var_from_addr('$fp', '$ra', -4)
 
         # Restore old stack pointer
-        self.output_string += asm_reg_set('$sp', '$fp')
-        #self.output_string += asm_sub('$sp', '$sp', -4)
+        self.output += asm_reg_set('$sp', '$fp')
+        #self.output += asm_sub('$sp', '$sp', -4)
 
         # Restore old frame pointer
-        self.output_string += asm_load_mem_var_from_addr('$fp', '$v1')
-        self.output_string += asm_reg_set('$fp', '$v1')
+        self.output += asm_load_mem_var_from_addr('$fp', '$v1')
+        self.output += asm_reg_set('$fp', '$v1')
 
-    def _process_func_call(self, ident_node, parameter_nodes):
-        token = ident_node.token
+    def _process_func_call(self, call):
+        token = call.ident
         ident = token.pattern
 
-        mem_type, mem_name, _, _, _, _, _ = self.sym_table.get_entry(ident, token)
+        entry = self.sym_table.lookup(ident, token)
+        mem_type, mem_name = entry.type, entry.mem_name
 
-        # Extract parameter_nodes
         func_params = mem_type[0]
-        if len(parameter_nodes) > 0:
-            parameter_nodes = parameter_nodes[0].children[0].children
+        parameter_nodes = call.args
         if len(parameter_nodes) != len(func_params):
             SemanticError.raise_parameter_number_mismatch(len(func_params), ident, token.line_num, token.col)
         parameters = []
@@ -894,14 +1422,23 @@ class CodeGenerator:
         return self._run_func(ident, mem_type, mem_name, parameters)
 
     def _run_func(self, ident, mem_type, mem_name, parameters):
+        # The temporaries of the expression the call is in are still needed after it, but the function can change any
+        # register
+        for var_queue in (self.var_queue, self.float_var_queue):
+            for entry in [entry for entry in var_queue if entry['mem_type'].startswith('TYPE.')]:
+                var_queue.remove(entry)
+                self._spill_temporary(entry)
         self._save_off_registers()
 
         #saved_reg_pool = self.reg_pool + self.float_reg_pool + self.aux_reg_pool
         self._create_activation_record(parameters)
-        #self.output_string += asm_save_off_reg_pool(saved_reg_pool)
-        self.output_string += 'jal ' + mem_name + '\n'
+        # The function can change any register, so the arguments loaded for it can't be used after it (they weren't
+        # changed, so nothing is stored)
+        self._save_off_registers()
+        #self.output += asm_save_off_reg_pool(saved_reg_pool)
+        self.output += asm_jal_to_label(mem_name)
 
-        #self.output_string += asm_load_reg_pool_from_stack(saved_reg_pool)
+        #self.output += asm_load_reg_pool_from_stack(saved_reg_pool)
         # Get return value (if necessary)
         ret_reg = None
         ret_type = mem_type[1]
@@ -912,32 +1449,68 @@ class CodeGenerator:
             ret_reg = self._find_free_register(cleaned_type)
             self._update_reg_table('normal', ident, ret_reg, 'FUNC')
             val_var_queue.append({'reg': ret_reg, 'id': ident, 'mem_type': 'FUNC'})
-            self.output_string += asm_load_mem_var_from_addr('$sp', ret_reg)
+            self.output += asm_load_mem_var_from_addr('$sp', ret_reg)
         self._destroy_activation_record()
 
         return ret_reg, ret_type, None
 
-    def _process_return(self, tree_nodes):
-        val_reg, val_type, val_token = self._process_expr_bool(tree_nodes[0].children[0].children)
-        self.output_string += asm_save_mem_var_from_addr('$sp', val_reg, ret_stat=True) + 'jr $ra\n'
-
-    # Searches tree until it finds something to process
-    def _traverse(self, tree):
-        if self.tree.children:
-            for child in tree.children:
-                if child.label in self.func_factory:
-                    self.func_factory[child.label](tree.children)
-                    break
-                else:
-                    self._traverse(child)
+    def _process_return(self, return_node):
+        val_reg, val_type, val_token = self._process_expression(return_node.expr)
+        self.output.add_return(asm_save_mem_var_from_addr('$sp', val_reg, ret_stat=True), asm_jump_to_reg('$ra'))
+
+    # Processes the statements of a block in order
+    # region is True for the block of the main program or of a function, whose variables are kept in registers over
+    # their live intervals with alloc_mode = 'linear'
+    def _traverse(self, block, region = False):
+        starts, ends = self._allocate_region(block.statements) if region and self.alloc_mode == 'linear' else ({}, {})
+        interval_regs = {}
+        frame = [statement_uses(block.statements, self.use_summaries), 0, block.statements]
+        self.lookahead.append(frame)
+        for index, statement in enumerate(block.statements):
+            frame[1] = index
+            self.next_uses = {}
+            if index in starts:
+                entries = [self.sym_table.find(ident) for ident in starts[index]]
+                interval_regs.update(zip(starts[index], self._pin_entries(entries)))
+            self.output.line = statement.line_num()
+            self.func_factory[type(statement)](statement)
+            self._free_temporaries()
+            self.use_summaries.pop(id(statement), None)
+            if index in ends:
+                self._unpin_variables([interval_regs.pop(ident) for ident in ends[index]])
+        self.lookahead.pop()
+        self.next_uses = {}
+
+    # Frees the registers of the temporaries of a statement once it's compiled (only its expressions know their ids,
+    # so they are never used again)
+    def _free_temporaries(self):
+        for var_queue, reg_table in ((self.var_queue, self.reg_table), (self.float_var_queue, self.float_reg_table)):
+            temporaries = [entry for entry in var_queue if entry['mem_type'].startswith('TYPE.')]
+            for entry in temporaries:
+                var_queue.remove(entry)
+                if reg_table[entry['reg']]['id'] == entry['id']:
+                    reg_table[entry['reg']] = CodeGenerator._empty_reg_dict()
+
+        # The temporaries that were freed to memory are dead too: the values and addresses they were loaded into again
+        # are dropped without being stored, and their names are given back
+        for sym_entry in self.spilled:
+            for var_queue, reg_table in ((self.var_queue, self.reg_table),
+                                         (self.float_var_queue, self.float_reg_table)):
+                for entry in var_queue.with_id(sym_entry.mem_id):
+                    var_queue.remove(entry)
+                    if reg_table[entry['reg']]['id'] == entry['id']:
+                        reg_table[entry['reg']] = CodeGenerator._empty_reg_dict()
+            sym_entry.addr_reg = sym_entry.val_reg = None
+            sym_entry.dirty = False
+            self.sym_table.free_name(sym_entry)
+        self.spilled.clear()
 
     # Takes a list of id's and writes required code to read input into each
-    def _read(self, tree_nodes):
-        id_list = tree_nodes[1].children
-        for ident in id_list:
-            token = ident.token
+    def _read(self, read):
+        for token in read.idents:
             var_id = token.pattern
-            mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(var_id, token)
+            entry = self.sym_table.lookup(var_id, token)
+            mem_type = entry.type
 
             if mem_type in {'string', 'bool'}:
                 SemanticError.raise_incompatible_type(var_id, mem_type, 'Read Function', token.line_num, token.col)
@@ -945,22 +1518,21 @@ class CodeGenerator:
             # Reset $v0
             self.aux_reg_table[self.val_0] = self._empty_aux_reg_dict()
 
-            if init_val is None:
-                init_val = 'DYNAMIC'
+            if entry.init_val is None:
+                entry.init_val = 'DYNAMIC'
 
             # Used = True might be unneccasry (THIS MIGHT BE UNNECESSARY - TEST REMOVING IT)
-            self.sym_table.set_entry(var_id, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, True)
+            entry.used = True
 
             input_reg = self.float_0 if mem_type == 'float' else self.val_0
 
-            self.output_string += asm_read(mem_type) # places input into $v0
+            self.output += asm_read(mem_type) # places input into $v0
             self._assign_id(var_id, input_reg)
 
     # Takes a list of expressions and correctly prints them
-    def _write(self, tree_nodes):
-        expr_lst = tree_nodes[1].children
-        for expr in expr_lst:
-            var_reg, var_type, var_token = self._process_expr_bool(expr.children)
+    def _write(self, write):
+        for expr in write.exprs:
+            var_reg, var_type, var_token = self._process_expression(expr)
 
             # Construct expr_type, which will control what's written out
             expr_reg = var_reg
@@ -969,7 +1541,7 @@ class CodeGenerator:
             curr_v0 = self.aux_reg_table[self.val_0]['val']
             # If check_syscode is true, then edits need to be made
             if asm_check_syscode_write(expr_type, curr_v0):
-                self.output_string += asm_set_syscode_write(expr_type)
+                self.output += asm_set_syscode_write(expr_type)
                 self.aux_reg_table[self.val_0]['id'] = None
                 self.aux_reg_table[self.val_0]['val'] = asm_get_syscode_write(expr_type)
                 self.aux_reg_table[self.val_0]['mem_name'] = None
@@ -990,29 +1562,37 @@ class CodeGenerator:
                     true_used = True
                     fal_used = True
 
+                    # The bool, and the address of "True" once it's loaded, are locked until they are used, so freeing a
+                    # register for the next address doesn't take them
+                    locked = [self._lock_register(expr_reg)]
+
                     # Ensure addresses are loaded
                     if true_addr_reg is None:
                         true_addr_reg = self._find_free_register()
                         self._update_reg_table('normal', '"True"', true_addr_reg, 'ARRAY_ADDRESS')
                         self.var_queue.append({'reg': true_addr_reg, 'id': '"True"',
                                                'mem_type': 'ARRAY_ADDRESS'})
-                        self.output_string += asm_load_mem_addr(true_mem_name, true_addr_reg)
+                        self.output += asm_load_mem_addr(true_mem_name, true_addr_reg)
+                    locked.append(self._lock_register(true_addr_reg))
 
                     if fal_addr_reg is None:
                         fal_addr_reg = self._find_free_register()
                         self._update_reg_table('normal', '"FALSE"', fal_addr_reg, 'ARRAY_ADDRESS')
                         self.var_queue.append({'reg': fal_addr_reg, 'id': '"False"',
                                                'mem_type': 'ARRAY_ADDRESS'})
-                        self.output_string += asm_load_mem_addr(fal_mem_name, fal_addr_reg)
+                        self.output += asm_load_mem_addr(fal_mem_name, fal_addr_reg)
 
                     self.sym_table.set_array_entry('"True"', true_mem_type, true_mem_name, true_addr_reg, true_used)
                     self.sym_table.set_array_entry('"False"', fal_mem_type, fal_mem_name, fal_addr_reg, fal_used)
 
                     # Since this register will only be used in this function, with no other calls to _find_free_reg(),
                     # it does not have to be reserved, just cleared and made accessible
+                    locked.append(self._lock_register(fal_addr_reg))
                     r_reg = self._find_free_register()
-                    self.output_string += asm_dynamic_bool_print(r_reg, expr_reg, true_addr_reg, fal_addr_reg)
+                    self.output += asm_dynamic_bool_print(r_reg, expr_reg, true_addr_reg, fal_addr_reg)
                     expr_reg = r_reg
+                    for reg_entries in locked:
+                        self._unlock_register(reg_entries)
 
                     # Reset $a0
                     self.aux_reg_table[self.arg_0] = self._empty_aux_reg_dict()
@@ -1030,7 +1610,7 @@ class CodeGenerator:
                     addr_reg = self._find_free_register()
                     self.var_queue.append({'reg': addr_reg, 'id': expr_reg, 'mem_type': 'ARRAY_ADDRESS'})
                     self._update_reg_table('normal', expr_reg, addr_reg, 'ADDRESS_ARRAY')
-                    self.output_string += asm_load_mem_addr(mem_name, addr_reg)
+                    self.output += asm_load_mem_addr(mem_name, addr_reg)
 
                 self.sym_table.set_array_entry(expr_reg, mem_type, mem_name, addr_reg, used)
 
@@ -1066,28 +1646,29 @@ class CodeGenerator:
                     f12_dict['val'] = expr_reg
                     f12_dict['id'] = None
                     f12_dict['mem_type'] = 'float'
-            self.output_string += asm_write(expr_reg, expr_type, is_a0_set)
+            self.output += asm_write(expr_reg, expr_type, is_a0_set)
 
-    # Takes assign tree_nodes: with an ID on the left and some expression on the right
+    # Takes an Assign node: with an ID on the left and some expression on the right
     # Initializes variable on the left, and evalutes RHS using '_expr_funct'
-    def _assign(self, ident_node, tree_nodes):
+    def _assign(self, assign):
         # Get RHS result
         expr_id = None
-        expr_reg, expr_type, expr_token = self._process_expr_bool(tree_nodes.children[0].children)
+        expr_reg, expr_type, expr_token = self._process_expression(assign.expr)
 
         # Get LHS variable
-        token = ident_node.token
+        token = assign.ident
         ident = token.pattern
-        mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(ident, token)
+        entry = self.sym_table.lookup(ident, token)
+        mem_type = entry.type
 
         ref_type = mem_type.split(' ')[0]
 
         # Set init_val if first time calling
-        if init_val is None:
+        if entry.init_val is None:
             if type(expr_reg) is Register:
-                init_val = 'DYNAMIC'
+                entry.init_val = 'DYNAMIC'
             else:
-                init_val = expr_reg
+                entry.init_val = expr_reg
 
         # Throw type error
         if ref_type != expr_type:
@@ -1099,7 +1680,7 @@ class CodeGenerator:
                     expr_temp_id = next(self.temp_id_generator)
                     self.float_var_queue.append({'reg': expr_float_reg, 'id': expr_temp_id, 'mem_type': 'TYPE.float'})
                     # Coerce next_type up
-                    self.output_string += asm_cast_int_to_float(expr_float_reg, expr_reg)
+                    self.output += asm_cast_int_to_float(expr_float_reg, expr_reg)
                     # set expr_reg to be the new float_reg
                     expr_reg = expr_float_reg
                 else:
@@ -1107,12 +1688,10 @@ class CodeGenerator:
             else:
                 SemanticError.raise_type_mismatch_error(ident, expr_token.pattern, mem_type, expr_type,
                                                         expr_token.line_num, expr_token.col)
-        # Save changes
-        self.sym_table.set_entry(ident, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used)
 
         #if 'ref' in mem_type:
         #    actual_val_reg = self._find_free_register()
-        #    self.output_string += asm_load_mem_var_from_addr(val_reg, actual_val_reg)
+        #    self.output += asm_load_mem_var_from_addr(val_reg, actual_val_reg)
         #    self._update_reg_table('normal', ident, actual_val_reg, 'VALUE')
         #    expr_reg = actual_val_reg
 
@@ -1124,49 +1703,54 @@ class CodeGenerator:
     # Returns nothing, since it should correctly equate values
     # (Either changing curr_val if RHS is an immediate, or
     def _assign_id(self, var_id, assn_reg, expr_id = None):
-        mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(var_id, None)
+        entry = self.sym_table.lookup(var_id, None)
+        mem_type = entry.type
         ref_flag = True if 'ref' in mem_type else False
 
         python_assn_type = type(assn_reg)
         if not self.forced_dynamic:
             if python_assn_type is Register:
-                curr_val = None
+                entry.curr_val = None
             elif python_assn_type is int and mem_type == 'int':
-                curr_val = assn_reg
+                entry.curr_val = assn_reg
             elif python_assn_type is float and mem_type == 'float':
-                curr_val = assn_reg
+                entry.curr_val = assn_reg
             elif python_assn_type is bool and mem_type == 'bool':
-                curr_val = assn_reg
+                entry.curr_val = assn_reg
             elif python_assn_type is str and mem_type == 'string':
-                curr_val = assn_reg
+                entry.curr_val = assn_reg
 
         # Only load variable into memory if there is no curr_val (i.e. the compiler can't do static analysis)
-        if curr_val is None or self.forced_dynamic:
+        if entry.curr_val is None or self.forced_dynamic:
             # Set id to be printed out to MIPS
-            used = True
+            entry.used = True
 
-            curr_val = None
+            entry.curr_val = None
 
             # Load variable addr and val into registers
+            val_reg = entry.val_reg
             if not val_reg:
                 type_str = 'float' if mem_type == 'float' else 'normal'
                 val_var_queue = self.float_var_queue if mem_type == 'float' else self.var_queue
 
                 val_reg = self._find_free_register(type_str)
+                # Freeing a register can take the one with the address, then it is loaded again below
+                addr_reg = entry.addr_reg
                 self._update_tables(type_str, var_id, addr_reg, val_reg)
 
                 if not addr_reg:
                     addr_reg = self._find_free_register()
                     self._update_tables(type_str, var_id, addr_reg, val_reg)
                     self.var_queue.append({'reg': addr_reg, 'id': var_id, 'mem_type': 'ADDRESS'})
-                    self.output_string += asm_load_mem_addr(mem_name, addr_reg)
+                    self.output += asm_load_mem_addr(entry.mem_name, addr_reg)
 
                 # Since it is less work to pop an addr register from the queue, I would rather push that first
                 # (if necessary), and then push the value register
                 if not ref_flag:
                     val_var_queue.append({'reg': val_reg, 'id': var_id, 'mem_type': 'VALUE'})
 
-                self.output_string += asm_load_mem_var_from_addr(addr_reg, val_reg)
+                self.output += asm_load_mem_var_from_addr(addr_reg, val_reg)
+                self._count_reload(var_id)
 
             # Ensure expr_id is loaded (if not None)
             if expr_id:
@@ -1174,18 +1758,22 @@ class CodeGenerator:
 
             act_reg = val_reg
             if ref_flag:
+                # The address the ref holds is still needed to store the value through it
+                locked = self._lock_register(val_reg)
                 new_reg = self._find_free_register()
-                self.output_string += asm_load_mem_var_from_addr(val_reg, new_reg)
+                self._unlock_register(locked)
+                self.output += asm_load_mem_var_from_addr(val_reg, new_reg)
                 act_reg = new_reg
 
             # Equate registers (move assn_reg value into val_reg)
-            self.output_string += asm_reg_set(act_reg, assn_reg)
+            self.output += asm_reg_set(act_reg, assn_reg)
 
             if ref_flag:
                 # save to memory
-                self.output_string += asm_save_mem_var_from_addr(val_reg, act_reg)
+                self.output += asm_save_mem_var_from_addr(val_reg, act_reg)
 
-        self.sym_table.set_entry(var_id, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used)
+            # The new value is only in the register until it's written back (a ref's value was stored through it)
+            entry.dirty = not ref_flag
 
     # Needs to initialize an identifier's symbol table
     # Update: type, mem_name, init_val, curr_val, addr_reg, var_reg (unless value can be statically analyzed)
@@ -1197,20 +1785,17 @@ class CodeGenerator:
     # Load into memory
     # Grab empty symbol table and edit types
     # sym_table[id] = empty table?
-    def _declare(self, tree_nodes):
-        # The type is the first child of declare and the
-        # declaration list is the second
-        var_type = tree_nodes[0].children[0].token.name.lower()
-        decl_list = tree_nodes[0].children[1].children
+    def _declare(self, declaration):
+        var_type = declaration.type.name.lower()
 
         # Need to go through the list of ids being declared
-        for term in decl_list:
-            self._process_declare_term(term.children, var_type)
+        for term in declaration.terms:
+            self._process_declare_term(term, var_type)
 
     # Used to run individual declare statements
-    def _process_declare_term(self, children, mem_type):
+    def _process_declare_term(self, term, mem_type):
         # Get var_id and reserve MIPS name
-        token = children[0].token
+        token = term.ident
         var_id = token.pattern
 
         # Clean up the type and get correct var_queue for variable type
@@ -1224,8 +1809,8 @@ class CodeGenerator:
         addr_reg = None
 
         # If declaration includes an assignment (to expr_bool)
-        if len(children) > 1:
-            expr_reg, expr_type, expr_token = self._process_expr_bool(children[1].children)
+        if term.expr is not None:
+            expr_reg, expr_type, expr_token = self._process_expression(term.expr)
 
             # Raise SemanticError on type mismatch
             if expr_type != mem_type:
@@ -1237,7 +1822,7 @@ class CodeGenerator:
                         expr_temp_id = next(self.temp_id_generator)
                         self.float_var_queue.append({'reg': expr_float_reg, 'id': expr_temp_id, 'mem_type': 'TYPE.float'})
                         # Coerce next_type up
-                        self.output_string += asm_cast_int_to_float(expr_float_reg, expr_reg)
+                        self.output += asm_cast_int_to_float(expr_float_reg, expr_reg)
                         # set expr_reg to be the new float_reg
                         expr_reg = expr_float_reg
                     else:
@@ -1263,21 +1848,19 @@ class CodeGenerator:
                 var_queue.append({'reg': val_reg, 'id': var_id, 'mem_type': 'VALUE'})
                 self._update_reg_table(clean_type, var_id, val_reg, 'VALUE')
 
-                self.output_string += asm_reg_set(val_reg, expr_reg)
+                self.output += asm_reg_set(val_reg, expr_reg)
 
         # Throws error if already declared
         # Maybe move this up so it throws error earlier instead of running through all processes?
         self.sym_table.create_entry(var_id, token, mem_type, init_val, curr_val, addr_reg, val_reg, False)
 
-    def _process_if(self, tree_nodes):
+    def _process_if(self, if_node):
         saved_forced_dynamic = True if self.forced_dynamic else False
 
-        if_children = tree_nodes[0]
-
         # Grab conditional, if block, and else block
-        conditional_expr = if_children.children[1]
-        if_block = if_children.children[3]
-        else_block = if_children.children[5] if len(if_children.children) > 4 else None
+        conditional_expr = if_node.cond
+        if_block = if_node.then_block
+        else_block = if_node.else_block
 
         # Generate labels
         block_label = next(self.conditional_name_generator)
@@ -1285,60 +1868,165 @@ class CodeGenerator:
         else_label = block_label + '_else'
         end_label = block_label + '_end'
 
-        # Process conditional and if block
-        self._save_off_registers()
-        cond_reg, cond_type, cond_token = self._process_expr_bool(conditional_expr.children)
+        # Process conditional and if block (with the variables the if uses in the same registers in both branches, so
+        # nothing has to be moved or stored where they meet)
+        pinned = self._pin_variables(if_node)
+        cond_reg, cond_type, cond_token = self._process_expression(conditional_expr)
         if cond_type != 'bool':
             SemanticError.raise_incompatible_type(cond_token.pattern, cond_type, 'conditional blocks',
                                                   cond_token.line_num, cond_token.col)
 
-        self.output_string += asm_conditional_check(cond_reg, end_label if else_block is None else else_label)
-        self.output_string += if_label + ':\n'
+        self.output += asm_conditional_check(cond_reg, end_label if else_block is None else else_label)
+        self.output += asm_label(if_label)
         self.forced_dynamic = True
         self._process_block(if_block)
-        self.output_string += asm_branch_to_label(end_label)
+        self.output += asm_branch_to_label(end_label)
 
         # Process else block
         if else_block:
-            self.output_string += else_label + ':\n'
+            self.output += asm_label(else_label)
             self._process_block(else_block)
 
-        self.output_string += end_label + ':\n'
+        self.output += asm_label(end_label)
+        self._unpin_variables(pinned)
 
         self.forced_dynamic = saved_forced_dynamic
 
-    def _process_while(self, tree_nodes):
+    def _process_while(self, while_node):
         saved_forced_dynamic = True if self.forced_dynamic else False
 
-        while_children = tree_nodes[0]
-
-        # Grab conditional, if block, and else block
-        conditional_expr = while_children.children[1]
-        while_block = while_children.children[2]
+        # Grab conditional and while block
+        conditional_expr = while_node.cond
+        while_block = while_node.body
 
         # Generate labels
         block_label = next(self.conditional_name_generator)
         while_label = block_label + '_while'
         end_label = block_label + '_end'
 
-        # Create while
-        self._save_off_registers()
+        # Create while (with the variables it uses in registers for the whole loop)
+        pinned = self._pin_variables(while_node)
         self.forced_dynamic = True
-        self.output_string += while_label + ':\n'
-        cond_reg, cond_type, cond_token = self._process_expr_bool(conditional_expr.children)
+        self.output += asm_label(while_label)
+        cond_reg, cond_type, cond_token = self._process_expression(conditional_expr)
         if cond_type != 'bool':
             SemanticError.raise_incompatible_type(cond_token.pattern, cond_type, 'conditional blocks',
                                                   cond_token.line_num, cond_token.col)
 
-        self.output_string += asm_conditional_check(cond_reg, end_label)
+        self.output += asm_conditional_check(cond_reg, end_label)
         self._process_block(while_block)
-        self.output_string += asm_branch_to_label(while_label)
+        self.output += asm_branch_to_label(while_label)
 
         # Create end label
-        self.output_string += end_label + ':\n'
+        self.output += asm_label(end_label)
+        self._unpin_variables(pinned)
 
         self.forced_dynamic = saved_forced_dynamic
 
+    # Saves off registers, except for the variables a while loop or an if uses (the most used first), which are put in
+    # registers that they keep until its end, so they aren't loaded and stored again in every iteration or branch
+    # A variable that is in a register already keeps it, and one with a constant value gets it put in its register
+    # (memory may not have it, and the loop or the branches can't use the constant). Under forced_dynamic the constants
+    # may be from an earlier iteration of a loop, so the value in memory is used
+    # EXPRESSION_REGISTERS of each pool are always left for expressions and other variables (so in safe mode, with only
+    # 10 registers, nothing is pinned)
+    # Returns the registers it took
+    def _pin_variables(self, node):
+        counts = used_variables(node, self.use_summaries)
+        if not counts:
+            self._save_off_registers()
+            return []
+
+        free = self._free_pin_registers()
+        chosen = []
+        for ident in sorted(counts, key = counts.get, reverse = True):
+            sym_entry = self.sym_table.find(ident)
+            if sym_entry is None or sym_entry.type not in PINNED_TYPES:
+                continue
+            # Outer loops', ifs' and live intervals' variables are already pinned (but a constant the variable was
+            # given since isn't in its register)
+            if sym_entry.val_reg in self.pinned:
+                if sym_entry.curr_val is not None and not self.forced_dynamic:
+                    self.output += asm_reg_set(sym_entry.val_reg, sym_entry.curr_val)
+                    sym_entry.dirty = True
+                continue
+            clean_type = 'float' if sym_entry.type == 'float' else 'normal'
+            if free[clean_type] <= 0:
+                continue
+            free[clean_type] -= 1
+            chosen.append(sym_entry)
+
+        return self._pin_entries(chosen, True)
+
+    # How many more registers of each pool can be pinned
+    def _free_pin_registers(self):
+        free = {'normal': len(self.reg_pool) - EXPRESSION_REGISTERS,
+                'float': len(self.float_reg_pool) - EXPRESSION_REGISTERS}
+        for sym_entry in self.pinned.values():
+            free['float' if sym_entry.type == 'float' else 'normal'] -= 1
+        return free
+
+    # Pins the variables of the entries, in the registers they are in or in free ones (saving off the other registers
+    # first with save_off)
+    # Returns the registers it took
+    def _pin_entries(self, entries, save_off = False):
+        # Take the variables out of the var_queues, so they aren't saved off (a variable can be in the queue more than
+        # once, but only its val_reg has its value)
+        entry_ids = {sym_entry.mem_id for sym_entry in entries}
+        for mem_id in entry_ids:
+            self.var_queue.remove_id(mem_id, 'VALUE')
+            self.float_var_queue.remove_id(mem_id, 'VALUE')
+        self.pinned.update({sym_entry.val_reg: sym_entry for sym_entry in entries if sym_entry.val_reg})
+        if save_off:
+            self._save_off_registers()
+
+        pinned = []
+        for sym_entry in entries:
+            clean_type = 'float' if sym_entry.type == 'float' else 'normal'
+            reg = sym_entry.val_reg or self._find_free_register(clean_type)
+            self._update_reg_table(clean_type, sym_entry.mem_id, reg, 'VALUE')
+
+            if sym_entry.curr_val is not None and not self.forced_dynamic:
+                self.output += asm_reg_set(reg, sym_entry.curr_val)
+                sym_entry.dirty = True
+            elif sym_entry.val_reg != reg:
+                self.output += asm_load_mem_var_from_addr(sym_entry.mem_name, reg)
+                sym_entry.dirty = False
+
+            sym_entry.val_reg = reg
+            sym_entry.used = True
+            self.pinned[reg] = sym_entry
+            pinned.append(reg)
+
+        return pinned
+
+    # Linear scan over the live intervals of the variables the statements of the main program or of a function use
+    # (see live_intervals and linear_scan), with the registers that can be pinned
+    # Returns which variables to pin before each statement and to unpin after it (index -> identifiers)
+    def _allocate_region(self, statements):
+        intervals = []
+        for ident, var_type, start, end in live_intervals(statements, self.use_summaries):
+            if var_type is None:
+                sym_entry = self.sym_table.find(ident)
+                var_type = sym_entry.type if sym_entry else None
+            if var_type in PINNED_TYPES:
+                intervals.append([ident, 'float' if var_type == 'float' else 'normal', start, end])
+
+        starts = {}
+        ends = {}
+        for ident, pool, start, end in linear_scan(intervals, self._free_pin_registers()):
+            starts.setdefault(start, []).append(ident)
+            ends.setdefault(end, []).append(ident)
+        return starts, ends
+
+    # Puts the pinned variables back in the var_queues, as variables loaded in their registers (which are the same at
+    # the end of every branch and iteration, so the code after goes on using them)
+    def _unpin_variables(self, pinned):
+        for reg in pinned:
+            sym_entry = self.pinned.pop(reg)
+            val_var_queue = self.float_var_queue if sym_entry.type == 'float' else self.var_queue
+            val_var_queue.append({'reg': reg, 'id': sym_entry.mem_id, 'mem_type': 'VALUE'})
+
     # Used for expressions
     # Returns the register that has the value of accum_id loaded
     def _ensure_id_loaded(self, curr_id, curr_reg):
@@ -1350,20 +2038,41 @@ class CodeGenerator:
         val_var_queue = self.float_var_queue if clean_type == 'float' else self.var_queue
 
         # Check if value in register
-        mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used \
-            = self.sym_table.get_entry_suppress(curr_id)
+        entry = self.sym_table.find(curr_id)
 
         # If id_dict is not found, then curr_reg is correct
-        if mem_name and type(mem_type) is not list:
+        if entry is not None and type(entry.type) is not list:
+            ref_flag = 'ref' in entry.type
+            if ref_flag:
+                # A ref's value was loaded into curr_reg through the address the ref holds (see _process_id), which
+                # keeps the ref's id until the register is taken. Otherwise the address is loaded (into a normal
+                # register) to load the value through it again
+                reg_dict = (self.float_reg_table if clean_type == 'float' else self.reg_table)[curr_reg]
+                if reg_dict['id'] == curr_id and reg_dict['mem_type'] == 'FUNC':
+                    return curr_reg
+                clean_type = 'normal'
+                val_var_queue = self.var_queue
+
+            val_reg = entry.val_reg
             # If id_reg is None, load it into memory
-            if not val_reg:
+            if not val_reg and entry.init_val == 'TEMP' and entry.curr_val is not None:
+                # A constant temporary is made again instead of being loaded (it may change once it's in the register)
+                val_reg = self._find_free_register(clean_type)
+                val_var_queue.append({'reg': val_reg, 'id': curr_id, 'mem_type': 'VALUE'})
+                self._update_tables(clean_type, curr_id, None, val_reg)
+                self.output += asm_reg_set(val_reg, entry.curr_val)
+                entry.curr_val = None
+            elif not val_reg:
                 # Ensure 'used' is checked
                 # If it was removed from a register, and we had to load it again, it means we need it written down
-                used = True
+                entry.used = True
 
                 val_reg = self._find_free_register(clean_type)
+                # Freeing a register can take the one with the address, then it is loaded again below
+                addr_reg = entry.addr_reg
                 val_var_queue.append({'reg': val_reg, 'id': curr_id, 'mem_type': 'VALUE'})
                 self._update_tables(clean_type, curr_id, None, val_reg)
+                self._count_reload(curr_id)
 
                 # If addr_reg is None
                 if not addr_reg:
@@ -1372,14 +2081,18 @@ class CodeGenerator:
                     self._update_tables(clean_type, curr_id, addr_reg, val_reg)
 
                     # Load address into addr_reg
-                    self.output_string += asm_load_mem_addr(mem_name, addr_reg)
+                    self.output += asm_load_mem_addr(entry.mem_name, addr_reg)
 
                 # Load id_reg from addr_reg
-                self.output_string += asm_load_mem_var_from_addr(addr_reg, val_reg)
-
-            self.sym_table.set_entry(curr_id, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used)
+                self.output += asm_load_mem_var_from_addr(addr_reg, val_reg)
 
             id_reg = val_reg
+            if ref_flag:
+                locked = self._lock_register(val_reg)
+                id_reg = self._find_free_register()
+                self._unlock_register(locked)
+                self._update_reg_table('normal', curr_id, id_reg, 'FUNC')
+                self.output += asm_load_mem_var_from_addr(val_reg, id_reg)
 
         return id_reg
 
@@ -1392,38 +2105,69 @@ class CodeGenerator:
         # Initialize val_reg
         accum_reg = self._find_free_register(cleaned_type)
 
-        # Add to var_queue
-        var_queue.append({'reg': accum_reg, 'id': mem_id, 'mem_type': 'TYPE.' + str(curr_type)})
+        # Add to var_queue (with the value of a constant, which can be put back in a register instead of being stored)
+        queue_entry = {'reg': accum_reg, 'id': mem_id, 'mem_type': 'TYPE.' + str(curr_type)}
+        if type(curr_reg) in {int, float, bool}:
+            queue_entry['val'] = curr_reg
+        var_queue.append(queue_entry)
 
         # Reserve accum_reg
         self._update_reg_table(cleaned_type, mem_id, accum_reg, 'VALUE')
 
         # Equate val_reg and curr_reg
-        self.output_string += asm_reg_set(accum_reg, curr_reg)
+        self.output += asm_reg_set(accum_reg, curr_reg)
 
         return accum_reg
 
+    # The register of the temporary mem_id no longer has the constant _init_val_reg put in it
+    def _forget_constant(self, mem_id):
+        for entry in self.var_queue.with_id(mem_id) + self.float_var_queue.with_id(mem_id):
+            entry.pop('val', None)
+
+    # Processes an expression node
+    # Chains of left-associative operators at the same level are flattened into the
+    # <operand> { <operator token> <operand> } lists that the <expr_*> functions take
+    # Returns value register (or immediate), value type, and token
+    def _process_expression(self, expr):
+        node_type = type(expr)
+        if node_type is UnaryOp:
+            return self._process_fact_arith(expr)
+        if node_type is not BinOp:
+            return self._process_term_unary(expr)
+
+        t_class = expr.op.t_class
+        chain = []
+        if t_class not in NON_ASSOCIATIVE:
+            while type(expr) is BinOp and expr.op.t_class == t_class:
+                chain += [expr.rhs, expr.op]
+                expr = expr.lhs
+        else:
+            chain += [expr.rhs, expr.op]
+            expr = expr.lhs
+        chain.append(expr)
+        chain.reverse()
+
+        return self.expr_levels[t_class](chain)
+
     # Abstraction of <expr> functions
-    # children = tree_nodes
-    # children_function == function to process children
+    # children = <operand> { <operator token> <operand> }
     # body_function == function that runs logic (must return val_reg, immediate_val)
     # - must ensure that both val_reg and next_reg are loaded at proper times
     # - must take (tree_nodes, accum_id, val_reg, val_type, val_token, immediate_val, next_reg, next_type, next_token)
     #   as parameters
     # tail function:
     # - accum_id, val_reg, val_type, val_token, immediate_val as children
-    def _process_expr_skeleton(self, children, children_function, body_function, tail_function):
-        # If len(children) == 1 on any expression function, it means the expression just drops through to a lower one
-        # Thus, we can just return exactly whatever returned from the one below
+    def _process_expr_skeleton(self, children, body_function, tail_function):
+        # If len(children) == 1 on any expression function, it means the expression is just its one operand
         if len(children) == 1:
-            return children_function(children[0].children)
+            return self._process_expression(children[0])
         else:
             # Reserve accum_id
             accum_id = next(self.temp_id_generator)
             immediate_val = None
             val_reg = None
 
-            temp_reg, val_type, val_token = children_function(children[0].children)
+            temp_reg, val_type, val_token = self._process_expression(children[0])
             if type(temp_reg) in {int, float, bool, str} and not self.forced_dynamic:
                 immediate_val = temp_reg
             else: # Register
@@ -1432,7 +2176,7 @@ class CodeGenerator:
             # Run the body function of the expression
             for i in range(1, len(children), 2):
                 # Get RHS
-                next_reg, next_type, next_token = children_function(children[i+1].children)
+                next_reg, next_type, next_token = self._process_expression(children[i+1])
 
                 # Save off next_id
                 next_id = None
@@ -1450,9 +2194,11 @@ class CodeGenerator:
                 val_reg, immediate_val, val_type = \
                     body_function(accum_id, val_reg, val_type, val_token, immediate_val, children[i], next_reg,
                                   next_type, next_token)
+                self._forget_constant(accum_id)
 
             # Run a tail call if necessary
             val_reg, immediate_val, val_type = tail_function(accum_id, val_reg, val_type, val_token, immediate_val)
+            self._forget_constant(accum_id)
 
             if not val_reg:
                 return immediate_val, val_type, val_token
@@ -1480,19 +2226,18 @@ class CodeGenerator:
                 else:
                     immediate_val = immediate_val or next_reg
             else: # MIPS
-                self.output_string += asm_log_or(val_reg, val_reg, next_reg)
+                self.output += asm_log_or(val_reg, val_reg, next_reg)
 
             return val_reg, immediate_val, val_type
 
         def expr_bool_tail(accum_id, val_reg, val_type, val_token, immediate_val):
              # OR immediates and non-immediates together
             if immediate_val is not None and val_reg is not None:
-                self.output_string += asm_log_or(val_reg, val_reg, immediate_val)
+                self.output += asm_log_or(val_reg, val_reg, immediate_val)
 
             return val_reg, immediate_val, val_type
 
-        return self._process_expr_skeleton(tree_nodes, getattr(self, '_process_term_bool'), expr_bool_body,
-                                           expr_bool_tail)
+        return self._process_expr_skeleton(tree_nodes, expr_bool_body, expr_bool_tail)
 
     # <term_bool>     ->  <expr_eq> { <log_and> <expr_eq> }
     # Returns value register (or immediate), value type, and token
@@ -1519,26 +2264,25 @@ class CodeGenerator:
                 if val_reg is None:
                     val_reg = self._init_val_reg(accum_id, next_reg, val_type)
                 else:
-                    self.output_string += asm_log_and(val_reg, val_reg, next_reg)
+                    self.output += asm_log_and(val_reg, val_reg, next_reg)
 
             return val_reg, immediate_val, val_type
 
         def term_bool_tail(accum_id, val_reg, val_type, val_token, immediate_val):
             # AND immediates and non-immediates together
             if immediate_val is not None and val_reg is not None:
-                self.output_string += asm_log_and(val_reg, val_reg, immediate_val)
+                self.output += asm_log_and(val_reg, val_reg, immediate_val)
 
             return val_reg, immediate_val, val_type
 
-        return self._process_expr_skeleton(tree_nodes, getattr(self, '_process_expr_eq'), term_bool_body,
-                                           term_bool_tail)
+        return self._process_expr_skeleton(tree_nodes, term_bool_body, term_bool_tail)
 
     # <expr_eq>       ->  <expr_relation> [ <equal_op> <expr_relation> ]
     # Returns value register (or immediate), value type, and token
     def _process_expr_eq(self, tree_nodes):
         def expr_eq_body(accum_id, val_reg, val_type, val_token, immediate_val, oper, next_reg, next_type, next_token):
             # Save off operator
-            equal_op = oper.token.name
+            equal_op = oper.name
 
             # We set '==' and '!=' to be hard type checkers, so we don't need to worry about type coercion
             # I want to eventually add '=', and '!=' for soft equality checking and '==' and '!==' for hard checking
@@ -1554,38 +2298,37 @@ class CodeGenerator:
                             if equal_op == 'EQUAL' else immediate_val != next_reg
                     else:
                         val_reg = self._init_val_reg(accum_id, immediate_val, val_type)
-                        self.output_string += asm_rel_eq(val_reg, val_reg, next_reg) \
+                        self.output += asm_rel_eq(val_reg, val_reg, next_reg) \
                             if equal_op == 'EQUAL' else asm_rel_neq(val_reg, val_reg, next_reg)
                 else: # val_reg and a register or immediate (overloads in assembly_helper for this)
-                    self.output_string += asm_rel_eq(val_reg, val_reg, next_reg) \
+                    self.output += asm_rel_eq(val_reg, val_reg, next_reg) \
                         if equal_op == 'EQUAL' else asm_rel_neq(val_reg, val_reg, next_reg)
 
             # Ensure val_reg is a normal register
             if val_reg in self.float_reg_pool:
                 new_val_reg = self._find_free_register('normal')
-                self.output_string += asm_reg_set(new_val_reg, val_reg)
+                self.output += asm_reg_set(new_val_reg, val_reg)
 
                 mem_id = next(self.temp_id_generator)
                 self.reg_table[new_val_reg]['id'] = mem_id
                 self.reg_table[new_val_reg]['mem_type'] = 'VALUE'
                 self.var_queue.append({'reg': new_val_reg, 'id': mem_id, 'mem_type': 'TYPE.bool'})
 
-                self.float_var_queue = [x for x in self.float_var_queue if x['reg'] != val_reg]
+                self.float_var_queue.remove_reg(val_reg)
                 self.float_reg_table[val_reg] = self._empty_reg_dict()
 
                 val_reg = new_val_reg
 
             return val_reg, immediate_val, 'bool'
 
-        return self._process_expr_skeleton(tree_nodes, getattr(self, '_process_expr_rel'), expr_eq_body,
-                                           self._empty_tail_call)
+        return self._process_expr_skeleton(tree_nodes, expr_eq_body, self._empty_tail_call)
 
     # <expr_relation> ->  <expr_arith> [ <rel_op> <expr_arith> ]
     # Returns value register (or immediate), value type, and token
     def _process_expr_rel(self, tree_nodes):
         def expr_rel_body(accum_id, val_reg, val_type, val_token, immediate_val, oper, next_reg, next_type, next_token):
             # Save off op
-            rel_op = oper.label
+            rel_op = oper.name
 
             # If type is string or bool, throw incompatible type error
             if val_type not in {'int', 'float'}:
@@ -1628,7 +2371,7 @@ class CodeGenerator:
                 val_float_reg = self._find_free_register('float')
 
                 # Coerce val_type up
-                self.output_string += asm_cast_int_to_float(val_float_reg, val_reg)
+                self.output += asm_cast_int_to_float(val_float_reg, val_reg)
 
                 # set first_reg to be val_float_reg
                 first_reg = val_float_reg
@@ -1636,39 +2379,38 @@ class CodeGenerator:
                 next_float_reg = self._find_free_register('float')
 
                 # Coerce next_type up
-                self.output_string += asm_cast_int_to_float(next_float_reg, next_reg)
+                self.output += asm_cast_int_to_float(next_float_reg, next_reg)
 
                 # set second_reg to be next_float_reg
                 second_reg = next_float_reg
 
             if rel_op == 'GREATER':
-                self.output_string += asm_rel_gt(val_reg, first_reg, second_reg)
+                self.output += asm_rel_gt(val_reg, first_reg, second_reg)
             elif rel_op == 'LESS':
-                self.output_string += asm_rel_lt(val_reg, first_reg, second_reg)
+                self.output += asm_rel_lt(val_reg, first_reg, second_reg)
             elif rel_op == 'GREATER_EQUAL':
-                self.output_string += asm_rel_ge(val_reg, first_reg, second_reg)
+                self.output += asm_rel_ge(val_reg, first_reg, second_reg)
             elif rel_op == 'LESS_EQUAL':
-                self.output_string += asm_rel_le(val_reg, first_reg, second_reg)
+                self.output += asm_rel_le(val_reg, first_reg, second_reg)
 
             # Ensure val_reg is a normal register
             if val_reg in self.float_reg_pool:
                 new_val_reg = self._find_free_register('normal')
-                self.output_string += asm_reg_set(new_val_reg, val_reg)
+                self.output += asm_reg_set(new_val_reg, val_reg)
 
                 mem_id = next(self.temp_id_generator)
                 self.reg_table[new_val_reg]['id'] = mem_id
                 self.reg_table[new_val_reg]['mem_type'] = 'VALUE'
                 self.var_queue.append({'reg': new_val_reg, 'id': mem_id, 'mem_type': 'TYPE.bool'})
 
-                self.float_var_queue = [x for x in self.float_var_queue if x['reg'] != val_reg]
+                self.float_var_queue.remove_reg(val_reg)
                 self.float_reg_table[val_reg] = self._empty_reg_dict()
 
                 val_reg = new_val_reg
 
             return val_reg, immediate_val, 'bool'
 
-        return self._process_expr_skeleton(tree_nodes, getattr(self, '_process_expr_arith'), expr_rel_body,
-                                           self._empty_tail_call)
+        return self._process_expr_skeleton(tree_nodes, expr_rel_body, self._empty_tail_call)
 
     # <expr_arith>    ->  <term_arith> { <unary_add_op> <term_arith> }
     # Returns value register (or immediate), value type, and token
@@ -1676,7 +2418,7 @@ class CodeGenerator:
         def expr_arith_body(accum_id, val_reg, val_type, val_token, immediate_val, oper, next_reg, next_type,
                             next_token):
             # Load the operation
-            oper = oper.label
+            oper = oper.name
 
             # Type check
             if val_type not in {'int', 'float'}:
@@ -1705,7 +2447,7 @@ class CodeGenerator:
                 elif oper == 'MINUS':
                     val_reg = self._init_val_reg(accum_id, next_reg, val_type)
                     # Multiply val_reg by -1
-                    self.output_string += asm_multiply(val_reg, val_reg, -1)
+                    self.output += asm_multiply(val_reg, val_reg, -1)
             else: # add/sub (coerce types if necessary)
                 # Coerce int to float
                 if val_type == 'int' and next_type == 'float':
@@ -1713,24 +2455,21 @@ class CodeGenerator:
                     val_float_reg = self._find_free_register('float')
 
                     # Update sym_table (if available)
-                    try:
-                        mem_type, mem_name, init_val, curr_val, addr_reg, next_val_reg, used \
-                            = self.sym_table.get_entry_suppress(accum_id)
-                        mem_type = 'float'
-                        next_val_reg = val_float_reg
-                        self.sym_table.set_entry(accum_id, mem_type, mem_name, init_val, curr_val, addr_reg,
-                                                 next_val_reg, used)
-                    except KeyError:
-                        pass
+                    entry = self.sym_table.find(accum_id)
+                    if entry is not None:
+                        entry.type = 'float'
+                        # The converted value is only in the float register
+                        entry.val_reg = val_float_reg
+                        entry.dirty = True
 
                     # Remove from normal var_queue
-                    self.var_queue = [i for i in self.var_queue if i['id'] != accum_id]
+                    self.var_queue.remove_id(accum_id)
 
                     # Add to float var_queue
                     self.float_var_queue.append({'reg': val_float_reg, 'id': accum_id, 'mem_type': 'TYPE.float'})
 
                     # Coerce val_type up
-                    self.output_string += asm_cast_int_to_float(val_float_reg, val_reg)
+                    self.output += asm_cast_int_to_float(val_float_reg, val_reg)
 
                     # set first_reg to be val_float_reg
                     val_reg = val_float_reg
@@ -1739,26 +2478,25 @@ class CodeGenerator:
                     # We don't care to save this, so we'll just let it die once we're done with it
                     next_float_reg = self._find_free_register('float')
                     # Coerce next_type up
-                    self.output_string += asm_cast_int_to_float(next_float_reg, next_reg)
+                    self.output += asm_cast_int_to_float(next_float_reg, next_reg)
                     # set second_reg to be next_float_reg
                     next_reg = next_float_reg
 
                 if oper == 'PLUS':
-                    self.output_string += asm_add(val_reg, val_reg, next_reg)
+                    self.output += asm_add(val_reg, val_reg, next_reg)
                 elif oper == 'MINUS':
-                    self.output_string += asm_sub(val_reg, val_reg, next_reg)
+                    self.output += asm_sub(val_reg, val_reg, next_reg)
 
             return val_reg, immediate_val, val_type
 
         def expr_arith_tail(accum_id, val_reg, val_type, val_token, immediate_val):
             # Add up the immediate and val_reg if necessary
             if immediate_val is not None and immediate_val != 0 and val_reg is not None:
-                self.output_string += asm_add(val_reg, val_reg, immediate_val)
+                self.output += asm_add(val_reg, val_reg, immediate_val)
 
             return val_reg, immediate_val, val_type
 
-        return self._process_expr_skeleton(tree_nodes, getattr(self, '_process_term_arith'), expr_arith_body,
-                                           expr_arith_tail)
+        return self._process_expr_skeleton(tree_nodes, expr_arith_body, expr_arith_tail)
 
     # <term_arith>    ->  <fact_arith> { <mul_op> <fact_arith> }
     # Returns value register (or immediate), value type, and token
@@ -1770,7 +2508,7 @@ class CodeGenerator:
                 val_reg = self._init_val_reg(accum_id, immediate_val, val_type)
 
             # Load the operation
-            oper = oper.label
+            oper = oper.name
 
             # Type checks
             if (val_type not in {'int', 'float'}) or (oper == 'MODULO' and val_type != 'int'):
@@ -1787,24 +2525,21 @@ class CodeGenerator:
                 val_float_reg = self._find_free_register('float')
 
                 # Update sym_table (if available)
-                try:
-                    mem_type, mem_name, init_val, curr_val, addr_reg, next_val_reg, used \
-                        = self.sym_table.get_entry_suppress(accum_id)
-                    mem_type = 'float'
-                    next_val_reg = val_float_reg
-                    self.sym_table.set_entry(accum_id, mem_type, mem_name, init_val, curr_val, addr_reg,
-                                             next_val_reg, used)
-                except KeyError:
-                    pass
+                entry = self.sym_table.find(accum_id)
+                if entry is not None:
+                    entry.type = 'float'
+                    # The converted value is only in the float register
+                    entry.val_reg = val_float_reg
+                    entry.dirty = True
 
                 # Remove from normal var_queue
-                self.var_queue = [i for i in self.var_queue if i['id'] != accum_id]
+                self.var_queue.remove_id(accum_id)
 
                 # Add to float var_queue
                 self.float_var_queue.append({'reg': val_float_reg, 'id': accum_id, 'mem_type': 'TYPE.float'})
 
                 # Coerce val_type up
-                self.output_string += asm_cast_int_to_float(val_float_reg, val_reg)
+                self.output += asm_cast_int_to_float(val_float_reg, val_reg)
 
                 # set first_reg to be val_float_reg
                 val_reg = val_float_reg
@@ -1813,139 +2548,125 @@ class CodeGenerator:
                 # We don't care to save this, so we'll just let it die once we're done with it
                 next_float_reg = self._find_free_register('float')
                 # Coerce next_type up
-                self.output_string += asm_cast_int_to_float(next_float_reg, next_reg)
+                self.output += asm_cast_int_to_float(next_float_reg, next_reg)
                 # set second_reg to be next_float_reg
                 next_reg = next_float_reg
 
             # Just move all operations into accumulator (optimize later)
             # Immediates and register values are handled in asm methods
             if oper == 'MULTIPLY':
-                self.output_string += asm_multiply(val_reg, val_reg, next_reg)
+                self.output += asm_multiply(val_reg, val_reg, next_reg)
             elif oper == 'DIVIDE':
-                self.output_string += asm_divide(val_reg, val_reg, next_reg)
+                self.output += asm_divide(val_reg, val_reg, next_reg)
             elif oper == 'MODULO':
-                self.output_string += asm_modulo(val_reg, val_reg, next_reg)
+                self.output += asm_modulo(val_reg, val_reg, next_reg)
 
             return val_reg, immediate_val, val_type
 
-        return self._process_expr_skeleton(tree_nodes, getattr(self, '_process_fact_arith'), term_arith_body,
-                                           self._empty_tail_call)
+        return self._process_expr_skeleton(tree_nodes, term_arith_body, self._empty_tail_call)
 
-    # <fact_arith>    ->  <unary_op> <term_unary> | <unary_add_op> <term_unary> | <term_unary>
+    # <fact_arith>    ->  <unary_op> <term_unary> | <unary_add_op> <term_unary>
+    # Takes a UnaryOp node
     # Returns value register (or immediate), value type, and token
-    def _process_fact_arith(self, fact_children):
-        # len(fact_node.children) = 1 or 2
-        if len(fact_children) == 2:
-            unary_op = fact_children[0].label
+    def _process_fact_arith(self, unary):
+        unary_op = unary.op.name
 
-            accum_id = next(self.temp_id_generator)
-            immediate_val = None
-            val_reg = None
+        accum_id = next(self.temp_id_generator)
+        immediate_val = None
+        val_reg = None
 
-            temp_reg, val_type, val_token = self._process_term_unary(fact_children[1])
-            if type(temp_reg) in {int, float, bool, str} and not self.forced_dynamic:
-                immediate_val = temp_reg
-            else: # Register
-                val_reg = self._init_val_reg(accum_id, temp_reg, val_type)
+        temp_reg, val_type, val_token = self._process_expression(unary.operand)
+        if type(temp_reg) in {int, float, bool, str} and not self.forced_dynamic:
+            immediate_val = temp_reg
+        else: # Register
+            val_reg = self._init_val_reg(accum_id, temp_reg, val_type)
 
-            if unary_op == 'PLUS':
-                # Throw error if not numeric type; do nothing otherwise
-                if val_type not in {'int', 'float'}:
-                    SemanticError.raise_incompatible_type(val_token.pattern, val_type, 'Unary Numberical Operations',
-                                                          val_token.line_num, val_token.col)
-            elif unary_op == 'MINUS':
-                # Throw type error
-                if val_type not in {'int', 'float'}:
-                    SemanticError.raise_incompatible_type(val_token.pattern, val_type, 'Unary Numerical Operations',
-                                                          val_token.line_num, val_token.col)
-
-                if not val_reg: # immediate_val holds value
-                    immediate_val *= -1
-                else: # could not be statically analyzed
-                    self.output_string += asm_multiply(val_reg, val_reg, -1)
-            elif unary_op == 'LOG_NEGATION':
-                # Throw type error
-                if val_type != 'bool':
-                    SemanticError.raise_incompatible_type(val_token.pattern, val_type, 'Unary Boolean Opertions',
-                                                          val_token.line_num, val_token.col)
-
-                if not val_reg:
-                    immediate_val = not immediate_val
-                else:
-                    self.output_string += asm_log_negate(val_reg, val_reg)
+        if unary_op == 'PLUS':
+            # Throw error if not numeric type; do nothing otherwise
+            if val_type not in {'int', 'float'}:
+                SemanticError.raise_incompatible_type(val_token.pattern, val_type, 'Unary Numberical Operations',
+                                                      val_token.line_num, val_token.col)
+        elif unary_op == 'MINUS':
+            # Throw type error
+            if val_type not in {'int', 'float'}:
+                SemanticError.raise_incompatible_type(val_token.pattern, val_type, 'Unary Numerical Operations',
+                                                      val_token.line_num, val_token.col)
+
+            if not val_reg: # immediate_val holds value
+                immediate_val *= -1
+            else: # could not be statically analyzed
+                self.output += asm_multiply(val_reg, val_reg, -1)
+                self._forget_constant(accum_id)
+        elif unary_op == 'LOG_NEGATION':
+            # Throw type error
+            if val_type != 'bool':
+                SemanticError.raise_incompatible_type(val_token.pattern, val_type, 'Unary Boolean Opertions',
+                                                      val_token.line_num, val_token.col)
 
             if not val_reg:
-                return immediate_val, val_type, val_token
+                immediate_val = not immediate_val
             else:
-                return val_reg, val_type, val_token
-        else: # len(cildren) = 1
-            return self._process_term_unary(fact_children[0])
+                self.output += asm_log_negate(val_reg, val_reg)
+                self._forget_constant(accum_id)
 
-    # <term_unary>    ->  <literals> | <ident> | (expr_bool)
+        if not val_reg:
+            return immediate_val, val_type, val_token
+        else:
+            return val_reg, val_type, val_token
+
+    # <term_unary>    ->  <literals> | <ident> | <ident> <func>
+    # Takes a Literal, Var or Call node (parentheses are gone in the AST)
     # Returns value register (or immediate), value type, and token
-    def _process_term_unary(self, term_unary):
-        child = term_unary.children[0]
-        token = child.token
-        if token:
-            if token.t_class == 'LITERAL': # If token is a literal
-                literal = token.pattern
-                # Check int, float, bool, string literals
-                if token.name == 'STRINGLIT':
-                    # See if literal already in array_sym_table
-                    str_mem_type, str_mem_name, str_addr_reg, str_used = self.sym_table.get_array_entry_suppress(literal)
-                    if str_mem_name is None:
-                        # Create new global entry for string
-                        str_mem_type = '.asciiz'
-                        self.sym_table.create_array_entry(literal, str_mem_type, None, False)
-
-                    # Create a temp pointer to the string
-                    if self.forced_dynamic:
-                        str_mem_type, str_mem_name, str_addr_reg, str_used \
-                            = self.sym_table.get_array_entry(literal, token)
-                        str_used = True
-
-                        var_id = next(self.temp_id_generator)
-                        self.sym_table.create_entry(var_id, token, 'string', 'DYNAMIC', None, None,
-                                                    None, True)
-
-                        mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used \
-                            = self.sym_table.get_entry(var_id, token)
-
-                        # Load address
-                        addr_reg = self._find_free_register()
-                        self._update_tables('normal', var_id, addr_reg, None)
-                        self.var_queue.append({'reg': addr_reg, 'id': var_id, 'mem_type': 'ADDRESS'})
-                        self.output_string += asm_load_mem_addr(mem_name, addr_reg)
-
-                        # Load Value
-                        val_reg = self._find_free_register()
-                        self._update_tables('normal', var_id, addr_reg, val_reg, None)
-                        self.var_queue.append({'reg': val_reg, 'id': var_id, 'mem_type': 'VALUE'})
-                        self.output_string += asm_load_mem_addr(str_mem_name, val_reg)
-
-                        self.sym_table.set_entry(var_id, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg,
-                                                 used)
-                        self.sym_table.set_array_entry(literal, str_mem_type, str_mem_name, str_addr_reg, str_used)
-
-                        return val_reg, 'string', token
-
-                    return literal, 'string', token
-                elif token.name == 'BOOLLIT':
-                    return literal == 'True', 'bool', token
-                elif token.name == 'INTLIT':
-                    return int(literal), 'int', token
-                elif token.name == 'FLOATLIT':
-                    return float(literal), 'float', token
-        elif child.label == 'VAR_IDENT': # If child is <ident><var_or_func>
-            children = child.children
-            if len(children[1].children) == 0:
-                return self._process_id(children[0].token)
-            else:
-                ident_node = children[0]
-                parameter_nodes = children[1].children[0].children[0].children
-                return self._process_func_call(ident_node, parameter_nodes)
-        else: # if token is <expr_bool>
-            return self._process_expr_bool(child.children)
+    def _process_term_unary(self, operand):
+        node_type = type(operand)
+        if node_type is Literal:
+            token = operand.token
+            literal = token.pattern
+            # Check int, float, bool, string literals
+            if token.name == 'STRINGLIT':
+                # See if literal already in array_sym_table
+                str_mem_type, str_mem_name, str_addr_reg, str_used = self.sym_table.get_array_entry_suppress(literal)
+                if str_mem_name is None:
+                    # Create new global entry for string
+                    str_mem_type = '.asciiz'
+                    self.sym_table.create_array_entry(literal, str_mem_type, None, False)
+
+                # Create a temp pointer to the string
+                if self.forced_dynamic:
+                    str_mem_type, str_mem_name, str_addr_reg, str_used \
+                        = self.sym_table.get_array_entry(literal, token)
+                    str_used = True
+
+                    var_id = next(self.temp_id_generator)
+                    entry = self.sym_table.create_entry(var_id, token, 'string', 'DYNAMIC', None, None, None, True)
+
+                    # Load address
+                    addr_reg = self._find_free_register()
+                    self._update_tables('normal', var_id, addr_reg, None)
+                    self.var_queue.append({'reg': addr_reg, 'id': var_id, 'mem_type': 'ADDRESS'})
+                    self.output += asm_load_mem_addr(entry.mem_name, addr_reg)
+
+                    # Load Value
+                    val_reg = self._find_free_register()
+                    self._update_tables('normal', var_id, addr_reg, val_reg, None)
+                    self.var_queue.append({'reg': val_reg, 'id': var_id, 'mem_type': 'VALUE'})
+                    self.output += asm_load_mem_addr(str_mem_name, val_reg)
+
+                    self.sym_table.set_array_entry(literal, str_mem_type, str_mem_name, str_addr_reg, str_used)
+
+                    return val_reg, 'string', token
+
+                return literal, 'string', token
+            elif token.name == 'BOOLLIT':
+                return literal == 'True', 'bool', token
+            elif token.name == 'INTLIT':
+                return int(literal), 'int', token
+            elif token.name == 'FLOATLIT':
+                return float(literal), 'float', token
+        elif node_type is Var:
+            return self._process_id(operand.token)
+        else: # Call
+            return self._process_func_call(operand)
 
     # Takes a full ID token
     # Handles loading a variable's address and value into registers
@@ -1955,7 +2676,8 @@ class CodeGenerator:
     def _process_id(self, token):
         ident = token.pattern
 
-        mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used = self.sym_table.get_entry(ident, token)
+        entry = self.sym_table.lookup(ident, token)
+        mem_type, curr_val, addr_reg, val_reg = entry.type, entry.curr_val, entry.addr_reg, entry.val_reg
 
         cleaned_type = 'float' if mem_type == 'float' else 'normal'
         val_var_queue = self.float_var_queue if cleaned_type == 'float' else self.var_queue
@@ -1965,7 +2687,7 @@ class CodeGenerator:
             real_type = mem_type.split(' ')[0]
 
         # If not initialized, throw an error
-        if init_val is None:
+        if entry.init_val is None:
             SemanticError.raise_initialization_error(ident, token.line_num, token.col)
 
         # Check if curr_val is not None (thus, if we can just return it)
@@ -1976,11 +2698,17 @@ class CodeGenerator:
             # If not, load the value into a register if the addr is already loaded
             if addr_reg:
                 val_reg = self._find_free_register(cleaned_type)
+                load_addr_reg = addr_reg
+                # Freeing a register can take the one with the address (which still has it for the load, but not
+                # after)
+                addr_reg = entry.addr_reg
 
                 self._update_tables(cleaned_type, ident, addr_reg, val_reg)
                 val_var_queue.append({'reg': val_reg, 'id': ident, 'mem_type': 'VALUE'})
 
-                self.output_string += asm_load_mem_var_from_addr(addr_reg, val_reg)
+                self.output += asm_load_mem_var_from_addr(load_addr_reg, val_reg)
+                entry.dirty = False
+                self._count_reload(ident)
             # Worst case, you have to load both the addr and the value into registers
             else:
                 addr_reg = self._find_free_register()
@@ -1991,13 +2719,13 @@ class CodeGenerator:
                 self._update_tables(cleaned_type, ident, addr_reg, val_reg)
                 val_var_queue.append({'reg': val_reg, 'id': ident, 'mem_type': 'VALUE'})
 
-                self.output_string += asm_load_mem_var(mem_name, addr_reg, val_reg)
+                self.output += asm_load_mem_var(entry.mem_name, addr_reg, val_reg)
+                entry.dirty = False
+                self._count_reload(ident)
         # else: If val_reg was good to go, just return it
 
         # Set id to be printed out in MIPS if it couldn't be statically analyzed
-        used = True
-
-        self.sym_table.set_entry(ident, mem_type, mem_name, init_val, curr_val, addr_reg, val_reg, used)
+        entry.used = True
 
         if ref_flag:
             actual_val_reg = self._find_free_register()
@@ -2006,7 +2734,7 @@ class CodeGenerator:
                 actual_val_reg = self._find_free_register()
                 self._update_reg_table('normal', ident, actual_val_reg, 'FUNC')
 
-            self.output_string += asm_load_mem_var_from_addr(val_reg, actual_val_reg)
+            self.output += asm_load_mem_var_from_addr(val_reg, actual_val_reg)
             val_reg = actual_val_reg
 
         return val_reg, real_type, token
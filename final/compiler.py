@@ -2,15 +2,51 @@ import sys
 import argparse
 from MLparser import *
 from code_generator import *
+from ast_cache import *
+from peephole import *
 
 
-def compiler(source, tokens, output, is_debug, is_safe):
+def compiler(source, tokens, output, is_debug, is_safe, lex_mode = 'regex', lex_jobs = 1,
+             expr_mode = 'descent', profile = False, call_mode = 'recursive', cache_dir = None, grammar_file = None,
+             lazy_funcs = False, stream = False, peephole = None, alloc_mode = 'fifo'):
     if is_debug:
         # For testing
         print('Compiling "{:s}" into "{:s}" using "{:s}" for tokens\n'.format(source, output, tokens))
     # Only prints the huge stack trace in debugging mode
     sys.tracebacklimit = 0 if is_debug else 1
-    CodeGenerator(Parser(is_debug).parse(source, tokens), output, is_debug, is_safe).compile()
+    if stream:
+        # Each statement of the program is parsed and compiled before the next one is lexed (no AST cache)
+        parser = Parser(is_debug, lex_mode, expr_mode = expr_mode, profile = profile, call_mode = call_mode)
+        code_generator = CodeGenerator(None, output, is_debug, is_safe, call_mode = call_mode, peephole = peephole)
+        code_generator.compile_stream(parser.parse_statements(source, tokens))
+        if is_debug or profile:
+            print(parser.profile_report())
+            if peephole:
+                print(peephole.report())
+        return
+    # A source that was parsed before is loaded from the AST cache without lexing or parsing it (unless profiling)
+    cache = ASTCache(source, tokens, cache_dir, grammar_file) if cache_dir else None
+    syntax_tree = cache.load() if cache and not profile else None
+    if syntax_tree is not None:
+        if is_debug:
+            print('Using the cached AST in "{:s}"\n'.format(cache.cache_file))
+    else:
+        if grammar_file:
+            parser = TableParser(is_debug, grammar_file, lex_mode, lex_jobs)
+        else:
+            parser = Parser(is_debug, lex_mode, lex_jobs, expr_mode, profile = profile, call_mode = call_mode,
+                            lazy_funcs = lazy_funcs)
+        # The parser tree is only needed to build the AST the code generator works on
+        syntax_tree = to_ast(parser.parse(source, tokens), call_mode)
+        if (is_debug or profile) and not grammar_file:
+            print(parser.profile_report())
+        # Function bodies that were skipped can't be cached
+        if cache and not lazy_funcs:
+            cache.save(syntax_tree)
+    CodeGenerator(syntax_tree, output, is_debug, is_safe, call_mode = call_mode, peephole = peephole,
+                  alloc_mode = alloc_mode).compile()
+    if (is_debug or profile) and peephole:
+        print(peephole.report())
 
 
 if __name__ == "__main__":  # Only true if program invoked from the command line
@@ -21,6 +57,29 @@ if __name__ == "__main__":  # Only true if program invoked from the command line
                        help = "Token file", default = 'tokens.txt')
     parser.add_argument('-s', dest = 'safe_mode', action = 'store_true')
     parser.add_argument('-d', dest = 'debug_mode', action = 'store_true')
+    parser.add_argument('-l', type = str, dest = 'lex_mode', choices = ['regex', 'table'],
+                        help = "Lexer mode", default = 'regex')
+    parser.add_argument('-j', type = int, dest = 'lex_jobs', help = "Lexer processes", default = 1)
+    parser.add_argument('-e', type = str, dest = 'expr_mode', choices = ['descent', 'precedence'],
+                        help = "Expression parser", default = 'descent')
+    parser.add_argument('-r', type = str, dest = 'call_mode', choices = ['recursive', 'stack'],
+                        help = "Recursion mode", default = 'recursive')
+    parser.add_argument('-p', dest = 'profile', action = 'store_true', help = "Print the parser profile")
+    parser.add_argument('-c', type = str, dest = 'cache_dir',
+                        help = "AST cache directory (default: ast_cache next to the token file)", default = None)
+    parser.add_argument('-n', dest = 'no_cache', action = 'store_true', help = "Don't use the AST cache")
+    parser.add_argument('-g', type = str, dest = 'grammar_file',
+                        help = "Parse with the LL(1) table generated from this grammar file", default = None)
+    parser.add_argument('-f', dest = 'lazy_funcs', action = 'store_true',
+                        help = "Parse function bodies only when they're compiled (and skip functions never called)")
+    parser.add_argument('-m', dest = 'stream', action = 'store_true',
+                        help = "Stream the program through the parser and code generator a statement at a time")
+    parser.add_argument('-O', dest = 'peephole', action = 'store_true', help = "Run the peephole optimizer")
+    parser.add_argument('-P', type = str, dest = 'peephole_patterns', default = None,
+                        help = "Run only these comma-separated peephole patterns (implies -O): {:s}"
+                        .format(', '.join(PATTERNS)))
+    parser.add_argument('-a', type = str, dest = 'alloc_mode', choices = ['fifo', 'linear'],
+                        help = "Register allocator", default = 'fifo')
     parser.set_defaults(safe_mode=False, debug_mode=False)
     parser.add_argument('source_file', type = str,
                         help = "Source-code file", default = 'tokens.txt')
@@ -28,6 +87,17 @@ if __name__ == "__main__":  # Only true if program invoked from the command line
                         help = 'output file name')
 
     args = parser.parse_args()
+    if args.stream and (args.grammar_file or args.lazy_funcs or args.alloc_mode == 'linear'):
+        parser.error("-m can't be used with -g, -f or -a linear")
+    cache_dir = None if args.no_cache else args.cache_dir or default_cache_dir(args.token_file)
+    peephole = None
+    if args.peephole or args.peephole_patterns:
+        try:
+            peephole = Peephole(args.peephole_patterns.split(',') if args.peephole_patterns else None)
+        except ValueError as e:
+            parser.error(str(e))
 
     # Call the compiler function
-    compiler(args.source_file, args.token_file, args.output_file, args.debug_mode, args.safe_mode)
+    compiler(args.source_file, args.token_file, args.output_file, args.debug_mode, args.safe_mode, args.lex_mode,
+             args.lex_jobs, args.expr_mode, args.profile, args.call_mode, cache_dir, args.grammar_file, args.lazy_funcs,
+             args.stream, peephole, args.alloc_mode)
@@ -24,6 +24,11 @@ class ParserError(Exception):
         raise ParserError('Syntax error in <%s>, expected "%s", actually is "%s" \nLine num: %d, column num: %d'
                       %(symbolName, expectedTokenStr, actualToken.pattern, actualToken.line_num, actualToken.col))
 
+    @staticmethod
+    def raise_func_error(funcToken, problem):
+        raise ParserError('Syntax error in <FUNC>, function "%s" %s \nLine num: %d, column num: %d'
+                          %(funcToken.pattern, problem, funcToken.line_num, funcToken.col))
+
     def __init__(self, msg):
         self.msg = msg
 
@@ -1,6 +1,25 @@
+import os
 import re
+import marshal
+import hashlib
+from array import array
+from collections import Counter
+from bisect import bisect_left
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor
 from errors import *
 
+# Bump this whenever the layout of what the Lexer stores in a TokenCache changes
+TOKEN_CACHE_VERSION = 1
+
+# Parallel lexing never splits a source into chunks smaller than this (in characters)
+PARALLEL_MIN_CHUNK = 1 << 18
+# Chunks per process, so a slow chunk doesn't leave the other processes waiting
+PARALLEL_CHUNKS_PER_JOB = 4
+
+# Lexer.lex_stream reads the source this many characters at a time (plus the rest of the last line)
+STREAM_CHUNK = 1 << 16
+
 class Token:
     """
     A class for storing token information.
@@ -47,52 +66,514 @@ class Token:
                self.line_num == other.line_num and self.col == other.col
 
 
+class TokenView:
+    """
+    A token stored in a TokenBuffer.
+    Has the same fields as Token, but only t_class and name are stored on the view,
+    everything else is read out of the buffer's columns when asked for.
+    """
+    __slots__ = ('buffer', 'index', 't_class', 'name')
+
+    def __init__(self, buffer, index):
+        self.buffer = buffer
+        self.index = index
+        self.t_class, self.name = buffer.token_kinds[buffer.kinds[index]]
+
+    @property
+    def pattern(self):
+        return self.buffer.source[self.buffer.starts[self.index]:self.buffer.ends[self.index]]
+
+    @property
+    def line_num(self):
+        return self.buffer.line_nums[self.index]
+
+    @property
+    def line(self):
+        line_index = self.buffer.line_nums[self.index] - 1
+        return self.buffer.source[self.buffer.line_starts[line_index]:self.buffer.line_ends[line_index]]
+
+    @property
+    def col(self):
+        return self.buffer.starts[self.index] - self.buffer.line_starts[self.buffer.line_nums[self.index] - 1]
+
+    def to_token(self):
+        return Token(self.t_class, self.name, self.pattern, self.line, self.line_num, self.col)
+
+    def __str__(self):
+        return str((self.t_class, self.name, self.pattern, self.line_num, self.col))
+
+    def __repr__(self):
+        return "Token: " + str(self)
+
+    def __eq__(self, other):
+        return self.t_class == other.t_class and self.name == other.name and \
+               self.pattern == other.pattern and self.line == other.line and \
+               self.line_num == other.line_num and self.col == other.col
+
+
+class TokenBuffer:
+    """
+    Compact storage for the tokens of one source file.
+    Tokens are kept as array columns over the source string instead of one Token object each:
+    * kinds: Index into token_kinds, the (t_class, name) of every token kind
+    * starts, ends: Offsets of the token's pattern in source
+    * line_nums: The line number (numbered from 1)
+    * line_starts, line_ends: Offsets of every line in source (without trailing whitespace and comments)
+    Indexing or iterating gives TokenViews. Iterating ends with the "$" token like Lexer.lex().
+    """
+
+    def __init__(self, source, token_kinds):
+        self.source = source
+        self.token_kinds = token_kinds
+        self.kinds, self.starts, self.ends, self.line_nums, self.line_starts, self.line_ends = self.new_columns()
+        # LexerError for a bad token, raised once iteration gets to it (so earlier syntax errors are still found first)
+        self.error = None
+        # t_class -> Counter of its patterns, see pattern_counts
+        self._pattern_counts = {}
+
+    @staticmethod
+    def new_columns():
+        return array('H'), array('I'), array('I'), array('I'), array('I'), array('I')
+
+    def columns(self):
+        return self.kinds, self.starts, self.ends, self.line_nums, self.line_starts, self.line_ends
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def pattern_counts(self, t_class):
+        # Counter of the patterns of the tokens of class t_class (counted the first time it's asked for)
+        counts = self._pattern_counts.get(t_class)
+        if counts is None:
+            class_kinds = {kind for kind, (kind_class, _) in enumerate(self.token_kinds) if kind_class == t_class}
+            source = self.source
+            counts = self._pattern_counts[t_class] = Counter(
+                source[start:stop] for kind, start, stop in zip(self.kinds, self.starts, self.ends)
+                if kind in class_kinds)
+        return counts
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.kinds)
+        if not 0 <= index < len(self.kinds):
+            raise IndexError('token index out of range')
+        return TokenView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield TokenView(self, index)
+
+        if self.error is not None:
+            raise self.error
+        yield Token("$", "$", "$", "$", -1, -1)
+
+
+def read_token_table(token_file):
+    # Returns a list of (t_class, name, pattern) in the order they appear in the token file
+    # (The order is the match priority, so it must be kept)
+    re_list = []
+    token_hash = {}
+
+    with open(token_file) as tokens:
+        for line in tokens:
+            split = re.split("\s+", line.rstrip())
+            re_list.append(split[2])
+            token_hash[split[2]] = (split[0], split[1])
+
+    return [(token_hash[ptn][0], token_hash[ptn][1], ptn) for ptn in re_list]
+
+
+def read_source(source_file):
+    with open(source_file) as source:
+        return source.read()
+
+
+def token_file_hash(token_file):
+    with open(token_file, 'rb') as tokens:
+        return hashlib.sha1(tokens.read()).hexdigest()
+
+
+class TokenCache:
+    """
+    On-disk cache of what the Lexer prepares from a token file (token_file + '.cache').
+    Entries are stored with marshal, keyed by the sha1 of the token file's contents.
+    Each entry is marshaled separately, so loading the cache only unpacks the entries that are asked for.
+    If the token file changes (or TOKEN_CACHE_VERSION does), the old entries are dropped and rebuilt.
+    """
+
+    def __init__(self, token_file):
+        self.cache_file = token_file + '.cache'
+        self.token_hash = token_file_hash(token_file)
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file, 'rb') as fp:
+                data = marshal.load(fp)
+            if data['version'] == TOKEN_CACHE_VERSION and data['hash'] == self.token_hash:
+                return data['entries']
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            pass
+        return {}
+
+    def _save(self):
+        # Write to a temp file and rename it, so compilers running at the same time never read half a cache
+        temp_file = '%s.%d.tmp' % (self.cache_file, os.getpid())
+        try:
+            with open(temp_file, 'wb') as fp:
+                marshal.dump({'version': TOKEN_CACHE_VERSION, 'hash': self.token_hash, 'entries': self.entries}, fp)
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            # A read-only token directory just means no caching
+            pass
+
+    def get(self, key, build):
+        # Returns the entry for key, calling build() and saving the result if it isn't cached
+        if key in self.entries:
+            return marshal.loads(self.entries[key])
+        value = build()
+        self.entries[key] = marshal.dumps(value)
+        self._save()
+        return value
+
+
 class Lexer:
     """
     Takes an input file and returns a generator of tokens
+    Modes:
+    * regex: Matches the token patterns with the re module (default)
+    * table: Runs the DFA generated from the token file by lexer_generator.py
+    What the lexer builds from the token file is kept in a TokenCache unless use_cache is False.
     """
 
-    def __init__(self, source, tokens):
+    def __init__(self, source, tokens, mode = 'regex', use_cache = True):
         self.source_file = source
         self.token_file = tokens
+        self.mode = mode
+        self.use_cache = use_cache
 
-    def lex(self):
-        re_list = []
-        token_hash = {}
+    def _prepared(self, key, build):
+        return TokenCache(self.token_file).get(key, build) if self.use_cache else build()
 
-        with open(self.token_file) as tokens:
-            for line in tokens:
-                split = re.split("\s+", line.rstrip())
-                re_list.append(split[2])
-                token_hash[split[2]] = (split[0], split[1])
+    def _build_regex_table(self):
+        # Joins every token pattern into one alternation of named groups (T0, T1, ...)
+        # Alternation is tried left to right, so the first pattern in the file still wins
+        # Every pattern stores its token in its own group 1, so we keep (kind, index of that group) for each name
+        # Returns (token kinds, master pattern, group map)
+        token_table = read_token_table(self.token_file)
+        alternatives = []
+        group_map = {}
+        group_index = 0
+        for i in range(len(token_table)):
+            alternatives.append('(?P<T%d>%s)' % (i, token_table[i][2]))
+            group_map['T%d' % i] = (i, group_index + 2)
+            group_index += re.compile(token_table[i][2]).groups + 1
 
-        with open(self.source_file) as source:
-            line_num = 0
-            for line in source:
-                line_num += 1
-
-                # Remove all comments from the line
-                line = re.sub("#(.|\s)*$", "", line.rstrip())
-
-                # Start col at first non-whitespace
-                col = len(line) - len(line.lstrip())
-
-                while col < len(line):
-                    # This will return the next 'm' such that m is not null (governed by 'if m [!= None]')
-                    # and 'm' is the matchObject (or None) returned by (re.match(...) for ptn in re_list)
-                    while col < len(line):
-                        # This will return the next 'm' such that m is not null (governed by 'if m [!= None]')
-                        # and 'm' is the matchObject (or None) returned by (re.match(...) for ptn in re_list)
-                        try:
-                            match = next(m for m in (re.match(ptn, line[col:]) for ptn in re_list) if m)
-                        except StopIteration:
-                            raise LexerError("Bad token (line %d, column %d): %s" %(line_num, col, line[col:]))
-
-                        yield Token(token_hash[match.re.pattern][0], token_hash[match.re.pattern][1],
-                                    match.group(1), line, line_num, col)
-                        col += match.end(1) + re.match("\s*", line[col + match.end(1):]).end(0)
+        return [(t_class, name) for t_class, name, _ in token_table], '|'.join(alternatives), group_map
+
+    @staticmethod
+    def _lines(buffer, first_line = 1):
+        # Yields (line_num, line_start, end) for every line of the buffer (the first one being line first_line)
+        # end is where the line stops once trailing whitespace and the comment (everything after the first '#')
+        # are removed
+        buffer_len = len(buffer)
+        line_num = first_line - 1
+        line_start = 0
+        while line_start < buffer_len:
+            line_num += 1
+            line_end = buffer.find('\n', line_start)
+            next_start = buffer_len if line_end == -1 else line_end + 1
+            if line_end == -1:
+                line_end = buffer_len
+
+            end = len(buffer[line_start:line_end].rstrip()) + line_start
+            comment = buffer.find('#', line_start, end)
+            if comment != -1:
+                end = comment
+
+            yield line_num, line_start, end
+            line_start = next_start
+
+    @staticmethod
+    def _bad_token_message(buffer, line_num, line_start, pos, end):
+        col = pos - line_start
+        return "Bad token (line %d, column %d): %s" % (line_num, col, buffer[pos:end])
+
+    # Scanners return the (t_class, name) of every token kind and a scan_line function
+    # scan_line(line_num, line_start, end) yields (kind, start, stop) for every token in the line
+
+    def _regex_scanner(self, buffer):
+        token_kinds, master_pattern, group_map = self._prepared('regex', self._build_regex_table)
+        match_token = re.compile(master_pattern).match
+        match_space = re.compile("\s*").match
+
+        def scan_line(line_num, line_start, end):
+            # Start at first non-whitespace
+            pos = match_space(buffer, line_start, end).end(0)
+
+            while pos < end:
+                # endpos keeps patterns like STRINGLIT from running past the line, and lets '$' match at its end
+                match = match_token(buffer, pos, end)
+                if not match:
+                    raise LexerError(self._bad_token_message(buffer, line_num, line_start, pos, end))
+
+                kind, group = group_map[match.lastgroup]
+                stop = match.end(group)
+                yield kind, pos, stop
+                pos = match_space(buffer, stop, end).end(0)
+
+        return token_kinds, scan_line
+
+    def _table_scanner(self, buffer):
+        def build():
+            from lexer_generator import build_table
+            return build_table(read_token_table(self.token_file))
+
+        table = self._prepared('table', build)
+        ascii_classes = table['ASCII_CLASSES']
+        unicode_classes = table['UNICODE_CLASSES']
+        transitions = table['TRANSITIONS']
+        accepts = table['ACCEPTS']
 
+        def char_class(c):
+            o = ord(c)
+            if o < 128:
+                return ascii_classes[o]
+            return unicode_classes[(c.isalnum() or c == '_') * 4 + c.isdecimal() * 2 + c.isspace()]
+
+        def scan_line(line_num, line_start, end):
+            pos = line_start
+            while pos < end and buffer[pos].isspace():
+                pos += 1
+
+            while pos < end:
+                # Run the DFA as far as it goes, remembering the last (longest) accepted token
+                state = 0
+                i = pos
+                token = None
+                token_end = pos
+                while i < end:
+                    state = transitions[state][char_class(buffer[i])]
+                    if state < 0:
+                        break
+                    i += 1
+                    if accepts[state] is not None:
+                        # Accepts are in priority order, take the first one whose lookahead holds
+                        for index, lookahead in accepts[state]:
+                            if lookahead is None or (lookahead[1] if i == end
+                                                     else char_class(buffer[i]) in lookahead[0]):
+                                token = index
+                                token_end = i
+                                break
+
+                if token is None:
+                    raise LexerError(self._bad_token_message(buffer, line_num, line_start, pos, end))
+
+                yield token, pos, token_end
+
+                pos = token_end
+                while pos < end and buffer[pos].isspace():
+                    pos += 1
+
+        return list(table['TOKENS']), scan_line
+
+    def _scanner(self, buffer):
+        return self._table_scanner(buffer) if self.mode == 'table' else self._regex_scanner(buffer)
+
+    def _read_source(self):
+        return read_source(self.source_file)
+
+    def lex(self):
+        yield from self._tokens(self._read_source())
         yield Token("$", "$", "$", "$", -1, -1)
 
+    def lex_stream(self, chunk_size = STREAM_CHUNK):
+        """
+        Like lex(), but reads the source file chunk_size characters (of whole lines) at a time, so only the current
+        chunk and the Tokens that are still used are in memory.
+        """
+        with open(self.source_file) as source:
+            first_line = 1
+            rest = ''
+            while True:
+                data = source.read(chunk_size)
+                text = rest + data
+                # A chunk stops at the last newline (or the end of the file), so every line is in one chunk
+                cut = text.rfind('\n') + 1 if data else len(text)
+                if cut:
+                    yield from self._tokens(text[:cut], first_line)
+                    first_line += text.count('\n', 0, cut)
+                rest = text[cut:]
+                if not data:
+                    break
+        yield Token("$", "$", "$", "$", -1, -1)
+
+    def _tokens(self, buffer, first_line = 1):
+        # Yields a Token for every token in buffer, whose first line is line first_line
+        token_kinds, scan_line = self._scanner(buffer)
+
+        for line_num, line_start, end in self._lines(buffer, first_line):
+            line = None
+            for kind, start, stop in scan_line(line_num, line_start, end):
+                if line is None:
+                    line = buffer[line_start:end]
+                t_class, name = token_kinds[kind]
+                yield Token(t_class, name, buffer[start:stop], line, line_num, start - line_start)
+
+    def _lex_columns(self, scan_line, buffer, columns, offset = 0, first_line = 1):
+        # Appends the tokens and lines of buffer to the TokenBuffer columns, with every position moved by offset
+        # Returns the LexerError for the first bad token (None if there isn't one)
+        kinds, starts, ends, line_nums, line_starts, line_ends = columns
+        add_kind = kinds.append
+        add_start = starts.append
+        add_end = ends.append
+        add_line_num = line_nums.append
+        try:
+            for line_num, line_start, end in self._lines(buffer, first_line):
+                line_starts.append(line_start + offset)
+                line_ends.append(end + offset)
+                for kind, start, stop in scan_line(line_num, line_start, end):
+                    add_kind(kind)
+                    add_start(start + offset)
+                    add_end(stop + offset)
+                    add_line_num(line_num)
+        except LexerError as e:
+            return e
+        return None
+
+    @staticmethod
+    def _chunks(buffer, count):
+        # Splits buffer into about count runs of whole lines, yielding (text, offset, first line number)
+        size = max(PARALLEL_MIN_CHUNK, len(buffer) // count + 1)
+        start = 0
+        first_line = 1
+        while start < len(buffer):
+            stop = buffer.find('\n', min(start + size, len(buffer)) - 1)
+            stop = len(buffer) if stop == -1 else stop + 1
+            yield buffer[start:stop], start, first_line
+            first_line += buffer.count('\n', start, stop)
+            start = stop
+
+    def tokenize(self, jobs = 1):
+        """
+        Lexes the whole source file into a TokenBuffer.
+        A bad token does not raise here, it is raised when iterating over the buffer gets to it.
+        With jobs > 1, a large source is split into chunks of lines that are lexed by a pool of jobs processes
+        (strings and comments can't cross a newline, so every line can be lexed on its own).
+        """
+        buffer = self._read_source()
+        token_kinds, scan_line = self._scanner(buffer)
+        tokens = TokenBuffer(buffer, token_kinds)
+
+        if jobs <= 1 or len(buffer) < 2 * PARALLEL_MIN_CHUNK:
+            tokens.error = self._lex_columns(scan_line, buffer, tokens.columns())
+            return tokens
+
+        chunks = [(self.token_file, self.mode, self.use_cache, text, offset, first_line)
+                  for text, offset, first_line in self._chunks(buffer, jobs * PARALLEL_CHUNKS_PER_JOB)]
+        with ProcessPoolExecutor(max_workers = jobs) as pool:
+            # map returns the chunks in order, so the first error found is the first bad token in the file
+            for columns, error in pool.map(_lex_chunk, chunks):
+                for column, chunk_column in zip(tokens.columns(), columns):
+                    column.extend(chunk_column)
+                if error is not None:
+                    tokens.error = error
+                    break
+
+        return tokens
+
+
+def _lex_chunk(chunk):
+    # Runs in a worker process for Lexer.tokenize
+    token_file, mode, use_cache, text, offset, first_line = chunk
+    lexer = Lexer(None, token_file, mode, use_cache)
+    _, scan_line = lexer._scanner(text)
+    columns = TokenBuffer.new_columns()
+    error = lexer._lex_columns(scan_line, text, columns, offset, first_line)
+    return columns, error
+
+
+class TokenStream:
+    """
+    The tokens of a source that is being edited (see MLparser.IncrementalParser).
+    Keeps the TokenBuffer of the source and views, a TokenView for every token in it (in order).
+    edit() lexes only the lines that were replaced and updates the buffer and the views in place: the views after the
+    edit are moved to their new index instead of being made again, so the trees holding them stay right.
+    Unlike iterating over a TokenBuffer, a bad token raises its LexerError right away.
+    """
+
+    def __init__(self, source_file, token_file, lex_mode = 'regex', lex_jobs = 1):
+        self.lexer = Lexer(source_file, token_file, lex_mode)
+        self.buffer = self.lexer.tokenize(lex_jobs)
+        if self.buffer.error is not None:
+            raise self.buffer.error
+        self.views = [TokenView(self.buffer, index) for index in range(len(self.buffer))]
+
+    def __len__(self):
+        return len(self.views)
+
+    def tokens(self, start = 0, stop = None):
+        # Iterates over the views from start to stop, ending with the "$" token like iterating over a TokenBuffer
+        return chain(self.views[start:stop], (Token("$", "$", "$", "$", -1, -1),))
+
+    def token_range(self, first_line, last_line):
+        # Returns (start, stop): the tokens on lines first_line to last_line are views[start:stop]
+        line_nums = self.buffer.line_nums
+        return bisect_left(line_nums, first_line), bisect_left(line_nums, last_line + 1)
+
+    def edit(self, first_line, last_line, text):
+        """
+        Replaces lines first_line to last_line (numbered from 1, with their newlines) by text, which is whole lines
+        (a missing newline at its end is added). last_line = first_line - 1 inserts text before line first_line.
+        Returns (start, stop, count): the tokens that were views[start:stop] are replaced by count new ones.
+        Raises the LexerError for a bad token in text, without changing anything.
+        """
+        buffer = self.buffer
+        source = buffer.source
+        line_count = len(buffer.line_starts)
+        if not 1 <= first_line <= last_line + 1 <= line_count + 1:
+            raise ValueError('Lines %d to %d are not in a source of %d lines' % (first_line, last_line, line_count))
+        if text and not text.endswith('\n'):
+            text += '\n'
+        if first_line > line_count and source and not source.endswith('\n'):
+            # Text after a last line without a newline would end up on that line, so it is replaced too
+            first_line -= 1
+            text = source[buffer.line_starts[first_line - 1]:] + '\n' + text
+        start_offset = buffer.line_starts[first_line - 1] if first_line <= line_count else len(source)
+        stop_offset = buffer.line_starts[last_line] if last_line < line_count else len(source)
+
+        # Strings and comments can't cross a newline, so the new lines are lexed on their own like a parallel chunk
+        _, scan_line = self.lexer._scanner(text)
+        columns = TokenBuffer.new_columns()
+        error = self.lexer._lex_columns(scan_line, text, columns, start_offset, first_line)
+        if error is not None:
+            raise error
+
+        start, stop = self.token_range(first_line, last_line)
+        char_shift = len(text) - (stop_offset - start_offset)
+        line_shift = text.count('\n') - (last_line - first_line + 1)
+        kinds, starts, ends, line_nums, line_starts, line_ends = columns
+        self._splice(buffer.kinds, start, stop, kinds, 0)
+        self._splice(buffer.starts, start, stop, starts, char_shift)
+        self._splice(buffer.ends, start, stop, ends, char_shift)
+        self._splice(buffer.line_nums, start, stop, line_nums, line_shift)
+        self._splice(buffer.line_starts, first_line - 1, last_line, line_starts, char_shift)
+        self._splice(buffer.line_ends, first_line - 1, last_line, line_ends, char_shift)
+        buffer.source = source[:start_offset] + text + source[stop_offset:]
+        buffer._pattern_counts.clear()
 
+        count = len(kinds)
+        index_shift = count - (stop - start)
+        if index_shift:
+            for view in islice(self.views, stop, None):
+                view.index += index_shift
+        self.views[start:stop] = [TokenView(buffer, index) for index in range(start, start + count)]
+        return start, stop, count
 
+    @staticmethod
+    def _splice(column, start, stop, new, shift):
+        # Replaces column[start:stop] by new, adding shift to everything after it
+        if shift:
+            column[start:] = new + array(column.typecode, map(shift.__add__, column[stop:]))
+        else:
+            column[start:stop] = new
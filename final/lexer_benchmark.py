@@ -0,0 +1,76 @@
+"""
+Memory benchmark for the lexer's token storage.
+
+Generates a program with the given number of lines (100,000 by default) and compares the memory held by a list of
+Token objects from Lexer.lex() with a TokenBuffer from Lexer.tokenize(), plus the time each takes.
+
+Usage:
+    python3 lexer_benchmark.py [-t files/tokens.txt] [-n lines] [-l regex|table] [-j jobs]
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+from lexer import *
+
+
+def generate_program(num_lines):
+    lines = ['begin', '    int total := 0;', '    float scale := 1.5;']
+    for i in range(num_lines - 5):
+        if i % 4 == 0:
+            lines.append('    total := total + %d * (total - 3) / 2;' % i)
+        elif i % 4 == 1:
+            lines.append('    write("line ", total, "\\n");   # progress')
+        elif i % 4 == 2:
+            lines.append('    scale := scale * 2.0 + .5;')
+        else:
+            lines.append('    bool b%d := not (total <= %d) and total != 7;' % (i, i))
+    lines.append('    write(total, scale);')
+    lines.append('end')
+    return '\n'.join(lines) + '\n'
+
+
+def measure(build):
+    # Timed without tracemalloc, since tracing slows down every allocation
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Token storage memory benchmark")
+    parser.add_argument('-t', type = str, dest = 'token_file', help = "Token file", default = 'files/tokens.txt')
+    parser.add_argument('-n', type = int, dest = 'num_lines', help = "Lines in the program", default = 100000)
+    parser.add_argument('-l', type = str, dest = 'lex_mode', choices = ['regex', 'table'], default = 'regex')
+    parser.add_argument('-j', type = int, dest = 'lex_jobs', help = "Lexer processes", default = 1)
+    args = parser.parse_args()
+
+    fd, source_file = tempfile.mkstemp(suffix = '.ml')
+    with os.fdopen(fd, 'w') as fp:
+        fp.write(generate_program(args.num_lines))
+
+    try:
+        lexer = Lexer(source_file, args.token_file, args.lex_mode)
+        tokens, token_current, token_peak, token_time = measure(lambda: list(lexer.lex()))
+        num_tokens = len(tokens)
+        del tokens
+        buffer, buffer_current, buffer_peak, buffer_time = measure(lambda: lexer.tokenize(args.lex_jobs))
+    finally:
+        os.remove(source_file)
+
+    print('{:d} lines, {:d} tokens'.format(args.num_lines, num_tokens))
+    print('{:<14s}{:>14s}{:>14s}{:>12s}'.format('', 'held (MB)', 'peak (MB)', 'time (s)'))
+    print('{:<14s}{:>14.2f}{:>14.2f}{:>12.3f}'.format('Token list', token_current / 2**20, token_peak / 2**20,
+                                                     token_time))
+    print('{:<14s}{:>14.2f}{:>14.2f}{:>12.3f}'.format('TokenBuffer', buffer_current / 2**20, buffer_peak / 2**20,
+                                                     buffer_time))
+    print('Token list holds {:.1f}x the memory of TokenBuffer'.format(token_current / buffer_current))
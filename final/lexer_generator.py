@@ -0,0 +1,420 @@
+"""
+Generates a table-driven lexer from a token file (see files/tokens.txt).
+
+Each pattern is compiled into an NFA, all of them are merged into a single DFA with subset construction, and the DFA
+is minimized. Lexer's 'table' mode runs these tables (kept in its TokenCache), and they can also be written out as an
+importable Python module:
+
+    TOKEN_FILE_HASH     - sha1 of the token file the table was built from
+    TOKENS              - (t_class, name) for each token, in token file order (the order is the priority)
+    ASCII_CLASSES       - character class of each ASCII character
+    UNICODE_CLASSES     - character class of non-ASCII characters, indexed by is_word * 4 + is_digit * 2 + is_space
+    TRANSITIONS         - TRANSITIONS[state][char class] -> next state (-1 if there is none)
+    ACCEPTS             - ACCEPTS[state] -> None or a tuple of (token index, lookahead) in priority order
+
+A token is everything in group 1 of its pattern. A pattern can be followed by a second group that is only checked,
+never consumed (the '(\W|$)' after keywords). That group has to be single characters and/or '$', and it is stored as
+a lookahead of (set of char classes, matches at end of line). A lookahead of None means the token is always accepted.
+
+The table lexer takes the longest match, breaking ties with the token file order. For files like tokens.txt, where
+keywords are guarded by a lookahead, this gives the same tokens as the first-match regex lexer.
+
+Usage:
+    python3 lexer_generator.py files/tokens.txt files/tokens_table.py
+"""
+
+import sys
+from os import path
+from lexer import *
+from errors import *
+
+
+# Non-ASCII characters can't be listed one by one, so they are bucketed by the only things our escapes look at
+NUM_ASCII = 128
+UNICODE_BUCKETS = [NUM_ASCII + i for i in range(8)]
+UNIVERSE = frozenset(range(NUM_ASCII)) | frozenset(UNICODE_BUCKETS)
+
+
+def _bucket_set(bit):
+    return frozenset(NUM_ASCII + i for i in range(8) if i & bit)
+
+
+WORD_SET = frozenset(i for i in range(NUM_ASCII) if chr(i).isalnum() or chr(i) == '_') | _bucket_set(4)
+DIGIT_SET = frozenset(i for i in range(NUM_ASCII) if chr(i).isdecimal()) | _bucket_set(2)
+SPACE_SET = frozenset(i for i in range(NUM_ASCII) if chr(i).isspace()) | _bucket_set(1)
+DOT_SET = UNIVERSE - {ord('\n')}
+
+ESCAPE_SETS = {'w': WORD_SET, 'W': UNIVERSE - WORD_SET, 'd': DIGIT_SET, 'D': UNIVERSE - DIGIT_SET,
+               's': SPACE_SET, 'S': UNIVERSE - SPACE_SET}
+ESCAPE_CHARS = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v', '0': '\0'}
+
+
+# _______________________Pattern Parsing________________________
+# Patterns are parsed into nested tuples:
+#   ('set', frozenset)  ('eol',)  ('cat', [nodes])  ('alt', [nodes])
+#   ('star', node)  ('plus', node)  ('opt', node)  ('group', capture number or None, node)
+
+class _PatternParser:
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.pos = 0
+        self.groups = 0
+
+    def error(self, msg):
+        raise LexerError('Unsupported pattern for the table lexer (%s): %s' % (msg, self.pattern))
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def parse(self):
+        node = self.alt()
+        if self.pos != len(self.pattern):
+            self.error('unbalanced ")"')
+        return node
+
+    def alt(self):
+        branches = [self.cat()]
+        while self.peek() == '|':
+            self.pos += 1
+            branches.append(self.cat())
+        return branches[0] if len(branches) == 1 else ('alt', branches)
+
+    def cat(self):
+        items = []
+        while self.peek() is not None and self.peek() not in '|)':
+            items.append(self.repeat())
+        return ('cat', items)
+
+    def repeat(self):
+        node = self.atom()
+        while self.peek() is not None and self.peek() in '*+?':
+            op = self.peek()
+            self.pos += 1
+            if self.peek() == '?':
+                self.error('lazy repetition')
+            node = ('star' if op == '*' else 'plus' if op == '+' else 'opt', node)
+        return node
+
+    def atom(self):
+        c = self.peek()
+        self.pos += 1
+        if c == '(':
+            number = None
+            if self.pattern.startswith('?:', self.pos):
+                self.pos += 2
+            elif self.peek() == '?':
+                self.error('group extension')
+            else:
+                self.groups += 1
+                number = self.groups
+            node = self.alt()
+            if self.peek() != ')':
+                self.error('missing ")"')
+            self.pos += 1
+            return ('group', number, node)
+        elif c == '[':
+            return ('set', self.char_class())
+        elif c == '.':
+            return ('set', DOT_SET)
+        elif c == '$':
+            return ('eol',)
+        elif c == '\\':
+            return ('set', self.escape())
+        elif c in '^{':
+            self.error('"%s"' % c)
+        return ('set', self.literal(c))
+
+    def literal(self, c):
+        if ord(c) >= NUM_ASCII:
+            self.error('non-ASCII character')
+        return frozenset([ord(c)])
+
+    def escape(self):
+        c = self.peek()
+        if c is None:
+            self.error('trailing "\\"')
+        self.pos += 1
+        if c in ESCAPE_SETS:
+            return ESCAPE_SETS[c]
+        if c in ESCAPE_CHARS:
+            return self.literal(ESCAPE_CHARS[c])
+        if c.isalnum():
+            self.error('escape "\\%s"' % c)
+        return self.literal(c)
+
+    def char_class(self):
+        negate = False
+        if self.peek() == '^':
+            negate = True
+            self.pos += 1
+        members = set()
+        first = True
+        while True:
+            c = self.peek()
+            if c is None:
+                self.error('missing "]"')
+            if c == ']' and not first:
+                self.pos += 1
+                break
+            first = False
+            self.pos += 1
+            if c == '\\':
+                item = self.escape()
+            else:
+                item = self.literal(c)
+            # Ranges (a-z)
+            if len(item) == 1 and self.peek() == '-' and self.pos + 1 < len(self.pattern) \
+                    and self.pattern[self.pos + 1] != ']':
+                self.pos += 1
+                end = self.peek()
+                self.pos += 1
+                if end == '\\':
+                    end_item = self.escape()
+                else:
+                    end_item = self.literal(end)
+                low, high = min(item), min(end_item)
+                item = frozenset(range(low, high + 1))
+            members |= item
+        return UNIVERSE - members if negate else frozenset(members)
+
+
+def _split_pattern(pattern):
+    # Returns (token node, lookahead) where lookahead is None or (frozenset of symbols, matches at end of line)
+    parser = _PatternParser(pattern)
+    node = parser.parse()
+    items = node[1] if node[0] == 'cat' else [node]
+    if not items or items[0][0] != 'group' or items[0][1] != 1:
+        parser.error('pattern must start with group 1')
+    if len(items) == 1:
+        return items[0][2], None
+    if len(items) > 2 or items[1][0] != 'group':
+        parser.error('only one lookahead group can follow group 1')
+
+    # The lookahead group must be single characters or '$'
+    lookahead = items[1][2]
+    branches = lookahead[1] if lookahead[0] == 'alt' else [lookahead]
+    symbols = frozenset()
+    eol = False
+    for branch in branches:
+        while branch[0] == 'cat' and len(branch[1]) == 1:
+            branch = branch[1][0]
+        while branch[0] == 'group':
+            branch = branch[2]
+        if branch[0] == 'set':
+            symbols |= branch[1]
+        elif branch[0] == 'eol':
+            eol = True
+        else:
+            parser.error('lookahead must be single characters or "$"')
+    return items[0][2], (symbols, eol)
+
+
+def _node_sets(node, sets):
+    kind = node[0]
+    if kind == 'set':
+        sets.append(node[1])
+    elif kind in ('cat', 'alt'):
+        for child in node[1]:
+            _node_sets(child, sets)
+    elif kind in ('star', 'plus', 'opt'):
+        _node_sets(node[1], sets)
+    elif kind == 'group':
+        _node_sets(node[2], sets)
+
+
+def _partition_alphabet(sets):
+    # Symbols that belong to exactly the same sets behave the same everywhere, so they share a char class
+    signature_to_class = {}
+    symbol_class = {}
+    for symbol in sorted(UNIVERSE):
+        signature = tuple(symbol in s for s in sets)
+        if signature not in signature_to_class:
+            signature_to_class[signature] = len(signature_to_class)
+        symbol_class[symbol] = signature_to_class[signature]
+    return symbol_class, len(signature_to_class)
+
+
+# _______________________NFA________________________
+
+class _NFA:
+    def __init__(self):
+        self.edges = []     # edges[state] = list of (frozenset of classes, next state)
+        self.epsilon = []   # epsilon[state] = list of next states
+        self.accepts = {}   # state -> (token index, lookahead)
+
+    def new_state(self):
+        self.edges.append([])
+        self.epsilon.append([])
+        return len(self.edges) - 1
+
+    def build(self, node, start, classes_of):
+        # Thompson construction; returns the final state of the fragment that starts at start
+        kind = node[0]
+        if kind == 'set':
+            end = self.new_state()
+            self.edges[start].append((classes_of(node[1]), end))
+            return end
+        elif kind == 'eol':
+            raise LexerError('Unsupported pattern for the table lexer ("$" inside group 1)')
+        elif kind == 'cat':
+            for child in node[1]:
+                start = self.build(child, start, classes_of)
+            return start
+        elif kind == 'alt':
+            end = self.new_state()
+            for child in node[1]:
+                branch = self.new_state()
+                self.epsilon[start].append(branch)
+                self.epsilon[self.build(child, branch, classes_of)].append(end)
+            return end
+        elif kind == 'group':
+            return self.build(node[2], start, classes_of)
+        else:
+            inner = self.new_state()
+            end = self.new_state()
+            self.epsilon[start].append(inner)
+            inner_end = self.build(node[1], inner, classes_of)
+            self.epsilon[inner_end].append(end)
+            if kind in ('star', 'plus'):
+                self.epsilon[inner_end].append(inner)
+            if kind in ('star', 'opt'):
+                self.epsilon[start].append(end)
+            return end
+
+    def closure(self, states):
+        stack = list(states)
+        seen = set(states)
+        while stack:
+            for nxt in self.epsilon[stack.pop()]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return frozenset(seen)
+
+
+# _______________________DFA________________________
+
+def _subset_construction(nfa, start, num_classes):
+    start_set = nfa.closure([start])
+    dfa_states = {start_set: 0}
+    work = [start_set]
+    transitions = []
+    accepts = []
+    while work:
+        current = work.pop(0)
+        row = []
+        for cls in range(num_classes):
+            targets = [nxt for state in current for classes, nxt in nfa.edges[state] if cls in classes]
+            if not targets:
+                row.append(-1)
+                continue
+            target_set = nfa.closure(targets)
+            if target_set not in dfa_states:
+                dfa_states[target_set] = len(dfa_states)
+                work.append(target_set)
+            row.append(dfa_states[target_set])
+        transitions.append(row)
+        accept = sorted(nfa.accepts[state] for state in current if state in nfa.accepts)
+        accepts.append(tuple(accept) if accept else None)
+    return transitions, accepts
+
+
+def _minimize(transitions, accepts):
+    # Moore's algorithm: start from states split by what they accept, refine by where their transitions go
+    num_states = len(transitions)
+    block_ids = {}
+    block_of = []
+    for state in range(num_states):
+        block_of.append(block_ids.setdefault(accepts[state], len(block_ids)))
+
+    while True:
+        signatures = {}
+        new_block_of = []
+        for state in range(num_states):
+            signature = (block_of[state],) + tuple(block_of[nxt] if nxt >= 0 else -1 for nxt in transitions[state])
+            new_block_of.append(signatures.setdefault(signature, len(signatures)))
+        if len(signatures) == len(set(block_of)):
+            break
+        block_of = new_block_of
+
+    # Renumber so the start state stays 0
+    order = {}
+    for state in range(num_states):
+        order.setdefault(block_of[state], len(order))
+    min_transitions = [None] * len(order)
+    min_accepts = [None] * len(order)
+    for state in range(num_states):
+        new_state = order[block_of[state]]
+        if min_transitions[new_state] is None:
+            min_transitions[new_state] = tuple(order[block_of[nxt]] if nxt >= 0 else -1
+                                               for nxt in transitions[state])
+            min_accepts[new_state] = accepts[state]
+    return min_transitions, min_accepts
+
+
+def build_table(token_table):
+    """
+    Takes the list of (t_class, name, pattern) from read_token_table
+    and returns the dict of tables that gets written to the module
+    """
+    split_patterns = [_split_pattern(ptn) for _, _, ptn in token_table]
+
+    # Build the char classes from every set used by a token or a lookahead
+    sets = []
+    for node, lookahead in split_patterns:
+        _node_sets(node, sets)
+        if lookahead is not None:
+            sets.append(lookahead[0])
+    symbol_class, num_classes = _partition_alphabet(sets)
+
+    def classes_of(symbols):
+        return frozenset(symbol_class[s] for s in symbols)
+
+    nfa = _NFA()
+    start = nfa.new_state()
+    for i in range(len(split_patterns)):
+        node, lookahead = split_patterns[i]
+        branch = nfa.new_state()
+        nfa.epsilon[start].append(branch)
+        end = nfa.build(node, branch, classes_of)
+        if lookahead is not None:
+            lookahead = (classes_of(lookahead[0]), lookahead[1])
+        nfa.accepts[end] = (i, lookahead)
+
+    transitions, accepts = _minimize(*_subset_construction(nfa, start, num_classes))
+
+    return {'TOKENS': tuple((t_class, name) for t_class, name, _ in token_table),
+            'ASCII_CLASSES': tuple(symbol_class[i] for i in range(NUM_ASCII)),
+            'UNICODE_CLASSES': tuple(symbol_class[s] for s in UNICODE_BUCKETS),
+            'TRANSITIONS': tuple(transitions),
+            'ACCEPTS': tuple(accepts)}
+
+
+def write_table_module(token_file, output_file):
+    tables = build_table(read_token_table(token_file))
+    with open(output_file, 'w') as fp:
+        fp.write('# Generated by lexer_generator.py from %s (do not edit)\n\n' % path.basename(token_file))
+        fp.write('TOKEN_FILE_HASH = %r\n\n' % token_file_hash(token_file))
+        for name in ('TOKENS', 'ASCII_CLASSES', 'UNICODE_CLASSES'):
+            fp.write('%s = %r\n\n' % (name, tables[name]))
+        fp.write('TRANSITIONS = (\n')
+        for row in tables['TRANSITIONS']:
+            fp.write('    %r,\n' % (row,))
+        fp.write(')\n\nACCEPTS = (\n')
+        for accept in tables['ACCEPTS']:
+            fp.write('    %r,\n' % (accept,))
+        fp.write(')\n')
+
+
+def table_module_path(token_file):
+    # files/tokens.txt -> files/tokens_table.py
+    return path.splitext(token_file)[0] + '_table.py'
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print('usage: python3 lexer_generator.py <token file> [output module]')
+        sys.exit(1)
+    token_file = sys.argv[1]
+    output_file = sys.argv[2] if len(sys.argv) == 3 else table_module_path(token_file)
+    write_table_module(token_file, output_file)
@@ -0,0 +1,100 @@
+"""
+Benchmark for the parser's expression modes.
+
+Generates an expression-heavy program with the given number of lines (20,000 by default) and compares the parse time
+(with and without lexing) and the number of tree nodes of the recursive-descent expression parser with the
+precedence-climbing one, then the memory held by the parser tree against the typed AST it converts to (ast_nodes).
+The table-driven parser (TableParser) for the grammar file is timed too; it builds the same tree as descent.
+
+Usage:
+    python3 parser_benchmark.py [-t files/tokens.txt] [-g files/grammar.txt] [-n lines]
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+from MLparser import *
+from ast_nodes import *
+
+
+def generate_program(num_lines):
+    lines = ['begin', '    int a := 1, b := 2, c := 3, total := 0;', '    bool done := False;']
+    for i in range(num_lines - 4):
+        if i % 3 == 0:
+            lines.append('    total := a * (b + %d) - c / 2 + total %% 7 - -a;' % i)
+        elif i % 3 == 1:
+            lines.append('    done := not done and total >= %d or a + b != c * 2;' % i)
+        else:
+            lines.append('    a := (a + b) * (c - 1) + b * b - %d;' % i)
+    lines.append('end')
+    return '\n'.join(lines) + '\n'
+
+
+def measure_lexer(source_file, token_file):
+    start = time.perf_counter()
+    for token in Lexer(source_file, token_file).tokenize():
+        pass
+    return time.perf_counter() - start
+
+
+def measure(source_file, token_file, expr_mode):
+    start = time.perf_counter()
+    parse_tree = Parser(False, expr_mode = expr_mode).parse(source_file, token_file)
+    return time.perf_counter() - start, len(parse_tree)
+
+
+def measure_table(source_file, token_file, grammar_file):
+    # The tables are generated (or loaded) before timing
+    table_ops(grammar_file, token_file)
+    start = time.perf_counter()
+    parse_tree = TableParser(False, grammar_file).parse(source_file, token_file)
+    return time.perf_counter() - start, len(parse_tree)
+
+
+def measure_memory(source_file, token_file):
+    # Memory held by the (precedence) parser tree, then by the AST once the tree is gone
+    tracemalloc.start()
+    parse_tree = Parser(False, expr_mode = 'precedence').parse(source_file, token_file)
+    tree_memory = tracemalloc.get_traced_memory()[0]
+    syntax_tree = to_ast(parse_tree)
+    del parse_tree
+    ast_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return tree_memory, ast_memory, len(syntax_tree)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Expression parser benchmark")
+    parser.add_argument('-t', type = str, dest = 'token_file', help = "Token file", default = 'files/tokens.txt')
+    parser.add_argument('-g', type = str, dest = 'grammar_file', help = "Grammar file",
+                        default = 'files/grammar.txt')
+    parser.add_argument('-n', type = int, dest = 'num_lines', help = "Lines in the program", default = 20000)
+    args = parser.parse_args()
+
+    fd, source_file = tempfile.mkstemp(suffix = '.ml')
+    with os.fdopen(fd, 'w') as fp:
+        fp.write(generate_program(args.num_lines))
+
+    try:
+        lex_time = measure_lexer(source_file, args.token_file)
+        results = [(expr_mode, measure(source_file, args.token_file, expr_mode))
+                   for expr_mode in ('descent', 'precedence')]
+        results.append(('table', measure_table(source_file, args.token_file, args.grammar_file)))
+        tree_memory, ast_memory, ast_nodes = measure_memory(source_file, args.token_file)
+    finally:
+        os.remove(source_file)
+
+    print('{:d} lines, {:.3f}s of each parse is lexing'.format(args.num_lines, lex_time))
+    print('{:<14s}{:>12s}{:>14s}'.format('', 'time (s)', 'tree nodes'))
+    for expr_mode, (elapsed, num_nodes) in results:
+        print('{:<14s}{:>12.3f}{:>14d}'.format(expr_mode, elapsed, num_nodes))
+    (_, (descent_time, descent_nodes)), (_, (precedence_time, precedence_nodes)), (_, (table_time, _)) = results
+    print('precedence parses {:.1f}x faster ({:.1f}x without lexing) with {:.1f}x fewer nodes'.format(
+        descent_time / precedence_time, (descent_time - lex_time) / (precedence_time - lex_time),
+        descent_nodes / precedence_nodes))
+    print('table parses in {:.2f}x the time of descent ({:.2f}x without lexing)'.format(
+        table_time / descent_time, (table_time - lex_time) / (descent_time - lex_time)))
+    print('parser tree holds {:.2f}MB ({:d} nodes), AST holds {:.2f}MB ({:d} nodes), tokens included'.format(
+        tree_memory / 2**20, precedence_nodes, ast_memory / 2**20, ast_nodes))
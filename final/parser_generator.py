@@ -0,0 +1,404 @@
+"""
+Generates a table-driven LL(1) parser from a grammar file (see files/grammar.txt).
+
+{ ... } and [ ... ] are turned into helper nonterminals (<name.1>, <name.2>, ... after the rule they're in), then the
+FIRST and FOLLOW sets of every nonterminal give the predict table: for each nonterminal, the production to expand for
+each token name that can come next. Terminals that are token classes are expanded into the token names of the class
+with the token file, so the parser looks up the name of the current token only. A token that two productions of a
+nonterminal predict is a conflict; it is reported and goes to the production listed first. MLparser.TableParser runs
+these tables, which are kept in a marshal cache next to the grammar file (see load_tables), and can also be written out
+as an importable Python module:
+
+    GRAMMAR_HASH        - sha1 of the grammar file and the token file the table was built from
+    NONTERMINALS        - (name, tree label or None, name used in syntax errors, expected tokens) for each nonterminal
+    PRODUCTIONS         - (nonterminal, symbols) for each production, where a symbol is the index of a nonterminal or a
+                          terminal (symbol, token names, action, label) and action is 'drop', 'keep', 'label' or 'name'
+    PREDICT             - PREDICT[nonterminal] -> (dict of token name -> production, default production or None)
+    FIRST, FOLLOW       - nonterminal name -> tuple of terminals
+    CONFLICTS           - a message for each LL(1) conflict
+
+A nullable nonterminal's first nullable production is its default and is expanded for any token its dict doesn't
+have, like the hand-written parser's optional parts, so a syntax error is found by the next terminal that doesn't match.
+
+Usage:
+    python3 parser_generator.py files/grammar.txt files/tokens.txt [files/grammar_table.py]
+"""
+
+import os
+import re
+import sys
+import marshal
+import hashlib
+from os import path
+from lexer import *
+from errors import *
+
+
+# Bump this whenever the layout of the tables build_table returns changes
+GRAMMAR_CACHE_VERSION = 1
+
+
+# _______________________Grammar Reading________________________
+
+_GRAMMAR_SYMBOL = re.compile(r'<(\w+)>|->|[|{}\[\]]|lambda\b|([A-Z_][A-Z0-9_]*)(!|\*|:([A-Z_][A-Z0-9_]*))?')
+
+# Action of each terminal suffix
+_ACTIONS = {None: 'drop', '!': 'keep', '*': 'name'}
+
+
+class _GrammarReader:
+    # Reads the rules of a grammar file as (nonterminal, line number, alternatives), where an alternative is a list of
+    # ('N', name), ('T', terminal, action, label), ('{', alternatives), ('[', alternatives) and ('lambda',)
+    def __init__(self, grammar_file):
+        self.grammar_file = grammar_file
+        self.symbols = []
+        self.pos = 0
+        with open(grammar_file) as grammar:
+            for line_num, line in enumerate(grammar, 1):
+                line = line.split('#', 1)[0]
+                pos = 0
+                while True:
+                    while pos < len(line) and line[pos].isspace():
+                        pos += 1
+                    if pos == len(line):
+                        break
+                    match = _GRAMMAR_SYMBOL.match(line, pos)
+                    if match is None:
+                        self.error('unexpected "%s"' % line[pos:].split()[0], line_num)
+                    self.symbols.append((match, line_num))
+                    pos = match.end()
+
+    def error(self, msg, line_num = None):
+        if line_num is None:
+            line_num = self.symbols[min(self.pos, len(self.symbols) - 1)][1] if self.symbols else 0
+        raise ParserError('Bad grammar file %s (%s)\nLine num: %d' % (self.grammar_file, msg, line_num))
+
+    def peek(self, offset = 0):
+        pos = self.pos + offset
+        return self.symbols[pos][0].group(0) if pos < len(self.symbols) else None
+
+    def starts_rule(self):
+        match = self.symbols[self.pos][0]
+        return match.group(1) is not None and self.peek(1) == '->'
+
+    def read(self):
+        rules = []
+        while self.pos < len(self.symbols):
+            if not self.starts_rule():
+                self.error('expected a rule, found "%s"' % self.peek())
+            name = self.symbols[self.pos][0].group(1)
+            line_num = self.symbols[self.pos][1]
+            self.pos += 2
+            rules.append((name, line_num, self.alternatives(None)))
+        if not rules:
+            self.error('no rules')
+        return rules
+
+    def alternatives(self, closing):
+        alternatives = [[]]
+        while self.pos < len(self.symbols):
+            text = self.peek()
+            match = self.symbols[self.pos][0]
+            if text in ('}', ']'):
+                if text != closing:
+                    self.error('unbalanced "%s"' % text)
+                self.pos += 1
+                break
+            if text == '|':
+                self.pos += 1
+                alternatives.append([])
+            elif text in ('{', '['):
+                self.pos += 1
+                alternatives[-1].append((text, self.alternatives('}' if text == '{' else ']')))
+            elif text == '->':
+                self.error('unexpected "->"')
+            elif text == 'lambda':
+                self.pos += 1
+                alternatives[-1].append(('lambda',))
+            elif match.group(1) is not None:
+                if self.starts_rule():
+                    break
+                self.pos += 1
+                alternatives[-1].append(('N', match.group(1)))
+            else:
+                self.pos += 1
+                label = match.group(4)
+                action = 'label' if label else _ACTIONS[match.group(3)]
+                if action == 'keep':
+                    label = match.group(2)
+                alternatives[-1].append(('T', match.group(2), action, label))
+        else:
+            if closing is not None:
+                self.error('missing "%s"' % closing)
+        for alternative in alternatives:
+            if not alternative:
+                self.error('empty alternative (write lambda for the empty string)')
+        return alternatives
+
+
+def _desugar(rules, grammar_file):
+    # Returns a list of (name, tree label, error name, productions), where a production is a list of ('N', name) and
+    # ('T', terminal, action, label), with each { } and [ ] replaced by a helper nonterminal
+    defined = {}
+    for name, line_num, _ in rules:
+        if name in defined:
+            raise ParserError('Bad grammar file %s (<%s> is defined twice)\nLine num: %d'
+                              % (grammar_file, name, line_num))
+        defined[name] = line_num
+
+    nonterminals = []
+    helpers = {}
+
+    def add(name, label, owner, alternatives):
+        productions = []
+        nonterminals.append((name, label, owner.upper(), productions))
+        for alternative in alternatives:
+            productions.append(flatten(alternative, owner))
+
+    def flatten(alternative, owner):
+        symbols = []
+        for item in alternative:
+            if item[0] in ('{', '['):
+                helpers[owner] = helpers.get(owner, 0) + 1
+                helper = '%s.%d' % (owner, helpers[owner])
+                defined[helper] = defined[owner]
+                alternatives = item[1]
+                if item[0] == '{':
+                    alternatives = [alternative + [('N', helper)] for alternative in alternatives]
+                symbols.append(('N', helper))
+                add(helper, None, owner, alternatives + [[]])
+            elif item[0] == 'N':
+                if item[1] not in defined:
+                    raise ParserError('Bad grammar file %s (<%s> is used in <%s> but never defined)\nLine num: %d'
+                                      % (grammar_file, item[1], owner, defined[owner]))
+                symbols.append(item)
+            elif item[0] == 'T':
+                symbols.append(item)
+        return symbols
+
+    for name, _, alternatives in rules:
+        add(name, None if name.startswith('_') else name.upper(), name, alternatives)
+    return nonterminals
+
+
+# _______________________FIRST, FOLLOW and Predict Sets________________________
+
+def _sequence_first(symbols, first, nullable):
+    # (FIRST of a list of symbols, whether it can derive the empty string)
+    result = set()
+    for symbol in symbols:
+        if symbol[0] == 'T':
+            result.add(symbol[1])
+            return result, False
+        result |= first[symbol[1]]
+        if not nullable[symbol[1]]:
+            return result, False
+    return result, True
+
+
+def first_follow(nonterminals):
+    """
+    Takes the nonterminals from _desugar
+    and returns (first, nullable, follow), dicts of nonterminal name -> set of terminals (or bool)
+    """
+    first = {name: set() for name, *_ in nonterminals}
+    nullable = {name: False for name, *_ in nonterminals}
+    follow = {name: set() for name, *_ in nonterminals}
+    follow[nonterminals[0][0]].add('$')
+
+    changed = True
+    while changed:
+        changed = False
+        for name, _, _, productions in nonterminals:
+            for production in productions:
+                terminals, is_nullable = _sequence_first(production, first, nullable)
+                if not terminals <= first[name] or (is_nullable and not nullable[name]):
+                    first[name] |= terminals
+                    nullable[name] |= is_nullable
+                    changed = True
+
+    changed = True
+    while changed:
+        changed = False
+        for name, _, _, productions in nonterminals:
+            for production in productions:
+                for i, symbol in enumerate(production):
+                    if symbol[0] == 'N':
+                        terminals, is_nullable = _sequence_first(production[i + 1:], first, nullable)
+                        if is_nullable:
+                            terminals |= follow[name]
+                        if not terminals <= follow[symbol[1]]:
+                            follow[symbol[1]] |= terminals
+                            changed = True
+    return first, nullable, follow
+
+
+def _check_left_recursion(nonterminals, nullable, grammar_file):
+    # An LL parser expanding a left recursive nonterminal would expand it again forever without reading a token
+    leading = {}
+    for name, _, _, productions in nonterminals:
+        leading[name] = set()
+        for production in productions:
+            for symbol in production:
+                if symbol[0] == 'T':
+                    break
+                leading[name].add(symbol[1])
+                if not nullable[symbol[1]]:
+                    break
+    for name in leading:
+        reached = set()
+        todo = list(leading[name])
+        while todo:
+            other = todo.pop()
+            if other == name:
+                raise ParserError('Bad grammar file %s (<%s> is left recursive)' % (grammar_file, name.split('.')[0]))
+            if other not in reached:
+                reached.add(other)
+                todo.extend(leading[other])
+
+
+def _production_str(name, production):
+    symbols = []
+    for symbol in production:
+        symbols.append('<%s>' % symbol[1] if symbol[0] == 'N' else symbol[1])
+    return '<%s> -> %s' % (name, ' '.join(symbols) or 'lambda')
+
+
+def build_table(grammar_file, token_table):
+    """
+    Takes a grammar file and the list of (t_class, name, pattern) from read_token_table
+    and returns the dict of tables that gets written to the module
+    """
+    nonterminals = _desugar(_GrammarReader(grammar_file).read(), grammar_file)
+    first, nullable, follow = first_follow(nonterminals)
+    _check_left_recursion(nonterminals, nullable, grammar_file)
+
+    # Token names of each terminal (a token name or a token class)
+    token_names = {'$': {'$'}}
+    for t_class, name, _ in token_table:
+        token_names.setdefault(t_class, set()).add(name)
+        token_names.setdefault(name, set()).add(name)
+
+    def names_of(terminals):
+        names = set()
+        for terminal in terminals:
+            if terminal not in token_names:
+                raise ParserError('Bad grammar file %s (%s is not a token name or class)' % (grammar_file, terminal))
+            names |= token_names[terminal]
+        return names
+
+    index = {name: i for i, (name, *_) in enumerate(nonterminals)}
+    table_nonterminals = []
+    productions = []
+    predict = []
+    conflicts = []
+    for name, label, error_name, rule_productions in nonterminals:
+        row = {}
+        default = None
+        for production in rule_productions:
+            terminals, is_nullable = _sequence_first(production, first, nullable)
+            if is_nullable:
+                terminals |= follow[name]
+                if default is None:
+                    default = len(productions)
+            for token_name in sorted(names_of(terminals)):
+                if token_name in row:
+                    conflicts.append('<%s> on %s: "%s" is used instead of "%s"' % (
+                        name, token_name, _production_str(name, productions[row[token_name]][1]),
+                        _production_str(name, production)))
+                else:
+                    row[token_name] = len(productions)
+            productions.append((index[name], production))
+
+        # Only a nonterminal without a default can find a syntax error, so it expects its FIRST set
+        table_nonterminals.append((name, label, error_name, ' or '.join(sorted(first[name]))))
+        # Tokens the default predicts don't need an entry
+        predict.append(({token_name: p for token_name, p in row.items() if p != default}, default))
+
+    table_productions = []
+    for nonterminal, production in productions:
+        symbols = []
+        for symbol in production:
+            if symbol[0] == 'N':
+                symbols.append(index[symbol[1]])
+            else:
+                _, terminal, action, label = symbol
+                symbols.append((terminal, tuple(sorted(names_of([terminal]))), action, label))
+        table_productions.append((nonterminal, tuple(symbols)))
+
+    return {'NONTERMINALS': tuple(table_nonterminals),
+            'PRODUCTIONS': tuple(table_productions),
+            'PREDICT': tuple(predict),
+            'FIRST': {name: tuple(sorted(first[name])) for name in first},
+            'FOLLOW': {name: tuple(sorted(follow[name])) for name in follow},
+            'CONFLICTS': tuple(conflicts)}
+
+
+# _______________________Table Module________________________
+
+def grammar_hash(grammar_file, token_file):
+    with open(grammar_file, 'rb') as grammar:
+        return hashlib.sha1(grammar.read() + token_file_hash(token_file).encode()).hexdigest()
+
+
+def write_table_module(grammar_file, token_file, output_file):
+    tables = build_table(grammar_file, read_token_table(token_file))
+    with open(output_file, 'w') as fp:
+        fp.write('# Generated by parser_generator.py from %s and %s (do not edit)\n\n'
+                 % (path.basename(grammar_file), path.basename(token_file)))
+        fp.write('GRAMMAR_HASH = %r\n\n' % grammar_hash(grammar_file, token_file))
+        for name in ('NONTERMINALS', 'PRODUCTIONS', 'PREDICT'):
+            fp.write('%s = (\n' % name)
+            for row in tables[name]:
+                fp.write('    %r,\n' % (row,))
+            fp.write(')\n\n')
+        for name in ('FIRST', 'FOLLOW', 'CONFLICTS'):
+            fp.write('%s = %r\n\n' % (name, tables[name]))
+    return tables
+
+
+def table_module_path(grammar_file):
+    # files/grammar.txt -> files/grammar_table.py
+    return path.splitext(grammar_file)[0] + '_table.py'
+
+
+def load_tables(grammar_file, token_file, table_hash = None):
+    """
+    Returns the tables of grammar_file (see build_table) from its cache (grammar_file + '.cache'),
+    building and caching them first if the cache is missing or was built from a different grammar or token file
+    """
+    cache_file = grammar_file + '.cache'
+    if table_hash is None:
+        table_hash = grammar_hash(grammar_file, token_file)
+    try:
+        with open(cache_file, 'rb') as fp:
+            data = marshal.load(fp)
+        if data['version'] == GRAMMAR_CACHE_VERSION and data['hash'] == table_hash:
+            return data['tables']
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+        pass
+
+    tables = build_table(grammar_file, read_token_table(token_file))
+    # Write to a temp file and rename it, so compilers running at the same time never read half a cache
+    temp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+    try:
+        with open(temp_file, 'wb') as fp:
+            marshal.dump({'version': GRAMMAR_CACHE_VERSION, 'hash': table_hash, 'tables': tables}, fp)
+        os.replace(temp_file, cache_file)
+    except OSError:
+        # A read-only grammar directory just means no caching
+        pass
+    return tables
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print('usage: python3 parser_generator.py <grammar file> <token file> [output module]')
+        sys.exit(1)
+    grammar_file, token_file = sys.argv[1:3]
+    output_file = sys.argv[3] if len(sys.argv) == 4 else table_module_path(grammar_file)
+    tables = write_table_module(grammar_file, token_file, output_file)
+    print('%d nonterminals, %d productions, %d LL(1) conflicts' % (
+        len(tables['NONTERMINALS']), len(tables['PRODUCTIONS']), len(tables['CONFLICTS'])))
+    for conflict in tables['CONFLICTS']:
+        print('    ' + conflict)
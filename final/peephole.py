@@ -0,0 +1,184 @@
+"""
+Peephole optimizer over the generated code (the Instrs of an AsmBuffer, see assembly_helper).
+
+The code is passed through once: each instruction is appended to the optimized code, then every pattern gets to look
+at the end of it (at most window instructions back) and rewrite it, until none matches. The patterns are:
+* temp_move: li/lw $v1, x followed by move $r, $v1 becomes li/lw $r, x (when $v1 isn't read again)
+* redundant_la: la $r, sym is dropped when $r still holds the address of sym
+* store_load: sw $r, M followed by lw $s, M becomes move $s, $r (or nothing when $s is $r), same for s.s/l.s
+* branch_next: b L right before L: is dropped
+* negate: mul $d, $s, -1 (unary minus) becomes sub $d, $0, $s
+
+Labels, branches and jumps end the window: nothing is known about the registers there, except that $v1 (the scratch
+register of the asm_* functions) never holds a value across them.
+"""
+
+from collections import Counter
+from assembly_helper import *
+
+# How many instructions back a pattern can look by default
+PEEPHOLE_WINDOW = 8
+
+# Ops whose first operand is read instead of written
+_NO_DEST = {'sw', 's.s', 'beqz', 'jr', 'c.eq.s', 'c.le.s', 'c.lt.s', 'mtc1'}
+# Ops that also read their first operand (they only write it on a condition)
+_COND_MOVES = {'movn', 'movz', 'movf', 'movt'}
+# What syscall reads and writes (the syscode and arguments, the value read)
+_SYSCALL_READS = {'$v0', '$a0', '$f12'}
+_SYSCALL_WRITES = {'$v0', '$f0'}
+
+
+def _is_barrier(instr):
+    # Labels, directives, branches and jumps
+    return instr.op is None or instr.op[0] in '.bj'
+
+
+def _reads(instr):
+    if instr.op == 'syscall':
+        return _SYSCALL_READS
+    operands = instr.operands if instr.op in _NO_DEST or instr.op in _COND_MOVES else instr.operands[1:]
+    regs = set()
+    for operand in operands:
+        if type(operand) is Mem:
+            operand = operand.base
+        if type(operand) is str:
+            regs.add(operand)
+    return regs
+
+
+def _writes(instr):
+    if instr.op == 'syscall':
+        return _SYSCALL_WRITES
+    if instr.op == 'mtc1':
+        return {instr.operands[1]}
+    if instr.op in _NO_DEST or not instr.operands or type(instr.operands[0]) is not str:
+        return set()
+    return {instr.operands[0]}
+
+
+def _same_mem(mem, other):
+    return type(mem) is Mem and type(other) is Mem and mem.offset == other.offset and mem.base == other.base
+
+
+def _temp_dead(instrs, start):
+    # True if $v1 is written (or the window ends) before it is read again from instrs[start]
+    for index in range(start, len(instrs)):
+        instr = instrs[index]
+        if _is_barrier(instr):
+            return True
+        if '$v1' in _reads(instr):
+            return False
+        if '$v1' in _writes(instr):
+            return True
+    return True
+
+
+def temp_move(code, instrs, next_index, window):
+    if len(code) < 2:
+        return False
+    load, move = code[-2], code[-1]
+    if move.op != 'move' or move.operands[1] != '$v1' or load.op not in {'li', 'lw'} or load.operands[0] != '$v1' \
+            or not _temp_dead(instrs, next_index):
+        return False
+    load.operands = (move.operands[0],) + load.operands[1:]
+    code.pop()
+    return True
+
+
+def redundant_la(code, instrs, next_index, window):
+    la = code[-1]
+    if la.op != 'la' or type(la.operands[1]) is not Label:
+        return False
+    reg = la.operands[0]
+    for index in range(len(code) - 2, max(len(code) - 1 - window, -1), -1):
+        instr = code[index]
+        if _is_barrier(instr):
+            return False
+        if reg in _writes(instr):
+            if instr.op == 'la' and instr.operands[1] == la.operands[1]:
+                code.pop()
+                return True
+            return False
+    return False
+
+
+def store_load(code, instrs, next_index, window):
+    if len(code) < 2:
+        return False
+    store, load = code[-2], code[-1]
+    if (store.op, load.op) not in {('sw', 'lw'), ('s.s', 'l.s')} or not _same_mem(store.operands[1], load.operands[1]):
+        return False
+    if load.operands[0] == store.operands[0]:
+        code.pop()
+    else:
+        code[-1] = Instr('move' if load.op == 'lw' else 'mov.s', (load.operands[0], store.operands[0]), None,
+                         load.comment, load.line)
+    return True
+
+
+def branch_next(code, instrs, next_index, window):
+    if len(code) < 2:
+        return False
+    branch, label = code[-2], code[-1]
+    if label.op is not None or branch.op != 'b' or branch.operands[0] != label.label:
+        return False
+    del code[-2]
+    return True
+
+
+def negate(code, instrs, next_index, window):
+    mul = code[-1]
+    if mul.op != 'mul' or type(mul.operands[2]) is not int or mul.operands[2] != -1:
+        return False
+    code[-1] = Instr('sub', (mul.operands[0], '$0', mul.operands[1]), None, mul.comment, mul.line)
+    return True
+
+
+# The patterns by name, in the order they are tried
+PATTERNS = {'temp_move': temp_move, 'redundant_la': redundant_la, 'store_load': store_load,
+            'branch_next': branch_next, 'negate': negate}
+
+
+class Peephole:
+    """
+    Runs the patterns named in patterns (all of PATTERNS if None) over AsmBuffers, looking at most window
+    instructions back. hits counts the rewrites of each pattern over every run.
+    """
+
+    def __init__(self, patterns = None, window = PEEPHOLE_WINDOW):
+        if patterns is None:
+            patterns = list(PATTERNS)
+        for name in patterns:
+            if name not in PATTERNS:
+                raise ValueError('unknown peephole pattern "{:s}" (the patterns are {:s})'
+                                 .format(name, ', '.join(PATTERNS)))
+        self.patterns = [(name, PATTERNS[name]) for name in patterns]
+        self.window = window
+        self.hits = Counter()
+
+    def run(self, buffer):
+        """
+        Optimizes the code of buffer in place
+        """
+        instrs = buffer.instrs
+        code = []
+        for index, instr in enumerate(instrs):
+            code.append(instr)
+            matched = True
+            while matched and code:
+                matched = False
+                for name, pattern in self.patterns:
+                    if pattern(code, instrs, index + 1, self.window):
+                        self.hits[name] += 1
+                        matched = True
+                        break
+        buffer.instrs = code
+
+    def report(self):
+        """
+        Returns the hits of each pattern as a table
+        """
+        lines = ['{:<20s}{:>10s}'.format('peephole pattern', 'hits')]
+        for name, _ in self.patterns:
+            lines.append('{:<20s}{:>10d}'.format(name, self.hits[name]))
+        return '\n'.join(lines)
@@ -0,0 +1,100 @@
+"""
+Tests IncrementalParser.reparse: after random line edits of the test programs in archive/proj8 (deleting lines,
+inserting or replacing them with copies of other lines), the tree reparse returns has to be the tree parse_stream
+gives for the edited source, and an edit that makes the program wrong has to raise like parsing it would.
+
+Usage (from this directory):
+    python3 -m unittest test_reparse
+"""
+
+import os
+import sys
+import glob
+import random
+import tempfile
+import unittest
+from lexer import *
+from MLparser import *
+from errors import *
+
+TOKEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files', 'tokens.txt')
+TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'archive', 'proj8')
+
+# Programs to edit, and edits in a row on each one (the first edit that makes it wrong ends the row)
+TRIALS = 500
+EDITS = 4
+
+
+def signature(t):
+    # Every node of t in preorder, with the text and position of its token
+    nodes = []
+    stack = [t]
+    while stack:
+        node = stack.pop()
+        token = node.token
+        nodes.append((node.label, None if token is None else (token.pattern, token.line_num, token.col)))
+        stack.extend(reversed(node.children))
+    return nodes
+
+
+def parse_source(source):
+    # The tree parse_stream gives for source, or the type of the error it raises
+    fd, source_file = tempfile.mkstemp(suffix = '.ml')
+    os.write(fd, source.encode())
+    os.close(fd)
+    try:
+        return IncrementalParser(False).parse_stream(TokenStream(source_file, TOKEN_FILE))
+    except (ParserError, LexerError) as e:
+        return type(e)
+    finally:
+        os.remove(source_file)
+
+
+def random_edit(rand, lines):
+    # Returns (first_line, last_line, text) for reparse: a deletion, an insertion or a replacement of up to 3 lines
+    first_line = rand.randint(1, len(lines))
+    kind = rand.randrange(3)
+    last_line = first_line - 1 if kind == 1 else min(len(lines), first_line + rand.randint(0, 2))
+    if kind == 0:
+        return first_line, last_line, ''
+    copies = rand.sample(lines, min(len(lines), rand.randint(1, 3)))
+    return first_line, last_line, ''.join(line + '\n' for line in copies)
+
+
+class ReparseTest(unittest.TestCase):
+
+    def test_random_edits(self):
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+        files = sorted(glob.glob(os.path.join(TEST_DIR, '*', 'tests', '*.ml')))
+        self.assertTrue(files)
+        rand = random.Random(474)
+        edits = 0
+        for trial in range(TRIALS):
+            source_file = rand.choice(files)
+            source = read_source(source_file)
+            if not source.endswith('\n'):
+                source += '\n'
+            if isinstance(parse_source(source), type):
+                continue
+            tokens = TokenStream(source_file, TOKEN_FILE)
+            parser = IncrementalParser(False)
+            t = parser.parse_stream(tokens)
+            for edit in range(EDITS):
+                lines = source.split('\n')[:-1]
+                first_line, last_line, text = random_edit(rand, lines)
+                source = '\n'.join(lines[:first_line - 1] + text.split('\n')[:-1] + lines[last_line:]) + '\n'
+                expected = parse_source(source)
+                try:
+                    t = parser.reparse(t, tokens, first_line, last_line, text)
+                except (ParserError, LexerError) as e:
+                    self.assertEqual(expected, type(e), '%s, edit %d' % (source_file, edit))
+                    break
+                message = '%s, lines %d to %d replaced by %r' % (source_file, first_line, last_line, text)
+                self.assertNotIsInstance(expected, type, message)
+                self.assertEqual(signature(expected), signature(t), message)
+                edits += 1
+        self.assertGreater(edits, TRIALS // 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
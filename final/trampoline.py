@@ -0,0 +1,179 @@
+"""
+Runs recursive functions on an explicit stack.
+
+A function written as a generator makes a recursive call by yielding it, and gets back what the call returned:
+
+    cur_token, child_block = yield self.block(cur_token, G)
+
+run() keeps the generators that are waiting on a call in a list and sends each one the result of its call, so the
+nesting depth is only limited by memory, not by Python's recursion limit. Yielding a value that isn't a generator (the
+result of a plain function) just sends it straight back, so a call site doesn't need to know which kind it calls.
+
+The parser, to_ast and the code generator are written as plain recursive functions, which is faster. stack_class and
+stack_functions make the generator versions of them from their source: every call to one of the given recursive
+functions is turned into a yield of that call. The plain versions call run() where the recursion starts, which just
+returns the result when it is given one.
+"""
+
+import ast
+import inspect
+import textwrap
+from types import GeneratorType
+
+
+def run(call):
+    """
+    call: a generator from a function written as above (any other value is just returned)
+    Returns what call returns.
+    An exception raised by any of the calls goes straight out of run.
+    """
+    if type(call) is not GeneratorType:
+        return call
+    stack = [call]
+    value = None
+    while stack:
+        try:
+            value = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            value = stop.value
+            continue
+        if type(value) is GeneratorType:
+            stack.append(value)
+            value = None
+    return value
+
+
+_stack_classes = {}
+
+
+def stack_class(klass, recursive, dispatch = ()):
+    """
+    Creates (once) a subclass of klass that runs the methods named in recursive on an explicit stack.
+    In those methods, calls to self.<recursive method>(...) and to self.<dispatch table>[...](...) are yielded.
+    Raises TypeError if a method of klass makes one of those calls where it can't be yielded.
+    """
+    if klass not in _stack_classes:
+        recursive = set(recursive)
+
+        def is_call(call):
+            func = call.func
+            if isinstance(func, ast.Subscript):
+                func = func.value
+                names = dispatch
+            else:
+                names = recursive
+            return isinstance(func, ast.Attribute) and func.attr in names \
+                and isinstance(func.value, ast.Name) and func.value.id == 'self'
+
+        methods = {}
+        for name, fn in vars(klass).items():
+            if inspect.isfunction(fn):
+                function_def = _parse_function(fn)
+                _CallChecker(fn.__qualname__, is_call).check(function_def, name in recursive)
+                if name in recursive:
+                    methods[name] = _compile_stack_function(fn, function_def, is_call, fn.__globals__)
+
+        StackClass = type('Stack' + klass.__name__, (klass,), methods)
+        StackClass.__module__ = klass.__module__
+        _stack_classes[klass] = StackClass
+    return _stack_classes[klass]
+
+
+_stack_function_sets = {}
+
+
+def stack_functions(functions):
+    """
+    Returns (once) a dict of name -> stack version of the given module functions, which call each other by name.
+    Raises TypeError if one of them makes one of those calls where it can't be yielded.
+    """
+    key = tuple(functions)
+    if key not in _stack_function_sets:
+        recursive = {fn.__name__ for fn in functions}
+
+        def is_call(call):
+            return isinstance(call.func, ast.Name) and call.func.id in recursive
+
+        # The stack versions call each other, so they get their own copy of the module namespace
+        namespace = dict(functions[0].__globals__)
+        for fn in functions:
+            function_def = _parse_function(fn)
+            _CallChecker(fn.__qualname__, is_call).check(function_def, True)
+            namespace[fn.__name__] = _compile_stack_function(fn, function_def, is_call, namespace)
+        _stack_function_sets[key] = {fn.__name__: namespace[fn.__name__] for fn in functions}
+    return _stack_function_sets[key]
+
+
+def _parse_function(fn):
+    # The FunctionDef of fn, with the line numbers of its source file
+    function_def = ast.parse(textwrap.dedent(inspect.getsource(fn))).body[0]
+    ast.increment_lineno(function_def, fn.__code__.co_firstlineno - 1)
+    function_def.decorator_list = []
+    return function_def
+
+
+def _compile_stack_function(fn, function_def, is_call, namespace):
+    function_def.body = [_YieldCalls(is_call).visit(statement) for statement in function_def.body]
+    module = ast.fix_missing_locations(ast.Module(body = [function_def], type_ignores = []))
+    local_namespace = {}
+    exec(compile(module, inspect.getsourcefile(fn), 'exec'), namespace, local_namespace)
+    stack_fn = local_namespace[fn.__name__]
+    stack_fn.__qualname__ = fn.__qualname__
+    return stack_fn
+
+
+class _YieldCalls(ast.NodeTransformer):
+    # Turns each recursive call into a yield of it (nested functions are left alone, _CallChecker makes sure they
+    # have no recursive calls)
+    def __init__(self, is_call):
+        self.is_call = is_call
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if self.is_call(node):
+            return ast.copy_location(ast.Yield(value = node), node)
+        return node
+
+    def visit_nested(self, node):
+        return node
+
+    visit_FunctionDef = visit_Lambda = visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp \
+        = visit_nested
+
+
+class _CallChecker(ast.NodeVisitor):
+    # Finds recursive calls that can't be yielded: in a function that isn't run on the stack (unless it's the call
+    # given to run()), or in a nested function, lambda or comprehension (where yield means something else)
+    def __init__(self, fn_name, is_call):
+        self.fn_name = fn_name
+        self.is_call = is_call
+        self.yieldable = False
+
+    def check(self, function_def, on_stack):
+        self.yieldable = on_stack
+        for statement in function_def.body:
+            self.visit(statement)
+
+    def visit_Call(self, node):
+        if self.is_call(node) and not self.yieldable:
+            raise TypeError('%s makes a recursive call at line %d that can\'t be run on the stack'
+                            % (self.fn_name, node.lineno))
+        if isinstance(node.func, ast.Name) and node.func.id == 'run':
+            for arg in node.args:
+                # The call run() is given is where a stack starts
+                if isinstance(arg, ast.Call) and self.is_call(arg):
+                    self.generic_visit(arg)
+                else:
+                    self.visit(arg)
+            return
+        self.generic_visit(node)
+
+    def visit_nested(self, node):
+        yieldable = self.yieldable
+        self.yieldable = False
+        self.generic_visit(node)
+        self.yieldable = yieldable
+
+    visit_FunctionDef = visit_Lambda = visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp \
+        = visit_nested
@@ -33,7 +33,13 @@ class tree:
         """
         Return number of nodes in teee
         """
-        return sum(len(node) for node in self.children) + 1
+        # Walked with a list instead of recursion, so deeply nested trees work too
+        count = 0
+        nodes = [self]
+        while nodes:
+            count += 1
+            nodes.extend(nodes.pop().children)
+        return count
 
     def isLeaf(self):
         """